@@ -0,0 +1,97 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import soundDB
+from soundDB import parsers
+
+"""
+Compare the "c" and "arrow" CSV engines on synthetic NVSPL files:
+
+    python benchmarks/csv_engines.py --files 24
+
+Each file is parsed by the NVSPL parser with each engine, the results are checked to be identical,
+and the time per file is reported.
+"""
+
+BANDS = [ "H" + band.replace(".", "p") for band in parsers.NVSPL.levelColumns[:-3] ]
+COLUMNS = (["SiteID", "STime"] + BANDS + ["dbA", "dbC", "dbF", "Voltage", "WindSpeed", "WindDir", "TempIns", "TempOut",
+           "Humidity", "INVID", "INSID", "GChar1", "GChar2", "GChar3", "AdjustmentsApplied", "CalibrationAdjustment",
+           "GPSTimeAdjustment", "GainAdjustment", "Status"])
+
+def writeNVSPL(path, hour, rng):
+    index = pd.date_range(hour, periods= 3600, freq= "s")
+    data = pd.DataFrame(index= range(3600))
+    data["SiteID"] = "BENCH"
+    data["STime"] = index.strftime("%Y-%m-%d %H:%M:%S")
+    for column in BANDS + ["dbA", "dbC", "dbF"]:
+        levels = np.round(rng.normal(30, 8, 3600), 1).astype(object)
+        # Some seconds of silence in the lowest bands, as real meters write them
+        levels[rng.random_sample(3600) < 0.01] = "-Infinity"
+        data[column] = levels
+    data["Voltage"] = np.round(rng.normal(12.5, 0.1, 3600), 2)
+    for column in ["WindSpeed", "WindDir", "INVID", "INSID", "GChar2", "AdjustmentsApplied", "CalibrationAdjustment", "GPSTimeAdjustment"]:
+        data[column] = ""
+    data["TempIns"] = np.round(rng.normal(20, 2, 3600), 1)
+    data["TempOut"] = np.round(rng.normal(10, 5, 3600), 1)
+    data["Humidity"] = np.round(rng.uniform(20, 90, 3600), 1)
+    data["GChar1"] = "A"
+    data["GChar3"] = "Z"
+    data["GainAdjustment"] = 0
+    data["Status"] = 1
+    data[COLUMNS].to_csv(path, index= False)
+
+def parseAll(paths, engine):
+    # The parser only needs its engine; skip locating files through an iyore Dataset
+    accessor = object.__new__(parsers.NVSPL)
+    accessor._engine = engine
+    state = (None, None, 1, None, None, None, None)
+    start = time.time()
+    results = [ accessor.parse(path, state) for path in paths ]
+    return results, time.time() - start
+
+def main(argv= None):
+    parser = argparse.ArgumentParser(description= "Benchmark the CSV engines on synthetic NVSPL files")
+    parser.add_argument("--files", type= int, default= 12, help= "number of hour-long NVSPL files to generate")
+    parser.add_argument("--repeat", type= int, default= 3, help= "best of this many runs is reported")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix= "soundDB-bench-")
+    try:
+        rng = np.random.RandomState(0)
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(directory, "NVSPL_BENCH_2015_05_15_{:02d}.txt".format(i))
+            writeNVSPL(path, pd.Timestamp("2015-05-15") + pd.Timedelta(hours= i), rng)
+            paths.append(path)
+        print("{} files, {:.1f} MB".format(len(paths), sum(os.path.getsize(path) for path in paths) / 1e6))
+
+        timings = {}
+        results = {}
+        for engine in ("c", "arrow"):
+            best = None
+            for i in range(args.repeat):
+                results[engine], elapsed = parseAll(paths, engine)
+                best = elapsed if best is None else min(best, elapsed)
+            timings[engine] = best
+            print("{:>6}: {:.1f} ms per file".format(engine, 1000 * best / len(paths)))
+
+        for c, arrow in zip(results["c"], results["arrow"]):
+            pd.testing.assert_frame_equal(c, arrow, check_exact= True)
+        print("Results identical; arrow is {:.2f}x the speed of c".format(timings["c"] / timings["arrow"]))
+    finally:
+        shutil.rmtree(directory)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import io
+import os
+import re
+import sys
+import time
+import shutil
+import warnings
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import soundDB
+from soundDB import parsers
+
+from csv_engines import writeNVSPL
+
+"""
+Compare the NVSPL parser's per-file work against how it used to treat every file:
+
+    python benchmarks/nvspl_schema.py --files 24
+
+Files are read three ways with the "c" CSV engine: as the parser used to (a regex over every column of every file
+to rename it, then a float32 copy of the numeric columns, which was thrown away); by the parser, with the column names
+worked out once per distinct header (as in a query); and by the parser, working them out for every file.
+The results are checked to be identical, and the time per file is reported.
+"""
+
+NUMERIC = parsers.NVSPL.levelColumns + ["Voltage", "WindSpeed", "WindDir", "TempIns", "TempOut", "Humidity"]
+
+def readAsBefore(path, columns):
+    with open(path, "rb") as f:
+        df = pd.read_csv(io.BytesIO(f.read()), engine= "c", parse_dates= True, index_col= 0 if columns else 1, usecols= columns)
+    df.index.name = "date"
+    df.rename(columns= { column: column.replace('H', '').replace('p', '.') for column in df.columns if re.match(r"H\d+p?\d*", column) is not None }, inplace= True)
+    with warnings.catch_warnings():
+        # newer pandas warns about copy=
+        warnings.simplefilter("ignore")
+        df[df.columns.intersection(NUMERIC)].astype("float32", copy= False, errors= "ignore")
+    return df
+
+def parseAll(paths, method, columns= None):
+    # The parser only needs its engine; skip locating files through an iyore Dataset
+    accessor = object.__new__(parsers.NVSPL)
+    accessor._engine = "c"
+    state = accessor.prepareState(None, None, columns= columns)
+    start = time.time()
+    if method == "before":
+        results = [ readAsBefore(path, state[1]) for path in paths ]
+    elif method == "parse":
+        results = [ accessor.parse(path, state) for path in paths ]
+    else:
+        # a new state for every file, so nothing is kept between them
+        results = [ accessor.parse(path, accessor.prepareState(None, None, columns= columns)) for path in paths ]
+    return results, time.time() - start
+
+def main(argv= None):
+    parser = argparse.ArgumentParser(description= "Benchmark the NVSPL parser's per-file work")
+    parser.add_argument("--files", type= int, default= 12, help= "number of hour-long NVSPL files to generate")
+    parser.add_argument("--repeat", type= int, default= 5, help= "best of this many runs is reported")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix= "soundDB-bench-")
+    try:
+        rng = np.random.RandomState(0)
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(directory, "NVSPL_BENCH_2015_05_15_{:02d}.txt".format(i))
+            writeNVSPL(path, pd.Timestamp("2015-05-15") + pd.Timedelta(hours= i), rng)
+            paths.append(path)
+        print("{} files, {:.1f} MB".format(len(paths), sum(os.path.getsize(path) for path in paths) / 1e6))
+
+        methods = ("before", "parse", "parse, no cache")
+        for label, columns in (("all columns", None), ("dbA, H1000", ["dbA", "H1000"])):
+            timings = {}
+            results = {}
+            for i in range(args.repeat):
+                # interleaved, so they see the same conditions
+                for method in methods:
+                    results[method], elapsed = parseAll(paths, method, columns)
+                    timings[method] = min(timings.get(method, elapsed), elapsed)
+            for method in methods:
+                print("{:>12}, {:>15}: {:.2f} ms per file".format(label, method, 1000 * timings[method] / len(paths)))
+
+            for method in methods[1:]:
+                for before, parsed in zip(results["before"], results[method]):
+                    pd.testing.assert_frame_equal(before, parsed, check_exact= True)
+            print("Results identical; the parser is {:.2f}x the speed it was".format(timings["before"] / timings["parse"]))
+    finally:
+        shutil.rmtree(directory)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
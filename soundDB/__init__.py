@@ -1,5 +1,14 @@
 from .accessor import Accessor
 from . import parsers
+from .events import duringEvents, eventMask
+from .memory import setMemoryLimit, MemoryLimitError
+from .staging import setStagingCache
+from .csvreader import setCSVEngine
+from .sqlengine import sql
+from .sampling import Sample
+from .daemon import setDaemon, serveDaemon
+from .sharedscan import multi
+from . import decibels
 
 import inspect
 
@@ -17,4 +26,4 @@ def populateAccessors():
 
 globals().update(populateAccessors())
 
-del inspect, accessor, parsers, populateAccessors
+del inspect, accessor, parsers, materialized, executors, groups, events, memory, federated, compression, staging, explain, sharedmem, csvreader, pyramid, operations, sqlengine, sampling, daemon, zonemaps, sharedscan, atomicwrite, populateAccessors
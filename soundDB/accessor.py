@@ -2,9 +2,8 @@
 from __future__ import print_function, division, unicode_literals, absolute_import
 from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
 from future.utils import (iteritems, itervalues, with_metaclass)
-from past.builtins import basestring
+from future.moves import queue
 
-import itertools
 import functools
 import operator
 import collections
@@ -12,6 +11,8 @@ import traceback
 import inspect
 import warnings
 import sys
+import threading
+import time
 
 import numpy as np
 import pandas as pd
@@ -19,6 +20,19 @@ import re
 import iyore
 from tqdm import tqdm, tqdm_notebook
 
+from . import materialized
+from . import executors
+from . import groups as parallelGroups
+from . import memory
+from . import federated
+from . import staging
+from . import csvreader
+from . import explain as queryPlan
+from . import operations
+from . import sampling
+from . import daemon
+from . import zonemaps
+
 class AccessorMetaclass(type):
     """
     Metaclass to insert boilerplate documentation into each Accessor subclass,
@@ -60,8 +74,12 @@ class AccessorMetaclass(type):
             # Format any special keyword arguments the Accessor's prepareState function has
             prepareStateArgspec = ""
             prepareStateKwargNames = []
-            if "prepareState" in dct:
-                prepareStateSignature = inspect.signature(dct["prepareState"])
+            # Subclasses of another specific Accessor (i.e. one Accessor for two Endpoints) may inherit its prepareState
+            prepareState = dct.get("prepareState", None)
+            if prepareState is None:
+                prepareState = next((base.prepareState for base in bases if getattr(base, "_prepareStateKwargs", None)), None)
+            if prepareState is not None:
+                prepareStateSignature = inspect.signature(prepareState)
                 prepareStateParams = {k: p for k, p in prepareStateSignature.parameters.items() if p.default is not inspect.Parameter.empty}
                 prepareStateKwargNames = list(prepareStateParams)
                 if prepareStateParams:
@@ -90,7 +108,7 @@ class AccessorMetaclass(type):
         return super(AccessorMetaclass, mcls).__new__(mcls, clsname, bases, dct)
 
     subclassDocTemplate = """
-        {endpointName}(ds: iyore.Dataset, n=None, items=None, sort=None, progbar= None,{prepareStateArgspec} **filters)
+        {endpointName}(ds: iyore.Dataset, n=None, items=None, sort=None, progbar= None, executor= None, retries= 0, engine= None, sample= None, where= None,{prepareStateArgspec} **filters)
 
         Access {className} data from the dataset `ds` that matches the given filters, and apply operations to it.
 
@@ -102,9 +120,12 @@ class AccessorMetaclass(type):
         Parameters
         ----------
 
-        ds : iyore.Dataset
+        ds : iyore.Dataset, or list or dict of iyore.Dataset
 
-            The Dataset from which to access the NVSPL files
+            The Dataset from which to access the NVSPL files. Given several Datasets (i.e. one per drive),
+            their Entries are read concurrently---each Dataset on its own thread---and merged in `sort` order.
+            Each Entry then has a `dataset` field (its key in the dict, or the Dataset's path), which can be used
+            to filter, sort, or `.group()` like any other field.
 
         n : int, default None
 
@@ -125,6 +146,40 @@ class AccessorMetaclass(type):
             If True, always display a progress bar; if False, never. If None (default), only display
             a progress bar when using `.compute()` (so print statements in a for loop don't compete with it).
 
+        executor : concurrent.futures.Executor or distributed.Client, default None
+
+            Parse files on this executor, instead of one-by-one in this process. With a process pool or
+            a Dask cluster (a `distributed.LocalCluster` works as a stand-in for a real one), every worker
+            must be able to reach the files at the same paths. Larger files are started first.
+            The operations chain is still applied in this process.
+
+        retries : int, default 0
+
+            Number of times to retry parsing a file that failed on `executor`, before reporting the error
+
+        engine : {{"c", "arrow", "arrow-dtypes"}}, default None
+
+            How text files are parsed: with pandas' C parser, or with pyarrow's multithreaded CSV reader
+            (giving identical DataFrames, or with `"arrow-dtypes"`, Arrow-backed columns). If None,
+            the process-wide default (see `soundDB.setCSVEngine`), which is `"c"` unless changed.
+            Doesn't apply to binary files.
+
+        sample : float, int, or soundDB.Sample, default None
+
+            Read only a stratified random sample of the Entries: a fraction of the Entries in each stratum
+            (every combination of `site`, `year`, `month`, and `hour`), or a total number of Entries.
+            Give a `soundDB.Sample` to also sample rows within each file, stratify by other fields, or set a seed.
+            Without a `sort`, sampled Entries are read in progressive order: every prefix of the sample is itself
+            close to a stratified sample, so stopping early still leaves a representative one (see `.estimate()`).
+
+        where : str, default None
+
+            Only yield the rows of each Entry's data matching this expression, like `"dbA > 60"` or
+            `"MaxSPL >= 70 and Duration < 300"` (comparisons of columns to constants, with `and`, `or`, `not`;
+            backticks around names like `` `12.5` ``; dates compared to the index by its name, i.e. `date`).
+            Entries with no matching rows aren't yielded. The min and max of every column of each file parsed
+            are recorded (in `~/.soundDB/zonemaps`), so later queries skip files that can't have a match.
+
         **filters : str, number, dict of {{str: False}}, iterable of str, or function
 
             Restrict results to Entries which match the given values in the specified fields
@@ -133,7 +188,8 @@ class AccessorMetaclass(type):
         ------
 
         Tuple of `(key, data)`. `key` will be the iyore.Entry the `data` was read from,
-        or a string of the group `data` represents if `.group()` is used.
+        or a string of the group `data` represents if `.group()` is used,
+        or the start time of the window `data` covers if `.window()` is used.
 
         Operations Chaining
         -------------------
@@ -143,13 +199,31 @@ class AccessorMetaclass(type):
 
         Adding these methods into the chain have special effects:
 
-        - `.group(*groups)`
+        - `.group(*groups, workers= None)`
 
             Given fields to group by (`"site"`, `"year"`, etc.), concatenate data
             within each group and yield a single tuple of `(group, data)` for each.
             Any prior operations in the chain are applied to every Entry regardless of group,
             and subsequent operations apply to each group's data once combined.
 
+            With `workers= n`, up to `n` groups are processed at once, each in its own worker process
+            (which parses the group's Entries and runs the whole chain), and only each group's final
+            result is sent back. Results are still yielded in group order. The operations chain must be
+            picklable for this (i.e. no lambdas); otherwise groups are processed one at a time, with a warning.
+
+        - `.window(size, step= None, by= None)`
+
+            Yield `(start, data)` for each window of time `[start, start + size)`, every `step`
+            (default: `size`, so windows don't overlap), with the data of consecutive Entries
+            joined across file boundaries. So rolling computations like a 1-hour moving Leq are exact
+            across files, without concatenating everything: only the overlap the next window needs
+            is carried from one Entry to the next. Windows start at multiples of `step`; ones without
+            any data are skipped, and the last may be partial. The data must be time-indexed (i.e. NVSPL).
+
+            Entries must be in time order, so to window each site's data separately, give `by= "site"`
+            (fields or a function, like `.group()`): windows then restart at each change of `by`,
+            and keys are `(by, start)`. Prior operations apply to every Entry; subsequent ones to each window.
+
         - `.combine(func= lambda x: x, ID= None, *args, **kwargs)
 
             Combine all data into a single structure and return it. Data which can be sensibly combined
@@ -158,6 +232,30 @@ class AccessorMetaclass(type):
             or returned as a dict of `{{ID (a string): data}}` as a last resort.
 
             Data is passed through `func` before combining, which recieves any extra arguments given to `combine`.
+
+        - `.estimate(stat= "mean", column= None, confidence= 0.95, resamples= 200)`
+
+            Estimate `stat` ("mean", "median", "std", "leq", a quantile like `0.9`, or an exceedance level
+            like `"L90"`) of the values of `column` (or of the data itself, if it's a Series), with a bootstrap
+            confidence interval. Returns a `soundDB.sampling.Estimate` of `(value, low, high, confidence, entries, total)`.
+            Reads the `sample` (or all the Entries) in progressive order; interrupting it with Ctrl-C
+            returns the estimate from the Entries read so far.
+
+        - `.estimates(stat= "mean", column= None, every= 10, confidence= 0.95, resamples= 200)`
+
+            Like `.estimate()`, but yields a refined `Estimate` after every `every` Entries read, so you can
+            watch the confidence interval narrow and stop (i.e. `break`) once it's tight enough.
+
+        - `.explain()`
+
+            Print the plan for the query without reading any data: matched Entries and their total size,
+            parameters, operations, applicable optimizations, and an estimated parse time.
+
+        - `.materialize(name, store= None, partials= True, func= lambda x: x, ID= None, *args, **kwargs)`
+
+            Like `.combine()`, but the results are saved under `name` (in the directory `store`, default
+            `~/.soundDB/materialized`). On later runs, only Entries which are new or have changed are parsed,
+            and only the groups they belong to are recomputed.
     """
 
 
@@ -214,13 +312,16 @@ class Accessor(with_metaclass(AccessorMetaclass, object)):
         """
         return None
 
-    def __init__(self, ds, n= None, items= None, sort= None, progbar= None, **filters):
+    def __init__(self, ds, n= None, items= None, sort= None, progbar= None, executor= None, retries= 0, engine= None, sample= None, where= None, **filters):
 
 
-        try:
-            endpoint = getattr(ds, self.endpointName)
-        except AttributeError:
-            raise ValueError('No endpoint "{}" exists in the given dataset'.format(self.endpointName))
+        if isinstance(ds, (list, tuple, dict)):
+            endpoint = federated.FederatedEndpoint(ds, self.endpointName)
+        else:
+            try:
+                endpoint = getattr(ds, self.endpointName)
+            except AttributeError:
+                raise ValueError('No endpoint "{}" exists in the given dataset'.format(self.endpointName))
 
         if items is not None:
             # TODO: selection based on parsing ID strings from DataFrame index, not just columns
@@ -241,6 +342,30 @@ class Accessor(with_metaclass(AccessorMetaclass, object)):
         self._chain = []
         self._n = n
         self._progbar = progbar
+        self._executor = executor
+        self._retries = retries
+        csvreader.checkEngine(engine)
+        self._engine = engine
+        self._sample = sampling.Sample.of(sample)
+        self._where = zonemaps.Predicate(where) if where is not None else None
+
+    def __getstate__(self):
+        """
+        Only what's needed to ``parse`` a file is pickled (to send to worker processes): the Endpoint, filters, and executor
+        are only used for locating files, and the operations chain is sent to workers separately, if at all.
+        """
+        state = self.__dict__.copy()
+        for attr in ("_endpoint", "_filters", "_sort", "_chain", "_executor"):
+            state.pop(attr, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._endpoint = None
+        self._filters = {}
+        self._sort = None
+        self._chain = []
+        self._executor = None
 
     @classmethod
     def ID(cls, key):
@@ -260,9 +385,12 @@ class Accessor(with_metaclass(AccessorMetaclass, object)):
                 if len(id_elems) > 0: id_elems.append(' ')
                 id_elems.append(key.hour+':')
             if len(id_elems) > 0:
-                return "".join(id_elems)
+                ID = "".join(id_elems)
             else:
                 return key.path
+            if "dataset" in key.fields:
+                ID = "{}: {}".format(key.dataset, ID)
+            return ID
         else:
             return key
 
@@ -281,14 +409,47 @@ class Accessor(with_metaclass(AccessorMetaclass, object)):
         if self._progbar is None:
             self._progbar = True
 
+        return self._combineResults(iter(self), func, ID, *args, **kwargs)
+
+    def materialize(self, name, store= None, partials= True, func= lambda x: x, ID= None, *args, **kwargs):
+        """
+        Like ``combine``, but the results are saved under ``name``, and only updated with what has changed on later runs.
+
+        The first time, this reads all the data, just as ``combine`` does. After that, only Entries that have been
+        added or modified since (judged by file mtime and size) are parsed, and if the chain contains ``.group()``,
+        only the groups they belong to are recomputed. Results are stored in the directory ``store``
+        (default ``~/.soundDB/materialized``). If the query itself changes (different filters, parameters,
+        or operations chain), the stored results are discarded and recomputed from scratch.
+
+        When using ``.group()``, the per-Entry data entering the group step is also stored, so affected groups
+        can be recomputed without re-parsing their unchanged Entries. If that data is large (i.e. no operations
+        precede ``.group()``), pass ``partials= False`` to re-parse affected groups instead of storing it.
+        """
+        if self._sample is not None:
+            raise TypeError("Can't materialize a sample; remove `sample=` to materialize the full results")
+        if ID is None:
+            ID = self.ID
+
+        if self._progbar is None:
+            self._progbar = True
+
+        keysAndDatas = materialized.refresh(self, name, store= store, partials= partials)
+        return self._combineResults(keysAndDatas, func, ID, *args, **kwargs)
+
+    def _combineResults(self, keysAndDatas, func, ID, *args, **kwargs):
+        """
+        Combine an iterable of ``(key, data)`` tuples into a single structure (the guts of ``combine``).
+        """
         results = collections.defaultdict(list)
         # build map of {ID: [data, data, ...]} (same ID may have multiple data, i.e. NVSPL or LA)
-        for key, data in iter(self):
+        for key, data in keysAndDatas:
             results[ID(key)].append(data)
 
         # flatten data for each ID by concatenating, or unpacking list if just one dataframe,
         # then apply processing function to (maybe-)concatenated data
         for ID_name, datas in iteritems(results):
+            if len(datas) > 1:
+                memory.checkConcat(datas, 'while combining the results for "{}"'.format(ID_name))
             try:
                 flat = pd.concat(datas, copy= False) if len(datas) > 1 else datas[0]
             except TypeError:
@@ -379,144 +540,296 @@ class Accessor(with_metaclass(AccessorMetaclass, object)):
         # If types are inconsistent, or not pandas, or a Panel4D, just give back results as a dict---we can't help you any more here
         return results
 
-    def group(self, *groups):
-        if len(groups) == 0:
-            raise TypeError("No groups given to groupby")
-        elif len(groups) > 1:
-            if all(isinstance(group, basestring) for group in groups):
-                groupFunc = lambda e: tuple(getattr(e, group) for group in groups)
-            else:
-                raise TypeError("If multiple groups are given, all must be strings")
-        else:
-            group = groups[0]
-            if isinstance(group, basestring):
-                groupFunc = operator.attrgetter(group)
-            else:
-                if hasattr(group, "__call__"):
-                    groupFunc = group
-                else:
-                    raise ValueError('Argument to groupby must be a string or function, instead got "{}"'.format(type(group)))
-
-        def concat_maybe(datas):
-            datas = tuple(datas)
-            if len(datas) == 1:
-                return datas[0]
-            else:
-                # TODO: use GroupbyApplier.compute()-like logic for concat/promote?
-                try:
-                    return pd.concat(datas)
-                except TypeError:
-                    return datas
+    def explain(self):
+        """
+        Print what this query will do, without reading any data: the Entries it matches and their total size,
+        its parameters and operations chain, which optimizations apply, and an estimate of how long
+        parsing will take, from how fast files of this kind have been parsed so far in this session.
+        """
+        print(queryPlan.explain(self))
+
+    def estimate(self, stat= "mean", column= None, confidence= 0.95, resamples= 200):
+        """
+        Estimate ``stat`` of the data (or of ``column`` of it), with a bootstrap confidence interval, from the ``sample``
+        (or all the Entries) read in progressive order. Interrupting it returns the estimate from the Entries read so far.
+        """
+        if self._progbar is None:
+            self._progbar = True
+
+        estimator, reading = sampling.reader(self, stat= stat, column= column, confidence= confidence, resamples= resamples)
+        try:
+            for entry in reading:
+                pass
+        except KeyboardInterrupt:
+            self._write("Interrupted; estimating from the Entries read so far")
+        finally:
+            reading.close()
+        return estimator.estimate()
+
+    def estimates(self, stat= "mean", column= None, every= 10, confidence= 0.95, resamples= 200):
+        """
+        Generator of progressively refined ``Estimate``s of ``stat``, after every ``every`` Entries read (see ``estimate``)
+        """
+        return sampling.estimates(self, stat= stat, column= column, every= every, confidence= confidence, resamples= resamples)
+
+    def _pushdowns(self):
+        """
+        Descriptions of the work this Accessor's parameters let ``parse`` skip (i.e. reading only some columns),
+        for ``explain``. Overridden by subclasses.
+        """
+        return []
+
+    def _columnParams(self, columns):
+        """
+        Parameters which make ``parse`` read only ``columns`` (named as in its results), for ``soundDB.sql``,
+        or None if it can't. Overridden by subclasses.
+        """
+        return None
 
-        self._sort = groupFunc
-        def do_group(iterator):
-            for key, subiter in itertools.groupby(iterator, lambda entryAndData: groupFunc(entryAndData[0])):
-                yield key, concat_maybe(data for entry, data in subiter)
+    def group(self, *groups, **kwargs):
+        workers = kwargs.pop("workers", None)
+        if kwargs:
+            raise TypeError("Unexpected keyword arguments to group: {}".format(", ".join(kwargs)))
+
+        stage = operations.Group(groups, workers= workers)
+        self._sort = stage.groupFunc
+        self._chain.append(stage)
+        return self
 
-        self._chain.append(do_group)
+    def window(self, size, step= None, by= None):
+        stage = operations.Window(size, step= step, by= by)
+        self._sort = stage.sortKey
+        self._chain.append(stage)
         return self
 
     def __getattr__(self, attr):
-        def do_getattr(iterator):
-            for entry, data in iterator:
-                try:
-                    yield entry, getattr(data, attr)
-                except KeyboardInterrupt:
-                    self._write('Interrupted in operations chain while processing "{}"'.format(str(entry)))
-                    break
-                except GeneratorExit:
-                    raise GeneratorExit
-                except:
-                    self._write('Error in operations chain while processing "{}":'.format(str(entry)))
-                    exc_type, exc_value, exc_traceback = sys.exc_info()
-                    self._write( "".join(traceback.format_exception_only(exc_type, exc_value)) )
-        self._chain.append(do_getattr)
+        if attr.startswith("__") and attr.endswith("__"):
+            # Special methods looked up by Python itself (i.e. by pickle or copy) should not end up in the chain
+            raise AttributeError(attr)
+
+        self._chain.append(operations.GetAttr(attr))
         return self
 
     def __getitem__(self, *index):
-        def do_getitem(iterator):
-            for entry, data in iterator:
-                try:
-                    yield entry, data.__getitem__(*index)
-                except KeyboardInterrupt:
-                    self._write('Interrupted in operations chain while processing "{}"'.format(str(entry)))
-                    break
-                except GeneratorExit:
-                    raise GeneratorExit
-                except:
-                    self._write('Error in operations chain while processing "{}":'.format(str(entry)))
-                    exc_type, exc_value, exc_traceback = sys.exc_info()
-                    self._write( "".join(traceback.format_exception_only(exc_type, exc_value)) )
-        self._chain.append(do_getitem)
+        self._chain.append(operations.GetItem(index))
         return self
 
     def __call__(self, *args, **kwargs):
-        def do_call(iterator):
-            for entry, data in iterator:
+        self._chain.append(operations.Call(args, kwargs))
+        return self
+
+
+    def __iter__(self):
+        state = self.prepareState(self._endpoint, self._filters, **self._prepareStateParams)
+        if self._sample is not None:
+            return self._run(self._entries(), state)
+        if self._sort is None:
+            # Without a sort (or .group(), which sorts by group), there's no need to wait
+            # for every Entry to be found before parsing the first one
+            return self._run(self._stream(), state, progress= False)
+        return self._run(self._locate(), state)
+
+    def _entries(self):
+        """
+        List the Entries this query reads, in the order it reads them (its ``sample`` of them, if it has one)
+        """
+        entries = self._locate()
+        if self._sample is None:
+            return entries
+        chosen = self._sample.choose(entries, self._endpoint)
+        if self._sort is not None:
+            # keep the sorted order (i.e. for .group()), rather than the progressive one
+            keep = set(id(entry) for entry in chosen)
+            chosen = [ entry for entry in entries if id(entry) in keep ]
+        return chosen
+
+    def _run(self, entries, state, chain= None, progress= True):
+        """
+        Parse each of ``entries`` and pass the results through ``chain`` (default: the whole operations chain).
+        Returns an iterator of ``(key, data)``.
+        """
+        if chain is None:
+            chain = self._chain
+
+        where = getattr(self, "_where", None)
+        if where is not None:
+            # Skip Entries whose recorded statistics rule out any row matching
+            zoneIndex = zonemaps.Index(self)
+            entries = zonemaps.prune(entries, where, zoneIndex)
+
+        parallelAt = next((i for i, do in enumerate(chain) if getattr(do, "workers", None)), None)
+        if parallelAt is not None:
+            if parallelGroups.canSend(self, state, chain, parallelAt):
+                return memory.trackAll(parallelGroups.runGroups(self, entries, state, chain, parallelAt, progress= progress))
+            warnings.warn("The operations chain can't be sent to worker processes (i.e. it contains a lambda); groups will be processed one at a time")
+
+        # The operations before any .group() run right after parsing, in the executor's workers if possible
+        # (but not with ``where=``, which needs each file's whole data here, to record its statistics)
+        inWorkers = []
+        if self._executor is not None and where is None:
+            inWorkers = operations.perEntry(chain)
+            if not executors.canSend(self._executor, inWorkers):
+                inWorkers = []
+            chain = chain[len(inWorkers):]
+
+        if progress:
+            entries = self._progress(entries)
+        prefetch = getattr(self._endpoint, "prefetch", None)
+        if staging.enabled():
+            # copy files to the local staging cache ahead of the parser
+            entries = staging.prefetch(entries)
+        elif prefetch is not None:
+            # i.e. a FederatedEndpoint, which reads files from each Dataset ahead of the parser
+            entries = prefetch(entries)
+
+        def iterate():
+            if self._executor is not None:
+                for item in iterateOnExecutor():
+                    yield item
+                return
+
+            for entry in entries:
+                # Don't read any more while the results already in memory are over the limit
+                memory.check('while parsing "{}"'.format(entry.path))
                 try:
-                    yield (entry, data(*args, **kwargs))
+                    if daemon.enabled():
+                        data = daemon.parse(self, entry, state)
+                    else:
+                        start = time.time()
+                        data = self._parseEntry(entry, state)
+                        queryPlan.record(self, entry.path, time.time() - start)
+                    yield entry, memory.track(data, entry.path)
                 except KeyboardInterrupt:
-                    self._write('Interrupted in operations chain while processing "{}"'.format(str(entry)))
+                    self._write('Interrupted while parsing "{}"'.format(entry.path))
                     break
                 except GeneratorExit:
                     raise GeneratorExit
                 except:
-                    self._write('Error in operations chain while processing "{}":'.format(str(entry)))
+                    self._write('Error while parsing "{}":'.format(entry.path))
                     self._write( traceback.format_exc() )
-        self._chain.append(do_call)
-        return self
 
-
-    def __iter__(self):
-        state = self.prepareState(self._endpoint, self._filters, **self._prepareStateParams)
-        entries = self._endpoint(sort= self._sort, n= self._n, **self._filters)
-
-        if self._progbar:
+        def iterateOnExecutor():
+            parsed = executors.parseAll(self, entries, state, self._executor, retries= self._retries, ops= inWorkers)
             try:
-                get_ipython
-                inNotebook = True
-            except NameError:
-                inNotebook = False
+                for entry, data, error in parsed:
+                    if error is None:
+                        yield entry, memory.track(data, entry.path)
+                    elif isinstance(error, operations.OperationError):
+                        operations.reportError(self._write, error, entry)
+                    else:
+                        self._write('Error while parsing "{}":'.format(entry.path))
+                        self._write(error)
+            except KeyboardInterrupt:
+                self._write('Interrupted while parsing')
+            finally:
+                parsed.close()
+
+        parsed = iterate()
+        if where is not None:
+            # row samples would give misleading statistics, so they aren't recorded
+            recordStats = self._sample is None or self._sample.rows is None
+            parsed = zonemaps.apply(parsed, where, zoneIndex, self._write, record= recordStats)
+        return memory.trackAll(operations.execute(chain, parsed, self._write))
+
+    def _parseEntry(self, entry, state):
+        data = self.parse(entry, state= state) if state is not None else self.parse(entry)
+        sample = getattr(self, "_sample", None)
+        return sample.rowsOf(data, entry) if sample is not None else data
+
+    def _locate(self):
+        """
+        List all the Entries matching this Accessor's filters, in order.
+        """
+        entries = daemon.locate(self._endpoint, self._sort, self._n, self._filters)
+        if entries is not None:
+            return entries
+        entries = self._endpoint(sort= self._sort, n= self._n, **self._filters)
 
-            if not inNotebook:
-                sys.stderr.write("Locating data...")
+        showLocating = self._progbar and not self._inNotebook()
+        if showLocating:
+            sys.stderr.write("Locating data...")
 
         entries = list(entries)
 
-        if self._progbar and not inNotebook:
+        if showLocating:
             sys.stderr.write("\r")
 
-        if self._progbar:
-            try:
-                get_ipython # will fail faster and more reliably than tqdm_notebook
-                entriesIterable = tqdm_notebook(entries, unit= "entries")
-            except (NameError, AttributeError, TypeError):
-                entriesIterable = tqdm(entries, unit= "entries")
-        else:
-            entriesIterable = entries
+        return entries
 
-        def iterate():
-            for entry in entriesIterable:
-                try:
-                    data = self.parse(entry, state= state) if state is not None else self.parse(entry)
-                    yield entry, data
-                except KeyboardInterrupt:
-                    self._write('Interrupted while parsing "{}"'.format(entry.path))
+    def _stream(self):
+        """
+        Yield Entries matching this Accessor's filters as they're found.
+
+        The directory walk runs on a background thread, so it stays ahead of parsing,
+        and the progress bar's total grows as more Entries are found.
+        """
+        listed = daemon.locate(self._endpoint, None, self._n, self._filters)
+        if listed is not None:
+            for entry in self._progress(listed):
+                yield entry
+            return
+
+        entries = self._endpoint(sort= None, n= self._n, **self._filters)
+        found = queue.Queue()
+        finished = object()
+        stop = threading.Event()
+        discovered = [0]
+
+        def discover():
+            try:
+                for entry in entries:
+                    if stop.is_set():
+                        break
+                    discovered[0] += 1
+                    found.put(entry)
+                found.put(finished)
+            except BaseException as e:
+                found.put(e)
+
+        thread = threading.Thread(target= discover, name= "soundDB-discovery")
+        thread.daemon = True
+        thread.start()
+
+        bar = self._progressBar(total= 0) if self._progbar else None
+        try:
+            while True:
+                entry = found.get()
+                if entry is finished:
                     break
-                except GeneratorExit:
-                    raise GeneratorExit
-                except:
-                    self._write('Error while parsing "{}":'.format(entry.path))
-                    self._write( traceback.format_exc() )
+                if isinstance(entry, BaseException):
+                    raise entry
+                if bar is not None:
+                    bar.total = discovered[0]
+                    bar.refresh()
+                yield entry
+                if bar is not None:
+                    bar.update(1)
+        finally:
+            stop.set()
+            if bar is not None:
+                bar.close()
+
+    def _progress(self, entries):
+        """
+        Wrap an iterable of entries in a progress bar, if using one
+        """
+        return self._progressBar(entries) if self._progbar else entries
+
+    def _progressBar(self, entries= None, total= None):
+        if self._inNotebook():
+            try:
+                return tqdm_notebook(entries, total= total, unit= "entries")
+            except (AttributeError, TypeError):
+                pass
+        return tqdm(entries, total= total, unit= "entries")
 
-        # chain the operations together
-        # each function in self._chain is a generator which takes an iterator
-        # (remember that you call a generator to "activate" it: calling a generator returns an iterator)
-        # so end condition for the loop is that `iterate` refers to an iterator
-        iterate = iterate()
-        for do in self._chain:
-            iterate = do(iterate)
-        return iterate
+    @staticmethod
+    def _inNotebook():
+        try:
+            get_ipython # will fail faster and more reliably than tqdm_notebook
+            return True
+        except NameError:
+            return False
 
     def _write(self, msg):
         """
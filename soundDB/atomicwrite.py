@@ -0,0 +1,29 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import os
+import threading
+
+"""
+Replacing files on disk atomically, so readers (or a later session) never see a partly-written one.
+
+The new contents are written to a temporary file next to ``path``---named after the process and thread,
+so concurrent writers don't collide---which is then renamed over ``path``. If writing fails or is interrupted,
+the temporary file is removed and whatever was at ``path`` before is left untouched.
+"""
+
+def writeAtomic(path, write):
+    """
+    Call ``write(tmp)`` to write the new contents of ``path`` to the file ``tmp``, then move it into place
+    """
+    tmp = "{}.{}.{}.tmp".format(path, os.getpid(), threading.current_thread().ident)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
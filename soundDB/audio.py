@@ -0,0 +1,201 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import io
+import struct
+import threading
+import collections
+
+import numpy as np
+
+from . import compression
+from . import staging
+from . import decibels
+
+"""
+Reading WAV files and computing NVSPL-style sound levels from them.
+
+Files are memory-mapped, not read into memory, and processed in blocks of whole seconds. Compressed files are read
+a block at a time if they're gzip files with a member index (as ``python -m soundDB.compress`` writes them),
+otherwise decompressed into memory whole.
+Each block is reshaped into a (seconds, samples) array, and the spectrum of every second is computed at once
+with a real FFT. Since each frame is exactly one second long, FFT bin ``k`` is ``k`` Hz, and by Parseval's theorem
+the (scaled) power in each bin sums exactly to the mean-square of that second. So 1/3rd-octave band levels are
+a matrix product of the power spectra with a (bins x bands) 0/1 matrix, and A-, C-, and flat-weighted levels are
+matrix products with per-bin weighting gains.
+"""
+
+WavFormat = collections.namedtuple("WavFormat", ["formatTag", "channels", "rate", "bitsPerSample", "dataOffset", "dataLength"])
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+bandCenters = decibels.bandCenters
+bandEdges = np.column_stack([bandCenters * 10 ** (-1 / 20.0), bandCenters * 10 ** (1 / 20.0)])
+
+def readWavFormat(path):
+    """
+    Parse the RIFF header of a WAV file, returning a ``WavFormat``
+    """
+    with open(path, "rb") as f:
+        return _readWavFormat(f, path)
+
+def _readWavFormat(f, path):
+    riff, size, wave = struct.unpack("<4sI4s", f.read(12))
+    if riff != b"RIFF" or wave != b"WAVE":
+        raise ValueError('"{}" is not a WAV file'.format(path))
+
+    fmt = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError('No data chunk found in "{}"'.format(path))
+        chunkID, chunkSize = struct.unpack("<4sI", header)
+        if chunkID == b"fmt ":
+            body = f.read(chunkSize)
+            formatTag, channels, rate, byteRate, blockAlign, bitsPerSample = struct.unpack("<HHIIHH", body[:16])
+            if formatTag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                # the actual format is the first two bytes of the SubFormat GUID
+                formatTag = struct.unpack("<H", body[24:26])[0]
+            fmt = (formatTag, channels, rate, bitsPerSample)
+        elif chunkID == b"data":
+            if fmt is None:
+                raise ValueError('Data chunk before fmt chunk in "{}"'.format(path))
+            return WavFormat(*(fmt + (f.tell(), chunkSize)))
+        else:
+            f.seek(chunkSize, 1)
+        if chunkSize % 2 == 1:
+            # chunks are padded to an even number of bytes
+            f.seek(1, 1)
+
+class SampleReader(object):
+    """
+    Array-like view of the raw samples in a seekable file, read from it only when sliced, one range of frames at a time
+    """
+    def __init__(self, f, dtype, shape, offset):
+        self.file = f
+        self.dtype = np.dtype(dtype)
+        self.shape = shape
+        self.offset = offset
+        self.frameBytes = self.dtype.itemsize * int(np.prod(shape[1:]))
+        # blocks may be read from several threads at once
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key):
+        frames, rest = (key[0], key[1:]) if isinstance(key, tuple) else (key, ())
+        start, stop, step = frames.indices(self.shape[0])
+        count = max(stop - start, 0)
+        with self.lock:
+            self.file.seek(self.offset + start * self.frameBytes)
+            data = self.file.read(count * self.frameBytes)
+        values = np.frombuffer(data, dtype= self.dtype).reshape((len(data) // self.frameBytes,) + tuple(self.shape[1:]))
+        return values[(slice(None, None, step),) + rest]
+
+def memmapWav(path):
+    """
+    Memory-map the samples of a WAV file.
+
+    Returns ``(samples, fmt, toFloat)``: ``samples`` is a (frames, channels[, 3]) memmap of the raw samples
+    (or, for compressed files, a ``SampleReader`` if they can be read in parts, otherwise an in-memory array),
+    and ``toFloat`` converts a slice of it to float64, scaled so full-scale is +/-1.
+    """
+    seekable = compression.openSeekable(path) if compression.compressionOf(path) is not None else None
+    if seekable is not None:
+        fmt = _readWavFormat(seekable, path)
+        mapSamples = lambda dtype, shape: SampleReader(seekable, dtype, shape, fmt.dataOffset)
+    elif compression.compressionOf(path) is not None:
+        with compression.openEntry(path) as f:
+            data = f.read()
+        fmt = _readWavFormat(io.BytesIO(data), path)
+        mapSamples = lambda dtype, shape: np.frombuffer(data, dtype= dtype, count= int(np.prod(shape)), offset= fmt.dataOffset).reshape(shape)
+    else:
+        path = staging.localPath(path)
+        fmt = readWavFormat(path)
+        mapSamples = lambda dtype, shape: np.memmap(path, dtype= dtype, mode= "r", offset= fmt.dataOffset, shape= shape)
+    bytesPerSample = fmt.bitsPerSample // 8
+    frames = fmt.dataLength // (bytesPerSample * fmt.channels)
+
+    if fmt.formatTag == WAVE_FORMAT_IEEE_FLOAT:
+        dtype = {32: "<f4", 64: "<f8"}[fmt.bitsPerSample]
+        toFloat = lambda raw: raw.astype(np.float64)
+    elif fmt.formatTag == WAVE_FORMAT_PCM:
+        if fmt.bitsPerSample == 8:
+            dtype = "u1"
+            toFloat = lambda raw: (raw.astype(np.float64) - 128) / 128
+        elif fmt.bitsPerSample in (16, 32):
+            dtype = "<i{}".format(bytesPerSample)
+            scale = float(2 ** (fmt.bitsPerSample - 1))
+            toFloat = lambda raw: raw.astype(np.float64) / scale
+        elif fmt.bitsPerSample == 24:
+            # numpy has no 24-bit integer type, so map the raw bytes and assemble them into int32s per block
+            samples = mapSamples("u1", (frames, fmt.channels, 3))
+            def toFloat(raw):
+                raw = raw.astype(np.int32)
+                values = raw[..., 0] | (raw[..., 1] << 8) | (raw[..., 2] << 16)
+                values = np.where(values >= 2 ** 23, values - 2 ** 24, values)
+                return values / float(2 ** 23)
+            return samples, fmt, toFloat
+        else:
+            raise ValueError("Unsupported bits per sample: {}".format(fmt.bitsPerSample))
+    else:
+        raise ValueError("Unsupported WAV format tag: {}".format(fmt.formatTag))
+
+    samples = mapSamples(dtype, (frames, fmt.channels))
+    return samples, fmt, toFloat
+
+def weightingGains(frequencies, weighting):
+    """
+    Power gains (linear, not dB) of the A or C frequency weighting at ``frequencies``, per IEC 61672
+    """
+    f2 = np.asarray(frequencies, dtype= np.float64) ** 2
+    if weighting == "A":
+        response = (12194.0 ** 2 * f2 ** 2) / ((f2 + 20.6 ** 2) * np.sqrt((f2 + 107.7 ** 2) * (f2 + 737.9 ** 2)) * (f2 + 12194.0 ** 2))
+        offset = 2.00
+    elif weighting == "C":
+        response = (12194.0 ** 2 * f2) / ((f2 + 20.6 ** 2) * (f2 + 12194.0 ** 2))
+        offset = 0.06
+    else:
+        raise ValueError('Unknown weighting "{}"'.format(weighting))
+    return response ** 2 * 10 ** (offset / 10.0)
+
+class FilterBank(object):
+    """
+    Matrices mapping the one-sided power spectrum of a 1-second frame at sample rate ``rate``
+    to mean-square pressure in each 1/3rd-octave band, and A-, C-, and flat-weighted overall.
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        nBins = rate // 2 + 1
+        frequencies = np.arange(nBins, dtype= np.float64)  # 1-second frames, so bin k is k Hz
+
+        # Parseval scaling for the one-sided spectrum of a length-`rate` real signal:
+        # every bin but DC (and Nyquist, if `rate` is even) stands for both its positive and negative frequency
+        scale = np.full(nBins, 2.0 / rate ** 2)
+        scale[0] = 1.0 / rate ** 2
+        if rate % 2 == 0:
+            scale[-1] = 1.0 / rate ** 2
+
+        inBand = (frequencies[:, np.newaxis] >= bandEdges[:, 0]) & (frequencies[:, np.newaxis] < bandEdges[:, 1])
+        self.bands = inBand * scale[:, np.newaxis]
+
+        flat = scale.copy()
+        flat[0] = 0   # no DC offset
+        self.weighted = np.column_stack([
+            flat * weightingGains(frequencies, "A"),
+            flat * weightingGains(frequencies, "C"),
+            flat
+        ])
+
+    def levels(self, frames, calibration= 0.0):
+        """
+        Given a (seconds, rate) array of samples, return a (seconds, 36) array of the 33 band levels,
+        then A-weighted, C-weighted, and flat levels, in dB relative to full scale plus ``calibration``.
+        """
+        spectrum = np.fft.rfft(frames, axis= 1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        meanSquare = np.hstack([np.dot(power, self.bands), np.dot(power, self.weighted)])
+        levels = decibels.toLevels(meanSquare, out= meanSquare)
+        levels += calibration
+        return levels
@@ -0,0 +1,128 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import os
+import sys
+import lzma
+import shutil
+import argparse
+import concurrent.futures
+
+import iyore
+from tqdm import tqdm
+
+from . import compression
+from .atomicwrite import writeAtomic
+
+"""
+Recompress the files of an Endpoint in place, i.e. to archive cold years of NVSPL on a slow share:
+
+    python -m soundDB.compress path/to/dataset nvspl --format gz year=2012
+
+Each file is compressed next to the original (gaining a ``.gz``, ``.xz``, or ``.zst`` extension).
+Then the Dataset is re-read, and only if iyore discovers every compressed file in place of its original
+are the originals deleted; otherwise the compressed copies are deleted and nothing changes.
+(If discovery fails, the Endpoint's pattern in the Dataset's structure needs to allow the extension.)
+
+gzip output is written as a series of independently-compressed members with a size index in their headers,
+so it can be read from any position (see ``soundDB.compression``). ``.zst`` needs the ``zstandard`` package.
+"""
+
+def compressFile(path, fmt, level):
+    """
+    Compress ``path`` to ``path`` plus the extension for ``fmt``, returning the new path
+    """
+    extension = "." + fmt
+    destination = path + extension
+
+    def write(tmp):
+        with open(path, "rb") as src, open(tmp, "wb") as dst:
+            if fmt == "gz":
+                compression.writeIndexedGzip(src, dst, level= 6 if level is None else level)
+            elif fmt == "xz":
+                with lzma.LZMAFile(dst, "wb", preset= 6 if level is None else level) as xz:
+                    shutil.copyfileobj(src, xz, compression.CHUNK)
+            elif fmt == "zst":
+                if compression.zstandard is None:
+                    raise ImportError("Writing .zst files requires the zstandard package (pip install zstandard)")
+                compressor = compression.zstandard.ZstdCompressor(level= 10 if level is None else level)
+                compressor.copy_stream(src, dst)
+            else:
+                raise ValueError('Unknown format "{}"'.format(fmt))
+        shutil.copystat(path, tmp)
+    writeAtomic(destination, write)
+    return destination
+
+def recompress(datasetPath, endpointName, fmt= "gz", level= None, workers= None, **filters):
+    """
+    Compress every uncompressed file of the Endpoint ``endpointName`` in the Dataset at ``datasetPath``
+    matching ``filters``, and delete the originals once iyore is confirmed to discover the compressed files.
+
+    Returns the number of files compressed. Raises RuntimeError (after deleting the compressed copies)
+    if discovery doesn't find them.
+    """
+    endpoint = getattr(iyore.Dataset(datasetPath), endpointName)
+    paths = [ str(entry) for entry in endpoint(**filters) if compression.compressionOf(str(entry)) is None ]
+    if len(paths) == 0:
+        return 0
+
+    compressed = []
+    try:
+        with concurrent.futures.ThreadPoolExecutor(workers or os.cpu_count() or 1) as pool:
+            futures = [ pool.submit(compressFile, path, fmt, level) for path in paths ]
+            for future in tqdm(concurrent.futures.as_completed(futures), total= len(futures), desc= "Compressing", unit= "file"):
+                compressed.append(future.result())
+    except BaseException:
+        _remove(compressed)
+        raise
+
+    # A fresh Dataset, so nothing about the old files is cached
+    rediscovered = { os.path.normpath(str(entry)) for entry in getattr(iyore.Dataset(datasetPath), endpointName)(**filters) }
+    missing = [ path for path in compressed if os.path.normpath(path) not in rediscovered ]
+    if missing:
+        _remove(compressed)
+        raise RuntimeError(
+            '{} of the {} compressed files (i.e. "{}") would not be found by the "{}" endpoint, so the originals were kept. '
+            'Change the endpoint\'s pattern in the Dataset structure to allow a ".{}" extension, and try again.'.format(
+                len(missing), len(compressed), missing[0], endpointName, fmt
+            )
+        )
+
+    _remove(paths)
+    return len(compressed)
+
+def _remove(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def main(argv= None):
+    parser = argparse.ArgumentParser(prog= "python -m soundDB.compress", description= "Recompress the files of an iyore Endpoint in place.")
+    parser.add_argument("dataset", help= "path to the iyore Dataset")
+    parser.add_argument("endpoint", help= 'name of the Endpoint, i.e. "nvspl"')
+    parser.add_argument("filters", nargs= "*", metavar= "field=value", help= 'only compress Entries matching these, i.e. "year=2012"')
+    parser.add_argument("--format", choices= ["gz", "xz", "zst"], default= "gz")
+    parser.add_argument("--level", type= int, default= None, help= "compression level (default depends on format)")
+    parser.add_argument("--workers", type= int, default= None, help= "files to compress at once (default: number of CPUs)")
+    args = parser.parse_args(argv)
+
+    filters = {}
+    for condition in args.filters:
+        field, equals, value = condition.partition("=")
+        if not equals:
+            parser.error('Filters must look like field=value, not "{}"'.format(condition))
+        filters[field] = value
+
+    try:
+        count = recompress(args.dataset, args.endpoint, fmt= args.format, level= args.level, workers= args.workers, **filters)
+    except RuntimeError as e:
+        print(e, file= sys.stderr)
+        return 1
+    print("Compressed {} files".format(count))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+from future.moves import queue
+
+import io
+import os
+import gzip
+import lzma
+import zlib
+import struct
+import bisect
+import threading
+
+from . import staging
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+"""
+Reading data files which have been compressed with gzip (``.gz``), xz (``.xz``), or Zstandard (``.zst``).
+
+Every parser opens its file with ``openEntry``, so compressed and uncompressed files can be mixed freely
+(and a staged local copy of the file is read instead, if there is one; see ``soundDB.staging``).
+Compression is judged by file extension alone. Decompression runs on a background thread, a chunk ahead of the
+parser reading from it (zlib, lzma, and zstandard all release the GIL), so the two overlap.
+
+Files written by ``python -m soundDB.compress`` in gzip format are made of many independent gzip members,
+each recording its own compressed and uncompressed size in its header (like BGZF), so they can be read
+from any position without decompressing everything before it: see ``IndexedGzipFile`` and ``openSeekable``
+(WAV files are read a block at a time this way; see ``soundDB.audio``). They're still ordinary gzip files to every other tool.
+Reading Zstandard files needs the optional ``zstandard`` package.
+"""
+
+EXTENSIONS = { ".gz": "gz", ".xz": "xz", ".zst": "zst" }
+CHUNK = 1 << 20
+READ_AHEAD = 8
+
+def compressionOf(path):
+    """
+    ``"gz"``, ``"xz"``, or ``"zst"`` if ``path`` is compressed, otherwise None
+    """
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+def _decompressingFile(path, compression):
+    if compression == "gz":
+        return gzip.GzipFile(path, "rb")
+    if compression == "xz":
+        return lzma.LZMAFile(path, "rb")
+    if compression == "zst":
+        if zstandard is None:
+            raise ImportError('Reading "{}" requires the zstandard package (pip install zstandard)'.format(path))
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd= True)
+    raise ValueError('Unknown compression "{}"'.format(compression))
+
+class ThreadedDecompressor(io.RawIOBase):
+    """
+    Raw, read-only stream of the decompressed contents of ``path``, decompressed on a background thread
+    up to ``READ_AHEAD`` chunks ahead of the reader.
+    """
+    def __init__(self, path, compression):
+        super(ThreadedDecompressor, self).__init__()
+        self.name = path
+        self._source = _decompressingFile(path, compression)
+        self._chunks = queue.Queue(READ_AHEAD)
+        self._stop = threading.Event()
+        self._current = memoryview(b"")
+        self._done = False
+        self._thread = threading.Thread(target= self._decompress, name= "soundDB-decompress")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _decompress(self):
+        try:
+            while not self._stop.is_set():
+                chunk = self._source.read(CHUNK)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except BaseException as e:
+            self._put(e)
+        finally:
+            self._source.close()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._chunks.put(item, timeout= 0.1)
+                return
+            except queue.Full:
+                pass
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while len(self._current) == 0:
+            if self._done:
+                return 0
+            chunk = self._chunks.get()
+            if isinstance(chunk, BaseException):
+                self._done = True
+                raise chunk
+            if not chunk:
+                self._done = True
+                return 0
+            self._current = memoryview(chunk)
+        n = min(len(b), len(self._current))
+        b[:n] = self._current[:n]
+        self._current = self._current[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            # unblock the thread if it's waiting to put a chunk
+            try:
+                while True:
+                    self._chunks.get_nowait()
+            except queue.Empty:
+                pass
+        super(ThreadedDecompressor, self).close()
+
+def openEntry(entry, text= False, encoding= "utf-8"):
+    """
+    Open the file for an ``iyore.Entry`` (or path) for reading, decompressing it if necessary.
+
+    Returns a binary, buffered file object (supporting ``peek``), or a text one if ``text`` is True.
+    """
+    path = str(entry)
+    compression = compressionOf(path)
+    if compression is None:
+        f = staging.openLocal(path, lambda path: open(path, "rb"))
+    else:
+        raw = staging.openLocal(path, lambda path: ThreadedDecompressor(path, compression))
+        f = io.BufferedReader(raw, buffer_size= CHUNK)
+    return io.TextIOWrapper(f, encoding= encoding) if text else f
+
+def openSeekable(entry):
+    """
+    Open the file for ``entry`` for reading at arbitrary positions, if it can be cheaply: i.e. it's uncompressed,
+    or a gzip file with a member index (see ``IndexedGzipFile``). Otherwise (seeking in it would mean decompressing
+    everything before the position sought), returns None.
+    """
+    path = str(entry)
+    compression = compressionOf(path)
+    if compression is None:
+        return staging.openLocal(path, lambda path: open(path, "rb"))
+    if compression == "gz":
+        try:
+            return staging.openLocal(path, lambda path: io.BufferedReader(IndexedGzipFile(path), buffer_size= CHUNK))
+        except NoMemberIndex:
+            pass
+    return None
+
+###
+# Gzip files made of independently-compressed members, with sizes in their headers
+###
+
+# FEXTRA subfield identifying a member's compressed and uncompressed sizes (both uint32, little-endian)
+SUBFIELD = b"SD"
+MEMBER_SIZE = 1 << 20
+
+class NoMemberIndex(ValueError):
+    pass
+
+def writeIndexedGzip(src, dst, level= 6, memberSize= MEMBER_SIZE):
+    """
+    Compress the file object ``src`` into the file object ``dst`` as a series of gzip members,
+    each holding ``memberSize`` bytes of uncompressed data.
+    """
+    while True:
+        data = src.read(memberSize)
+        if not data:
+            break
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        body = compressor.compress(data) + compressor.flush()
+        trailer = struct.pack("<II", zlib.crc32(data) & 0xffffffff, len(data) & 0xffffffff)
+        # header: 10 fixed bytes, 2 for the extra field's length, then the 12-byte extra field
+        memberLength = 10 + 2 + 12 + len(body) + len(trailer)
+        extra = SUBFIELD + struct.pack("<HII", 8, memberLength, len(data))
+
+        # magic, deflate, FEXTRA flag, no mtime, no extra flags, unknown OS
+        header = b"\x1f\x8b\x08\x04" + struct.pack("<I", 0) + b"\x00\xff" + struct.pack("<H", len(extra)) + extra
+        dst.write(header)
+        dst.write(body)
+        dst.write(trailer)
+
+def memberIndex(path):
+    """
+    List of ``(compressedOffset, uncompressedOffset)`` of each member in an indexed gzip file at ``path``,
+    read from the member headers alone. Raises ``NoMemberIndex`` if any member lacks its sizes.
+    """
+    index = []
+    compressed = uncompressed = 0
+    fileSize = os.path.getsize(path)
+    with open(path, "rb") as f:
+        while compressed < fileSize:
+            f.seek(compressed)
+            header = f.read(12)
+            if len(header) < 12 or header[:2] != b"\x1f\x8b" or not (bytearray(header)[3] & 0x04):
+                raise NoMemberIndex('"{}" has no gzip member index'.format(path))
+            xlen = struct.unpack("<H", header[10:12])[0]
+            extra = f.read(xlen)
+            sizes = None
+            position = 0
+            while position + 4 <= len(extra):
+                subfield, length = extra[position:position + 2], struct.unpack("<H", extra[position + 2:position + 4])[0]
+                if subfield == SUBFIELD and length == 8:
+                    sizes = struct.unpack("<II", extra[position + 4:position + 12])
+                    break
+                position += 4 + length
+            if sizes is None:
+                raise NoMemberIndex('"{}" has no gzip member index'.format(path))
+            index.append((compressed, uncompressed))
+            compressed += sizes[0]
+            uncompressed += sizes[1]
+    index.append((compressed, uncompressed))
+    return index
+
+class IndexedGzipFile(io.RawIOBase):
+    """
+    Seekable, read-only raw stream of the decompressed contents of an indexed gzip file.
+    Seeking only decompresses the one member containing the new position.
+    """
+    def __init__(self, path):
+        super(IndexedGzipFile, self).__init__()
+        self.name = path
+        self._index = memberIndex(path)
+        self._starts = [ uncompressed for compressed, uncompressed in self._index ]
+        self._file = open(path, "rb")
+        self._position = 0
+        self._member = None     # (member number, its decompressed bytes)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence= io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._starts[-1]
+        self._position = max(offset, 0)
+        return self._position
+
+    def _load(self, number):
+        if self._member is None or self._member[0] != number:
+            compressed, uncompressed = self._index[number]
+            self._file.seek(compressed)
+            raw = self._file.read(self._index[number + 1][0] - compressed)
+            # wbits 16 + MAX_WBITS: expect a gzip header and trailer
+            self._member = (number, zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(raw))
+        return self._member[1]
+
+    def readinto(self, b):
+        if self._position >= self._starts[-1]:
+            return 0
+        number = bisect.bisect_right(self._starts, self._position) - 1
+        data = self._load(number)
+        start = self._position - self._starts[number]
+        n = min(len(b), len(data) - start)
+        b[:n] = data[start:start + n]
+        self._position += n
+        return n
+
+    def close(self):
+        self._file.close()
+        super(IndexedGzipFile, self).close()
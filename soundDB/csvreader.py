@@ -0,0 +1,212 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import io
+import os
+import csv
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv
+except ImportError:
+    pa = None
+
+"""
+Reading the delimited text files of every text parser (NVSPL, SRCID, LoudEvents, Audibility, DailyPA) with either
+pandas' C parser (the default) or pyarrow's multithreaded CSV reader.
+
+Choose the engine per Accessor with ``engine=``, or for the whole process with ``soundDB.setCSVEngine("arrow")``
+or the ``SOUNDDB_CSV_ENGINE`` environment variable:
+
+- ``"c"``: ``pd.read_csv(engine= "c")``, one thread per file.
+- ``"arrow"``: pyarrow parses each file on several threads, with the date columns given an explicit timestamp
+  type (so they're converted natively, not by pandas afterwards), and builds the same standard pandas DataFrame
+  the C engine would have: same dtypes, column names, missing values, and ``-Infinity`` handling.
+- ``"arrow-dtypes"``: the same, but columns are left Arrow-backed (``pd.ArrowDtype``), saving the conversion.
+  The index is still a standard pandas index, so resampling and the like work as usual.
+
+Only numeric columns' types are inferred by Arrow, as the C engine infers them (a column of whole numbers stays
+int64). Wherever Arrow's reading would diverge from the C engine's---a column Arrow reads as a date or time which
+pandas would leave as strings, a string column pandas would read as numbers, options Arrow doesn't support
+(like ``comment``), or a file Arrow can't parse at all---that column is re-read as strings, or the whole file is
+parsed by the C engine instead, so results never depend on the engine.
+"""
+
+ENGINES = ("c", "arrow", "arrow-dtypes")
+# Bytes of file per block Arrow parses in parallel
+BLOCK_SIZE = 1 << 18
+
+# What pandas' C parser treats as missing and boolean by default
+try:
+    from pandas._libs.parsers import STR_NA_VALUES as _naValues
+except ImportError:
+    _naValues = { "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+                  "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null" }
+NA_VALUES = sorted(_naValues)
+TRUE_VALUES = ["True", "TRUE", "true"]
+FALSE_VALUES = ["False", "FALSE", "false"]
+
+# Keyword arguments the arrow engine handles itself; anything else goes to the C engine
+ARROW_KWARGS = { "sep", "index_col", "usecols", "parse_dates", "infer_datetime_format" }
+
+def checkEngine(engine):
+    """
+    Raise an error if ``engine`` isn't a usable CSV engine (None, meaning the global default, is fine)
+    """
+    if engine is None:
+        return
+    if engine not in ENGINES:
+        raise ValueError('Unknown CSV engine "{}"; must be one of {}'.format(engine, ", ".join(ENGINES)))
+    if engine != "c" and pa is None:
+        raise ImportError('The "{}" CSV engine requires pyarrow (pip install pyarrow)'.format(engine))
+
+def _engineFromEnvironment():
+    engine = os.environ.get("SOUNDDB_CSV_ENGINE") or "c"
+    checkEngine(engine)
+    return engine
+
+_engine = _engineFromEnvironment()
+
+def setCSVEngine(engine):
+    """
+    Parse text files with ``engine`` (``"c"``, ``"arrow"``, or ``"arrow-dtypes"``) by default, process-wide.
+    An Accessor's own ``engine=`` overrides this.
+    """
+    global _engine
+    checkEngine(engine)
+    _engine = engine or "c"
+
+def getCSVEngine():
+    return _engine
+
+def readCSV(f, engine= None, strings= (), **kwargs):
+    """
+    ``pd.read_csv(f, **kwargs)``, using ``engine`` (or the process-wide default, if None).
+
+    ``strings`` names columns which should always be read as strings (i.e. dates the parser converts itself):
+    with the arrow engine, giving them an explicit type saves inferring them.
+    """
+    engine = engine or _engine
+    if engine == "c" or set(kwargs) - ARROW_KWARGS:
+        return pd.read_csv(f, engine= "c", **kwargs)
+
+    checkEngine(engine)
+    raw = f.read()
+    try:
+        df = _readArrow(raw, engine == "arrow-dtypes", strings, **kwargs)
+    except (pa.ArrowException, ValueError, IndexError):
+        df = None
+    if df is None:
+        return pd.read_csv(io.BytesIO(raw), engine= "c", **kwargs)
+    return df
+
+def _header(raw, sep):
+    end = raw.find(b"\n")
+    line = (raw if end == -1 else raw[:end]).decode("utf-8").rstrip("\r")
+    return next(csv.reader([line], delimiter= str(sep)))
+
+def _mangle(names):
+    # Duplicate column names get ".1", ".2", etc., as pandas does
+    seen = {}
+    mangled = []
+    for name in names:
+        if name in seen:
+            seen[name] += 1
+            mangled.append("{}.{}".format(name, seen[name]))
+        else:
+            seen[name] = 0
+            mangled.append(name)
+    return mangled
+
+_datetimeDtype = []
+
+def _datetimeUnit():
+    # Whatever resolution this version of pandas gives dates it parses itself
+    if not _datetimeDtype:
+        _datetimeDtype.append( pd.read_csv(io.StringIO("date\n2000-01-01 00:00:00\n"), parse_dates= ["date"])["date"].dtype )
+    return _datetimeDtype[0]
+
+def _isTemporal(type):
+    return pa.types.is_timestamp(type) or pa.types.is_date(type) or pa.types.is_time(type)
+
+def _wouldBeNumeric(column):
+    # Whether the C engine would have read a string column as numbers (i.e. numbers padded with spaces, which Arrow doesn't accept)
+    values = column.drop_null()
+    if len(values) == 0:
+        return False
+    try:
+        float(values[0].as_py())
+    except ValueError:
+        return False
+    strings = pd.Series(values.to_pylist())
+    return bool(pd.to_numeric(strings, errors= "coerce").notna().all())
+
+def _readArrow(raw, arrowDtypes, strings, sep= ",", index_col= None, usecols= None, parse_dates= False, infer_datetime_format= None):
+    """
+    The DataFrame the C engine would read from the bytes ``raw``, read by Arrow,
+    or None if this file should be left to the C engine.
+    """
+    if len(raw) == 0 or (parse_dates not in (True, False)):
+        return None
+
+    names = _mangle(_header(raw, sep))
+    if usecols is not None:
+        wanted = { names[col] if isinstance(col, int) else col for col in usecols }
+        if not wanted.issubset(names):
+            return None
+        # In file order, like the C engine
+        included = [ name for name in names if name in wanted ]
+    else:
+        included = names
+
+    if index_col is None or index_col is False:
+        indexNames = []
+    else:
+        indexNames = [ included[i] if isinstance(i, int) else i for i in (index_col if isinstance(index_col, (list, tuple)) else [index_col]) ]
+    dateNames = indexNames if parse_dates is True else []
+
+    columnTypes = { name: pa.string() for name in strings if name in included }
+    columnTypes.update( (name, pa.timestamp("ns")) for name in dateNames )
+    table = pa.csv.read_csv(
+        pa.BufferReader(raw),
+        read_options= pa.csv.ReadOptions(column_names= names, skip_rows= 1, block_size= BLOCK_SIZE, use_threads= True),
+        parse_options= pa.csv.ParseOptions(delimiter= sep),
+        convert_options= pa.csv.ConvertOptions(
+            include_columns= included,
+            column_types= columnTypes,
+            null_values= NA_VALUES,
+            true_values= TRUE_VALUES,
+            false_values= FALSE_VALUES,
+            strings_can_be_null= True
+        )
+    )
+    if table.num_rows == 0:
+        return None
+
+    # Columns Arrow inferred as dates or times, which pandas would leave as strings: read them again, as strings
+    temporal = [ field.name for field in table.schema if _isTemporal(field.type) and field.name not in dateNames ]
+    if temporal:
+        return _readArrow(raw, arrowDtypes, list(strings) + temporal, sep, index_col, usecols, parse_dates)
+
+    for i, field in enumerate(table.schema):
+        if pa.types.is_string(field.type) and field.name not in columnTypes and _wouldBeNumeric(table.column(i)):
+            return None
+        if pa.types.is_null(field.type):
+            # An empty column is float NaNs to pandas
+            table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+
+    if arrowDtypes:
+        df = table.to_pandas(types_mapper= pd.ArrowDtype)
+        for name in dateNames:
+            df[name] = df[name].astype(_datetimeUnit())
+    else:
+        df = table.to_pandas()
+        for name in dateNames:
+            if df[name].dtype != _datetimeUnit():
+                df[name] = df[name].astype(_datetimeUnit())
+    if indexNames:
+        df = df.set_index(indexNames)
+    return df
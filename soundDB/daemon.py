@@ -0,0 +1,434 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import os
+import sys
+import time
+import pickle
+import socket
+import hashlib
+import binascii
+import tempfile
+import threading
+import traceback
+import warnings
+import collections
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+from . import memory
+from . import sharedmem
+from . import materialized
+from .atomicwrite import writeAtomic
+
+"""
+An optional long-lived local process which keeps parsed data and directory listings warm for every query on the machine.
+
+Start it once (in a terminal, or as a service) with ``soundDB.serveDaemon()``, then in each notebook or script,
+``soundDB.setDaemon()`` (or set the ``SOUNDDB_DAEMON`` environment variable to its address, or to ``default``).
+After that, Accessors are used exactly as before: the Entries matching a query are listed by the daemon, which
+remembers each listing for ``indexTTL`` seconds, and files are parsed by the daemon, which keeps the parsed data
+in memory (least-recently-used first out, up to ``cacheSize``) as long as the file's mtime and size don't change.
+So several analysts on one server, or the same analyst across sessions, share the work of parsing the archive.
+
+The operations chain still runs in the client, on the data it gets back. Parsed data comes back through shared
+memory when the client runs as the same user as the daemon (see ``sharedmem``), otherwise pickled over the socket.
+Queries with an ``executor`` or ``.group(workers= n)`` parse in their own workers, so they don't use the daemon.
+
+The daemon listens on a Unix socket (by default, ``soundDB-daemon.sock`` in the temp directory), or on Windows,
+on localhost. Requests are pickled Accessors and Endpoints, and unpickling runs code, so anyone who can connect
+to the daemon can run code as the user running it. So connections are always authenticated: unless it's given an
+``authkey``, the daemon makes one up and writes it to a file only its user can read (the socket's path plus ``.key``),
+where ``setDaemon`` finds it. The Unix socket is only open to that user, unless the daemon is started with
+``shared= True``; then other users can connect too, with the key (which the daemon prints for them).
+If the daemon goes away mid-query, the client warns and goes back to doing everything itself.
+"""
+
+DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), "soundDB-daemon.sock") if os.name == "posix" else ("localhost", 48790)
+
+_config = { "address": None, "authkey": None, "info": None }
+_local = threading.local()
+
+class DaemonError(Exception):
+    """
+    An error raised in the daemon, with its traceback as the message
+    """
+    pass
+
+def _addressOf(address):
+    if address is None or address == "default":
+        return DEFAULT_ADDRESS
+    if isinstance(address, (list, tuple)):
+        return (address[0], int(address[1]))
+    return address
+
+def _authkeyOf(authkey):
+    if isinstance(authkey, str):
+        return authkey.encode("utf-8")
+    return authkey
+
+def keyPathOf(address):
+    """
+    The file where the daemon at ``address`` keeps the authkey it made up
+    """
+    if isinstance(address, str):
+        return address + ".key"
+    return os.path.join(tempfile.gettempdir(), "soundDB-daemon-{}-{}.key".format(*address))
+
+def _readKey(address):
+    try:
+        with open(keyPathOf(address), "rb") as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+def _writeKey(path, authkey):
+    def write(tmp):
+        # readable only by this user, from the moment it's created
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(authkey)
+    writeAtomic(path, write)
+
+def _listening(address):
+    """
+    Whether something is accepting connections on the Unix socket at ``address``
+    """
+    sock = socket.socket(socket.AF_UNIX)
+    try:
+        sock.connect(address)
+        return True
+    except (OSError, socket.error):
+        return False
+    finally:
+        sock.close()
+
+###############
+# Server
+###############
+
+class Server(object):
+    """
+    The state of a running daemon: its caches of parsed data and of directory listings
+    """
+    def __init__(self, cacheSize= "4GB", indexTTL= 300):
+        self.cacheSize = memory.parseSize(cacheSize)
+        self.indexTTL = indexTTL
+        self.lock = threading.Lock()
+        # {key: (data, nbytes)}, least recently used first
+        self.parsed = collections.OrderedDict()
+        self.parsedBytes = 0
+        # {key: (time listed, [entries])}
+        self.listings = {}
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        with self.lock:
+            return {
+                "pid": os.getpid(),
+                "uid": os.getuid() if hasattr(os, "getuid") else None,
+                "cached": len(self.parsed),
+                "cachedBytes": self.parsedBytes,
+                "cacheSize": self.cacheSize,
+                "listings": len(self.listings),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def locate(self, key, endpoint, sort, n, filters):
+        now = time.time()
+        with self.lock:
+            listed = self.listings.get(key)
+            if listed is not None and now - listed[0] < self.indexTTL:
+                return listed[1]
+        entries = list(endpoint(sort= sort, n= n, **filters))
+        with self.lock:
+            self.listings[key] = (now, entries)
+            # forget expired listings, so queries that are never repeated don't pile up
+            for stale in [ k for k, (listedAt, e) in self.listings.items() if now - listedAt >= self.indexTTL ]:
+                del self.listings[stale]
+        return entries
+
+    def parse(self, key, accessor, path, state):
+        stat = os.stat(path)
+        key = (key, path, stat.st_mtime, stat.st_size)
+        with self.lock:
+            cached = self.parsed.pop(key, None)
+            if cached is not None:
+                self.parsed[key] = cached
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        data = accessor._parseEntry(path, state)
+        nbytes = memory.sizeOf(data)
+        if nbytes <= self.cacheSize:
+            with self.lock:
+                if key not in self.parsed:
+                    self.parsed[key] = (data, nbytes)
+                    self.parsedBytes += nbytes
+                while self.parsedBytes > self.cacheSize:
+                    oldKey, (oldData, oldBytes) = self.parsed.popitem(last= False)
+                    self.parsedBytes -= oldBytes
+        return data
+
+    def clear(self):
+        with self.lock:
+            self.parsed.clear()
+            self.parsedBytes = 0
+            self.listings.clear()
+
+    def answer(self, command, *args):
+        if command == "info":
+            return self.info()
+        if command == "locate":
+            return self.locate(*args)
+        if command == "parse":
+            key, accessor, path, state, transport = args
+            data = self.parse(key, accessor, path, state)
+            if not transport:
+                return data
+            return sharedmem.pack(data)
+        if command == "clear":
+            return self.clear()
+        raise ValueError("Unknown request {!r}".format(command))
+
+    def handle(self, conn):
+        """
+        Answer requests on ``conn`` until the client disconnects.
+
+        Shared memory sent to the client stays tracked here until the client makes its next request or disconnects:
+        by then, it has mapped (and unlinked) the segment, or never will, so whatever is left is freed.
+        """
+        sent = []
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                except Exception:
+                    conn.send(("error", traceback.format_exc()))
+                    continue
+                finally:
+                    settle(sent)
+
+                try:
+                    reply = ("ok", self.answer(*request))
+                except Exception:
+                    reply = ("error", traceback.format_exc())
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    sharedmem.release(reply[1])
+                    return
+                except Exception:
+                    # i.e. data that can't be pickled
+                    sharedmem.release(reply[1])
+                    conn.send(("error", traceback.format_exc()))
+                else:
+                    if isinstance(reply[1], sharedmem.Packed):
+                        sent.append(reply[1])
+        finally:
+            settle(sent)
+            conn.close()
+
+def settle(sent):
+    """
+    Free the shared memory of each ``Packed`` in ``sent`` that the client didn't unpack, and stop tracking
+    the rest (which the client unlinked), so this process's resource tracker doesn't try to unlink them again
+    """
+    for packed in sent:
+        if not sharedmem.release(packed):
+            sharedmem.handOff(packed)
+    del sent[:]
+
+def serveDaemon(address= None, authkey= None, cacheSize= "4GB", indexTTL= 300, shared= False):
+    """
+    Run the soundDB daemon in this process, until interrupted.
+
+    Parameters
+    ----------
+
+    address : str or (host, port), default None
+        Path of the Unix socket to listen on, or a ``(host, port)`` to listen on (use localhost).
+        Default: ``soundDB-daemon.sock`` in the temp directory, or on Windows, ``("localhost", 48790)``.
+
+    authkey : str or bytes, default None
+        Shared secret clients must give to ``setDaemon`` to connect. By default, a random one is made up and written
+        to a file only this user can read (see ``keyPathOf``), where ``setDaemon`` reads it from.
+
+    cacheSize : int or str, default "4GB"
+        Most memory to use for parsed data (bytes, or a string like ``"16GB"``).
+
+    indexTTL : float, default 300
+        Seconds to reuse a listing of the Entries matching a query before looking at the directories again.
+
+    shared : bool, default False
+        Let other users on this machine connect to the Unix socket, so they share the daemon. They need the authkey
+        (printed when the daemon starts, if it was made up) to connect, since anyone who can connect can run code
+        as this user. On Windows, the daemon listens on localhost, so any local user can reach it regardless.
+    """
+    address = _addressOf(address)
+    if isinstance(address, str) and os.path.exists(address):
+        if _listening(address):
+            raise RuntimeError("A soundDB daemon is already listening on {}".format(address))
+        # left over from a daemon that didn't shut down cleanly
+        os.remove(address)
+
+    keyPath = None
+    if authkey is None:
+        authkey = binascii.hexlify(os.urandom(16))
+        keyPath = keyPathOf(address)
+        _writeKey(keyPath, authkey)
+    authkey = _authkeyOf(authkey)
+
+    server = Server(cacheSize= cacheSize, indexTTL= indexTTL)
+    listener = Listener(address, authkey= authkey)
+    if isinstance(address, str):
+        os.chmod(address, 0o666 if shared else 0o600)
+    sharedmem.ensureTracker()
+    print("soundDB daemon listening on {} (pid {})".format(address, os.getpid()))
+    if shared and keyPath is not None:
+        print("Other users connect with soundDB.setDaemon({!r}, authkey= {!r})".format(address, authkey.decode("ascii")))
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, AuthenticationError) as e:
+                # i.e. a client that failed authentication
+                print("Refused connection: {}".format(e), file= sys.stderr)
+                continue
+            thread = threading.Thread(target= server.handle, args= (conn,), name= "soundDB-daemon-client")
+            thread.daemon = True
+            thread.start()
+    except KeyboardInterrupt:
+        print("soundDB daemon shutting down")
+    finally:
+        listener.close()
+        if keyPath is not None:
+            try:
+                os.remove(keyPath)
+            except OSError:
+                pass
+
+###############
+# Client
+###############
+
+def setDaemon(address= "default", authkey= None):
+    """
+    List and parse files through the soundDB daemon at ``address`` (see ``serveDaemon``); ``"default"`` for the default
+    address. Pass None to stop using a daemon. Raises an error if the daemon can't be reached.
+
+    ``authkey`` is the daemon's: by default, the one it made up, if this user can read it.
+    """
+    _disconnect()
+    if address is None:
+        _config.update(address= None, authkey= None, info= None)
+        return
+    address = _addressOf(address)
+    _config.update(address= address, authkey= _authkeyOf(authkey) if authkey is not None else _readKey(address))
+    try:
+        _config["info"] = _request("info")
+    except Exception:
+        _config.update(address= None, authkey= None, info= None)
+        raise
+
+def enabled():
+    return _config["address"] is not None
+
+def info():
+    """
+    The daemon's process ID and cache statistics, or None if not using a daemon
+    """
+    return _request("info") if enabled() else None
+
+def _connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = Client(_config["address"], authkey= _config["authkey"])
+        _local.conn = conn
+    return conn
+
+def _disconnect():
+    conn = getattr(_local, "conn", None)
+    _local.conn = None
+    if conn is not None:
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+def _request(*request):
+    conn = _connection()
+    try:
+        conn.send(request)
+        status, result = conn.recv()
+    except BaseException:
+        # the reply (if any) would be read by the next request on this connection
+        _disconnect()
+        raise
+    if status == "error":
+        raise DaemonError(result)
+    return result
+
+def _lost(e):
+    warnings.warn("Lost the connection to the soundDB daemon ({}); continuing without it".format(e))
+    _disconnect()
+    _config.update(address= None, authkey= None, info= None)
+
+def locate(endpoint, sort, n, filters):
+    """
+    The Entries of ``endpoint`` matching the query, listed by the daemon, or None to list them in this process
+    (i.e. if a filter or the sort can't be pickled, or there is no daemon)
+    """
+    if not enabled() or getattr(endpoint, "prefetch", None) is not None or "items" in filters:
+        # federated endpoints read ahead on threads in this process, and ``items`` is usually an iterator
+        return None
+    try:
+        request = pickle.dumps((endpoint, sort, n, filters), protocol= pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+    try:
+        return _request("locate", hashlib.sha1(request).hexdigest(), endpoint, sort, n, filters)
+    except (EOFError, OSError) as e:
+        _lost(e)
+        return None
+
+def parse(accessor, entry, state):
+    """
+    The data of ``entry``, parsed by the daemon (or from its cache); parsed in this process if the daemon went away
+    """
+    key = materialized.fingerprint(
+        type(accessor).__module__, type(accessor).__name__, accessor._prepareStateParams,
+        accessor._engine, repr(accessor._sample), state
+    )
+    transport = sharedmem.available() and _config["info"] is not None and \
+        _config["info"].get("uid") is not None and _config["info"]["uid"] == getattr(os, "getuid", lambda: None)()
+    try:
+        packed = _request("parse", key, accessor, os.path.abspath(str(entry)), state, transport)
+    except (EOFError, OSError) as e:
+        _lost(e)
+        return accessor._parseEntry(entry, state)
+    try:
+        return sharedmem.unpack(packed)
+    except BaseException:
+        # (the daemon would free it at our next request anyway)
+        sharedmem.release(packed)
+        raise
+
+def _configureFromEnvironment():
+    address = os.environ.get("SOUNDDB_DAEMON")
+    if address:
+        if ":" in address and os.path.sep not in address:
+            host, port = address.rsplit(":", 1)
+            address = (host, int(port))
+        try:
+            setDaemon(address, os.environ.get("SOUNDDB_DAEMON_AUTHKEY"))
+        except Exception as e:
+            warnings.warn("Couldn't connect to the soundDB daemon at {!r} ({}); not using it".format(address, e))
+
+_configureFromEnvironment()
@@ -0,0 +1,324 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+from past.builtins import basestring
+
+import re
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+"""
+Decibel algebra on NVSPL data: ``soundDB.decibels.energyMean(df)``, ``soundDB.decibels.weightedLevels(df, "A")``, etc.
+
+Sound levels are averaged and summed by energy (``10 ** (L / 10)``), not arithmetically. ``-Infinity`` (silence,
+as NVSPL files write it) is zero energy, so it counts toward a mean but adds nothing; NaN is missing data, which is
+skipped when ``skipna`` is True (the default), as pandas does. A mean of nothing but NaN is NaN, and a sum or mean
+of nothing but silence is ``-inf``.
+
+Every function takes numpy arrays, pandas objects, or xarray objects, and returns the same kind of thing.
+With a pandas DataFrame, only its sound level columns are used (the 1/3rd-octave bands, ``dbA``, ``dbC``, and
+``dbF``, by either the parser's names like ``"12.5"`` or the file's like ``"H12p5"``), so a whole NVSPL frame can be
+given as-is. Reductions go along ``axis`` (default 0, i.e. over time for a DataFrame, like ``DataFrame.mean``),
+or for xarray, along the dimension ``dim``.
+
+Large arrays (i.e. a year of 1-second levels) are converted to energy a block of rows at a time, into one reused
+buffer, so memory use doesn't double and the work stays in cache; conversions are done in place where possible.
+"""
+
+# Rows of energy converted at once are kept to about this many bytes
+BLOCK_BYTES = 1 << 22
+
+# ln(10) / 10: 10 ** (L / 10) == exp(L * ENERGY_SCALE), and exp is much faster than a power
+ENERGY_SCALE = np.log(10.0) / 10.0
+
+# The 33 1/3rd-octave bands of NVSPL data (12.5 Hz to 20 kHz), as the parser names them
+BANDS = [
+    '12.5', '15.8', '20', '25', '31.5', '40', '50', '63', '80', '100',
+    '125', '160', '200', '250', '315', '400', '500', '630', '800', '1000',
+    '1250', '1600', '2000', '2500', '3150', '4000', '5000', '6300', '8000',
+    '10000', '12500', '16000', '20000'
+]
+# Exact base-10 center frequencies of the bands (bands -19 to 13 relative to 1 kHz)
+bandCenters = 1000.0 * 10 ** (np.arange(-19, 14) / 10.0)
+# Their nominal frequencies, which band limits are given in (i.e. 20 Hz, not 19.95)
+nominalCenters = np.array(BANDS, dtype= np.float64)
+LEVELS = BANDS + ['dbA', 'dbC', 'dbF']
+
+# Frequency weightings (dB) of each band, at its nominal frequency, per IEC 61672-1. Z is unweighted.
+WEIGHTINGS = {
+    "A": np.array([
+        -63.4, -56.7, -50.5, -44.7, -39.4, -34.6, -30.2, -26.2, -22.5, -19.1,
+        -16.1, -13.4, -10.9, -8.6, -6.6, -4.8, -3.2, -1.9, -0.8, 0.0,
+        0.6, 1.0, 1.2, 1.3, 1.2, 1.0, 0.5, -0.1, -1.1,
+        -2.5, -4.3, -6.6, -9.3
+    ]),
+    "C": np.array([
+        -11.2, -8.5, -6.2, -4.4, -3.0, -2.0, -1.3, -0.8, -0.5, -0.3,
+        -0.2, -0.1, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0,
+        0.0, -0.1, -0.2, -0.3, -0.5, -0.8, -1.3, -2.0, -3.0,
+        -4.4, -6.2, -8.5, -11.2
+    ]),
+    "Z": np.zeros(len(BANDS)),
+}
+
+def toEnergy(levels, out= None):
+    """
+    Energy ``10 ** (levels / 10)`` of sound levels in dB: ``-inf`` becomes 0, NaN stays NaN.
+    Written into ``out`` (which may be ``levels`` itself) if given.
+    """
+    if isinstance(levels, (pd.DataFrame, pd.Series, xr.DataArray, xr.Dataset)):
+        return np.exp(levels * ENERGY_SCALE)
+    out = np.multiply(levels, ENERGY_SCALE, out= out)
+    return np.exp(out, out= out) if isinstance(out, np.ndarray) else np.exp(out)
+
+def toLevels(energy, out= None):
+    """
+    Sound levels ``10 * log10(energy)`` in dB of energy: 0 becomes ``-inf``, NaN stays NaN.
+    Written into ``out`` (which may be ``energy`` itself) if given.
+    """
+    with np.errstate(divide= "ignore", invalid= "ignore"):
+        if isinstance(energy, (pd.DataFrame, pd.Series, xr.DataArray, xr.Dataset)):
+            return 10.0 * np.log10(energy)
+        out = np.log10(energy, out= out)
+        return np.multiply(out, 10.0, out= out) if isinstance(out, np.ndarray) else 10.0 * out
+
+def levelColumnsOf(df):
+    """
+    The sound level columns of the DataFrame ``df``, by either the parser's names (i.e. "12.5") or the file's (i.e. "H12p5")
+    """
+    return [ column for column in df.columns if _parsedName(column) in LEVELS ]
+
+def _parsedName(column):
+    if isinstance(column, basestring) and re.match(r"^H\d+p?\d*$", column):
+        return column[1:].replace("p", ".")
+    return column
+
+###############
+# Reductions
+###############
+
+def _energyTotals(values, axis, skipna):
+    """
+    ``(total energy, number of values)`` of the levels ``values`` along ``axis`` (None for all of them),
+    skipping NaNs if ``skipna``. Converted to energy a block of rows at a time, into one buffer.
+    """
+    values = np.asarray(values, dtype= np.float64)
+    if values.ndim == 0:
+        values = values.reshape(1)
+    if isinstance(axis, tuple):
+        # several axes (i.e. from xarray): move them to the end, as one
+        values = np.moveaxis(values, axis, range(-len(axis), 0))
+        values = values.reshape(values.shape[:values.ndim - len(axis)] + (-1,))
+        axis = -1
+    if axis is not None:
+        axis = axis % values.ndim
+
+    outShape = () if axis is None else values.shape[:axis] + values.shape[axis + 1:]
+    total = np.zeros(outShape)
+    count = np.zeros(outShape)
+    rowSize = max(1, int(np.prod(values.shape[1:])))
+    step = max(1, BLOCK_BYTES // (8 * rowSize))
+    buffer = np.empty((min(step, len(values)),) + values.shape[1:])
+
+    for start in range(0, len(values), step):
+        block = values[start : start + step]
+        energy = toEnergy(block, out= buffer[:len(block)])
+        blockCount = block.size if axis is None else block.shape[axis]
+        if skipna:
+            missing = np.isnan(energy)
+            if missing.any():
+                energy[missing] = 0
+                blockCount = blockCount - missing.sum(axis= axis)
+        blockSum = energy.sum(axis= axis)
+        if axis is None or axis == 0:
+            total += blockSum
+            count += blockCount
+        else:
+            # the first axis isn't reduced, so each block gives its own rows of the result
+            total[start : start + step] = blockSum
+            count[start : start + step] = blockCount
+    return total, count
+
+def _reduce(levels, reduction, axis, dim, skipna):
+    """
+    Apply ``reduction(values, axis, skipna)`` (a function of a float array) to ``levels``, keeping its labels
+    """
+    if isinstance(levels, (xr.DataArray, xr.Dataset)):
+        if dim is not None:
+            return levels.reduce(reduction, dim= dim, skipna= skipna)
+        return levels.reduce(reduction, axis= axis, skipna= skipna)
+    if isinstance(levels, pd.DataFrame):
+        columns = levelColumnsOf(levels)
+        levels = levels[columns] if columns else levels
+        result = reduction(levels.to_numpy(dtype= np.float64), axis= axis, skipna= skipna)
+        if axis is None:
+            return result
+        return pd.Series(result, index= levels.columns if axis in (0, -2) else levels.index)
+    if isinstance(levels, pd.Series):
+        return reduction(levels.to_numpy(dtype= np.float64), axis= None, skipna= skipna)
+    return reduction(levels, axis= axis, skipna= skipna)
+
+def _sum(values, axis= None, skipna= True):
+    total, count = _energyTotals(values, axis, skipna)
+    # nothing but NaN sums to NaN, not silence
+    total[count == 0] = np.nan
+    # a 0-d result (of axis= None) as a scalar
+    return toLevels(total, out= total)[()]
+
+def _mean(values, axis= None, skipna= True):
+    total, count = _energyTotals(values, axis, skipna)
+    with np.errstate(divide= "ignore", invalid= "ignore"):
+        np.divide(total, count, out= total)
+    return toLevels(total, out= total)[()]
+
+def energySum(levels, axis= 0, dim= None, skipna= True):
+    """
+    Energy sum of sound levels (i.e. of the levels of several sources): ``10 * log10(sum(10 ** (levels / 10)))``,
+    along ``axis``, or for xarray, the dimension ``dim``. ``axis= None`` sums everything.
+    """
+    return _reduce(levels, _sum, axis, dim, skipna)
+
+def energyMean(levels, axis= 0, dim= None, skipna= True):
+    """
+    Energy average of sound levels (Leq): ``10 * log10(mean(10 ** (levels / 10)))``,
+    along ``axis``, or for xarray, the dimension ``dim``. ``axis= None`` averages everything.
+    """
+    return _reduce(levels, _mean, axis, dim, skipna)
+
+def energyMeanOf(*levels, **kwargs):
+    """
+    Element-wise energy average of several sets of sound levels of the same shape (aligned, for pandas and xarray),
+    i.e. ``energyMeanOf(day, night)``. Takes ``skipna`` (default True) as a keyword.
+    """
+    skipna = kwargs.pop("skipna", True)
+    if kwargs:
+        raise TypeError("Unexpected keyword arguments: {}".format(", ".join(kwargs)))
+    if len(levels) == 0:
+        raise TypeError("energyMeanOf needs at least one set of levels")
+
+    total = count = None
+    for level in levels:
+        energy = toEnergy(level if not isinstance(level, (list, tuple)) else np.asarray(level, dtype= np.float64))
+        if skipna:
+            present = 1.0 - np.isnan(energy)
+            # fmax ignores NaN, and energy is never negative
+            energy = np.fmax(energy, 0.0)
+            count = present if count is None else count + present
+        total = energy if total is None else total + energy
+    if not skipna:
+        count = len(levels)
+    with np.errstate(divide= "ignore", invalid= "ignore"):
+        return toLevels(total / count)
+
+###############
+# Frequency weighting
+###############
+
+def _bandGains(labels, weightings):
+    """
+    (bands x weightings) matrix of linear power gains for the bands ``labels`` (names, or None for all 33 in order)
+    """
+    if labels is None:
+        positions = np.arange(len(BANDS))
+    else:
+        names = [ _parsedName(label) for label in labels ]
+        unknown = [ label for label, name in zip(labels, names) if name not in BANDS ]
+        if unknown:
+            raise ValueError("Not 1/3rd-octave bands: {}".format(", ".join(str(label) for label in unknown)))
+        positions = np.array([ BANDS.index(name) for name in names ], dtype= int)
+
+    gains = []
+    for weighting in weightings:
+        if isinstance(weighting, basestring):
+            if weighting not in WEIGHTINGS:
+                raise ValueError('Unknown weighting "{}"; must be one of {}'.format(weighting, ", ".join(sorted(WEIGHTINGS))))
+            gains.append(toEnergy(WEIGHTINGS[weighting][positions]))
+        else:
+            # (low, high): the bands with nominal centers in that range, unweighted
+            low, high = weighting
+            centers = nominalCenters[positions]
+            gains.append(((centers >= (low or 0)) & (centers <= (high if high is not None else np.inf))).astype(np.float64))
+    return np.column_stack(gains)
+
+def _weight(values, gains, skipna):
+    """
+    Levels of the (..., bands) array ``values`` weighted by each column of ``gains`` (bands x weightings):
+    a matrix product of energy, a block of rows at a time
+    """
+    values = np.asarray(values, dtype= np.float64)
+    if values.shape[-1] != gains.shape[0]:
+        raise ValueError("Expected {} bands along the last axis, not {}".format(gains.shape[0], values.shape[-1]))
+    rows = values.reshape(-1, values.shape[-1])
+    result = np.empty((len(rows), gains.shape[1]))
+    step = max(1, BLOCK_BYTES // (8 * max(1, rows.shape[1])))
+    buffer = np.empty((min(step, len(rows)), rows.shape[1]))
+
+    for start in range(0, len(rows), step):
+        block = rows[start : start + step]
+        energy = toEnergy(block, out= buffer[:len(block)])
+        out = result[start : start + step]
+        if skipna:
+            missing = np.isnan(energy)
+            if missing.any():
+                energy[missing] = 0
+                np.dot(energy, gains, out= out)
+                out[missing.all(axis= 1)] = np.nan
+                continue
+        np.dot(energy, gains, out= out)
+    toLevels(result, out= result)
+    return result.reshape(values.shape[:-1] + (gains.shape[1],))
+
+def _weighted(levels, weightings, names, axis, dim, skipna):
+    """
+    ``levels`` weighted by each of ``weightings`` (weighting names, or (low, high) band limits), named ``names``
+    """
+    single = len(weightings) == 1
+    if isinstance(levels, pd.DataFrame):
+        bands = [ column for column in levels.columns if _parsedName(column) in BANDS ]
+        if not bands:
+            raise ValueError("No 1/3rd-octave band columns to weight")
+        result = _weight(levels[bands].to_numpy(dtype= np.float64), _bandGains(bands, weightings), skipna)
+        if single:
+            return pd.Series(result[:, 0], index= levels.index, name= names[0])
+        return pd.DataFrame(result, index= levels.index, columns= names)
+
+    if isinstance(levels, (xr.DataArray, xr.Dataset)):
+        if dim is None:
+            dim = levels.dims[axis] if isinstance(levels, xr.DataArray) else None
+        if dim is None:
+            raise TypeError("Give the dimension of the bands as dim=")
+        labels = levels[dim].values.tolist() if dim in levels.coords else None
+        gains = _bandGains(labels, weightings)
+        result = xr.apply_ufunc(
+            _weight, levels, input_core_dims= [[dim]], output_core_dims= [["weighting"]],
+            kwargs= { "gains": gains, "skipna": skipna }, dask= "allowed"
+        )
+        result = result.assign_coords(weighting= names)
+        return result.isel(weighting= 0, drop= True) if single else result
+
+    values = np.asarray(levels, dtype= np.float64)
+    values = np.moveaxis(values, axis, -1) if axis not in (-1, values.ndim - 1) else values
+    result = _weight(values, _bandGains(None, weightings), skipna)
+    return result[..., 0] if single else result
+
+def weightedLevels(levels, weightings= "A", axis= -1, dim= None, skipna= True):
+    """
+    Overall A-, C-, or Z-weighted levels (``"A"``, ``"C"``, ``"Z"``) recomputed from 1/3rd-octave band levels.
+
+    For a DataFrame, the bands are its band columns (any of the 33, by name), and the result is a Series named
+    i.e. ``"dbA"``, or with several ``weightings`` (i.e. ``["A", "C", "Z"]``), a DataFrame with a column for each.
+    For a numpy array, ``axis`` holds all 33 bands, in order, and is replaced by the weightings (or dropped, for one).
+    For xarray, ``dim`` holds the bands (labeled by name, or all 33 in order), and is replaced by a ``weighting`` dimension.
+    """
+    weightings = [weightings] if isinstance(weightings, basestring) else list(weightings)
+    return _weighted(levels, weightings, [ "db" + weighting for weighting in weightings ], axis, dim, skipna)
+
+def bandLevel(levels, low= None, high= None, axis= -1, dim= None, skipna= True):
+    """
+    Unweighted level of the 1/3rd-octave bands with nominal center frequencies from ``low`` to ``high`` Hz (inclusive;
+    None for no limit), i.e. ``bandLevel(df, 20, 1000)``. Bands are found as in ``weightedLevels``.
+    """
+    name = "db{}-{}".format("{:g}".format(low) if low is not None else "", "{:g}".format(high) if high is not None else "")
+    return _weighted(levels, [(low, high)], [name], axis, dim, skipna)
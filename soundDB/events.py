@@ -0,0 +1,146 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import numpy as np
+import pandas as pd
+
+"""
+Relating SRCID noise events to the NVSPL seconds they cover.
+
+Events are half-open intervals ``[start, start + len)``, where ``start`` is the index of a SRCID DataFrame
+and ``len`` is its ``len`` column. Looking up which event (if any) each second falls in is done for all
+seconds at once with a binary search over the sorted event start times, so it's fast even for many events.
+"""
+
+def nanoseconds(index):
+    """
+    Times in a DatetimeIndex as int64 nanoseconds since the epoch
+    """
+    return np.asarray(pd.DatetimeIndex(index).values, dtype= "datetime64[ns]").astype(np.int64)
+
+def eventIntervals(events):
+    """
+    Sorted start and end times of the events in a SRCID DataFrame, as int64 nanoseconds,
+    along with the positions of those events in ``events``.
+
+    Rows with no length (days without noise events) are skipped.
+    """
+    hasLength = events["len"].notnull().values
+    starts = nanoseconds(events.index)[hasLength]
+    ends = starts + pd.to_timedelta(events["len"]).values[hasLength].astype("timedelta64[ns]").astype(np.int64)
+    positions = np.flatnonzero(hasLength)
+
+    order = np.argsort(starts, kind= "mergesort")
+    return starts[order], ends[order], positions[order]
+
+def eventPositions(times, starts, ends):
+    """
+    For each of ``times`` (int64 nanoseconds), the position in ``starts``/``ends`` of the event containing it, or -1.
+
+    If events overlap, the one that started most recently is chosen.
+    """
+    if len(starts) == 0:
+        return np.full(len(times), -1, dtype= np.intp)
+
+    # An earlier, longer event may still cover a time after a later one has ended,
+    # so also keep track of which event reaches the furthest up to each position
+    furthestEnd = np.maximum.accumulate(ends)
+    furthest = np.maximum.accumulate(np.where(ends == furthestEnd, np.arange(len(ends)), 0))
+
+    latest = np.searchsorted(starts, times, side= "right") - 1
+    started = latest >= 0
+    latest = np.where(started, latest, 0)
+
+    inLatest = started & (times < ends[latest])
+    inAny = started & (times < furthestEnd[latest])
+    return np.where(inLatest, latest, np.where(inAny, furthest[latest], -1))
+
+def eventMask(index, events):
+    """
+    Boolean Series, indexed by ``index`` (a DatetimeIndex, or anything with one), of whether each time falls within any
+    event in the SRCID DataFrame ``events``.
+
+    So ``data[~eventMask(data, srcid)]`` gives just the NVSPL seconds outside of noise events, i.e. natural ambient.
+    """
+    if not isinstance(index, pd.DatetimeIndex):
+        index = index.index
+    starts, ends, positions = eventIntervals(events)
+    return pd.Series(eventPositions(nanoseconds(index), starts, ends) >= 0, index= index, name= "event")
+
+def overlappingHours(events):
+    """
+    Set of ``(year, month, day, hour)`` tuples (as ints) of every hour any event in ``events`` overlaps
+    """
+    starts, ends, positions = eventIntervals(events)
+    hour = np.int64(pd.Timedelta(hours= 1).value)
+    firstHours = starts // hour
+    lastHours = (ends - 1) // hour
+    counts = np.maximum(lastHours - firstHours + 1, 1)
+
+    hours = np.repeat(firstHours, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+    hours = pd.to_datetime(np.unique(hours) * hour)
+    return set(zip(hours.year, hours.month, hours.day, hours.hour))
+
+def duringEvents(events, nvspl, how= "rows"):
+    """
+    Read the NVSPL seconds during each SRCID event.
+
+    Only the hourly NVSPL Entries that overlap an event are read, judged by their ``year``, ``month``, ``day``,
+    and ``hour`` fields. (If the NVSPL Endpoint doesn't have those fields, every Entry is read.)
+
+    Parameters
+    ----------
+    events : pandas.DataFrame
+
+        SRCID data, as returned by ``soundDB.srcid``: indexed by event start time, with a ``len`` column of Timedeltas.
+        Events should all be from the same site as ``nvspl``.
+
+    nvspl : soundDB.nvspl Accessor
+
+        The NVSPL data to read, i.e. ``soundDB.nvspl(ds, site= "WEBU", year= "2015", columns= [...])``.
+        Any operations chained onto it are applied to each file, and should leave a time-indexed pandas structure.
+
+    how : {"rows", "mask"}, default "rows"
+
+        If ``"rows"``, return a DataFrame of just the NVSPL seconds within an event, with the added columns ``event``
+        (the start time of the event, which is its index in ``events``) and ``srcID`` (if ``events`` has it).
+        If ``"mask"``, return a boolean Series of whether each NVSPL second read falls within any event.
+    """
+    if how not in ("rows", "mask"):
+        raise ValueError('how must be "rows" or "mask", not "{}"'.format(how))
+
+    starts, ends, positions = eventIntervals(events)
+    hours = overlappingHours(events)
+
+    if nvspl._progbar is None:
+        nvspl._progbar = True
+
+    state = nvspl.prepareState(nvspl._endpoint, nvspl._filters, **nvspl._prepareStateParams)
+    entries = nvspl._locate()
+    if all(field in nvspl._endpoint.fields for field in ("year", "month", "day", "hour")):
+        entries = [ entry for entry in entries if (int(entry.year), int(entry.month), int(entry.day), int(entry.hour)) in hours ]
+
+    pieces = []
+    for key, data in nvspl._run(entries, state):
+        containing = eventPositions(nanoseconds(data.index), starts, ends)
+        if how == "mask":
+            pieces.append( pd.Series(containing >= 0, index= data.index, name= "event") )
+        else:
+            inEvent = containing >= 0
+            if not inEvent.any():
+                continue
+            rows = data[inEvent]
+            if isinstance(rows, pd.Series):
+                rows = rows.to_frame()
+            else:
+                rows = rows.copy()
+            eventRows = positions[containing[inEvent]]
+            rows["event"] = events.index[eventRows]
+            if "srcID" in events.columns:
+                rows["srcID"] = events["srcID"].values[eventRows]
+            pieces.append(rows)
+
+    if len(pieces) == 0:
+        return pd.Series([], dtype= bool, name= "event") if how == "mask" else pd.DataFrame(columns= ["event"])
+    return pd.concat(pieces)
@@ -0,0 +1,146 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import os
+import collections
+import traceback
+import concurrent.futures
+
+from . import memory
+from . import sharedmem
+from . import operations
+
+"""
+Parsing Entries on a ``concurrent.futures.Executor`` or a Dask distributed ``Client``.
+
+Each file is parsed by a task which gets the path to the file (not the ``iyore.Entry`` itself) and a pickled copy
+of the Accessor, which only carries what's needed to parse (see ``Accessor.__getstate__``).
+So on a process pool or a Dask cluster, every worker must be able to reach the files at the same paths
+as the machine running the query, i.e. through a shared drive.
+
+Tasks are submitted in windows of a few times the executor's parallelism, largest files first within each window,
+so that one huge file started last doesn't leave every other worker idle while it finishes.
+Results are still yielded in the original order of the Entries, so sorting and ``.group()`` work as usual.
+
+The operations chained onto the Accessor before any ``.group()`` are applied in the task too, right after parsing,
+so only their result is sent back (on a process pool, only if the operations can be pickled; see ``operations``).
+On a local process pool, parsed data comes back through shared memory rather than being pickled (see ``sharedmem``).
+
+If a memory limit is set (see ``soundDB.setMemoryLimit``), fewer tasks are submitted at once
+when the results they're expected to produce wouldn't fit in the remaining budget.
+"""
+
+def parseTask(accessor, path, state, transport= False, ops= ()):
+    data = accessor._parseEntry(path, state)
+    if ops:
+        data = operations.Fused(ops)(data)
+    return sharedmem.pack(data) if transport else data
+
+def canSend(executor, ops):
+    """
+    Whether the operations ``ops`` can be run in ``executor``'s tasks
+    """
+    if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+        return operations.picklable(*ops)
+    # Threads share the operations as-is, and Dask pickles functions (even lambdas) itself
+    return True
+
+def isDaskClient(executor):
+    return type(executor).__module__.split(".")[0] == "distributed"
+
+def parallelism(executor):
+    """
+    Best guess at how many tasks ``executor`` runs at once
+    """
+    if isDaskClient(executor):
+        try:
+            return max(sum(executor.nthreads().values()), 1)
+        except Exception:
+            return os.cpu_count() or 1
+    return getattr(executor, "_max_workers", None) or os.cpu_count() or 1
+
+def entrySize(entry):
+    try:
+        return os.path.getsize(str(entry))
+    except OSError:
+        return 0
+
+def parseAll(accessor, entries, state, executor, retries= 0, ops= ()):
+    """
+    Parse ``entries`` on ``executor`` and apply the operations ``ops`` to each, yielding ``(entry, data, error)``
+    in the order of ``entries``.
+
+    ``error`` is None if parsing succeeded, otherwise the formatted traceback of the last failed attempt
+    (after retrying up to ``retries`` times), or the ``operations.OperationError`` if one of ``ops`` failed
+    (which isn't retried), and ``data`` is None.
+    Closing the generator cancels any tasks that haven't finished.
+    """
+    dask = isDaskClient(executor)
+    window = 4 * parallelism(executor)
+    transport = isinstance(executor, concurrent.futures.ProcessPoolExecutor) and sharedmem.available()
+    if transport:
+        sharedmem.ensureTracker()
+
+    def submit(entry):
+        path = str(entry)
+        if dask:
+            # Dask retries failed tasks itself, and schedules higher-priority tasks first
+            return executor.submit(parseTask, accessor, path, state, False, ops, priority= entrySize(entry), retries= retries, pure= False)
+        else:
+            return executor.submit(parseTask, accessor, path, state, transport, ops)
+
+    entries = iter(entries)
+    held = []   # the next Entry, if it was taken from ``entries`` but didn't fit in the memory budget
+    pending = collections.deque()   # [entry, attemptsLeft, future, expectedBytes], in the order of ``entries``
+
+    def refill():
+        room = memory.available() - sum(expected for entry, attemptsLeft, future, expected in pending)
+        batch = []
+        while len(pending) + len(batch) < window:
+            entry = held.pop() if held else next(entries, None)
+            if entry is None:
+                break
+            size = entrySize(entry)
+            expected = memory.estimate(size) or 0
+            if expected > room and (pending or batch):
+                # Always keep at least one task going, even if it alone is expected to be over budget
+                held.append(entry)
+                break
+            room -= expected
+            batch.append((entry, size, expected))
+
+        if dask:
+            submitted = { id(entry): submit(entry) for entry, size, expected in batch }
+        else:
+            # Submit largest files first; the executor starts tasks in the order it gets them
+            bySize = sorted(batch, key= lambda entryAndSize: entryAndSize[1], reverse= True)
+            submitted = { id(entry): submit(entry) for entry, size, expected in bySize }
+        pending.extend( [entry, retries, submitted[id(entry)], expected] for entry, size, expected in batch )
+
+    try:
+        refill()
+        while pending:
+            entry, attemptsLeft, future, expected = pending[0]
+            try:
+                data = sharedmem.unpack(future.result())
+            except operations.OperationError as e:
+                pending.popleft()
+                yield entry, None, e
+            except Exception:
+                if not dask and attemptsLeft > 0:
+                    pending[0] = [entry, attemptsLeft - 1, submit(entry), expected]
+                    continue
+                pending.popleft()
+                yield entry, None, traceback.format_exc()
+            else:
+                pending.popleft()
+                yield entry, data, None
+
+            if len(pending) <= window // 2 or held:
+                refill()
+    finally:
+        for entry, attemptsLeft, future, expected in pending:
+            if not future.cancel() and transport:
+                # already running (or done): free its shared memory once it finishes
+                sharedmem.releaseWhenDone(future)
@@ -0,0 +1,193 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+from future.utils import iteritems
+
+import os
+import threading
+import collections
+
+from . import memory
+from . import staging
+from . import executors
+from . import compression
+from . import operations
+from . import daemon
+from . import zonemaps
+
+"""
+Describing what an Accessor query will do---without reading any data---for ``Accessor.explain()``.
+
+Parse throughput (bytes of file per second, on one thread) is measured for every file parsed in this session,
+per kind of Accessor, and used to estimate how long a query will take.
+"""
+
+# Weight of the newest measurement in the moving average of throughput
+SMOOTHING = 0.2
+
+_lock = threading.Lock()
+# {Accessor class name: [bytes per second (moving average), files measured]}
+_throughput = {}
+
+def record(accessor, path, seconds):
+    """
+    Record that parsing the file at ``path`` took ``seconds``
+    """
+    try:
+        nbytes = os.path.getsize(path)
+    except OSError:
+        return
+    if seconds <= 0 or nbytes == 0:
+        return
+    rate = nbytes / seconds
+    name = type(accessor).__name__
+    with _lock:
+        if name not in _throughput:
+            _throughput[name] = [rate, 1]
+        else:
+            average, count = _throughput[name]
+            _throughput[name] = [(1 - SMOOTHING) * average + SMOOTHING * rate, count + 1]
+
+def throughput(accessor):
+    """
+    ``(bytes per second, files measured)`` for parsing this kind of Accessor, or None if none have been parsed yet
+    """
+    measured = _throughput.get(type(accessor).__name__)
+    return tuple(measured) if measured is not None else None
+
+def formatDuration(seconds):
+    if seconds < 60:
+        return "{:.1f} s".format(seconds)
+    if seconds < 3600:
+        return "{:.1f} min".format(seconds / 60)
+    return "{:.1f} h".format(seconds / 3600)
+
+def describeOp(do):
+    return do.description
+
+def explain(accessor):
+    """
+    The query plan of ``accessor``, as a string
+    """
+    lines = []
+    add = lines.append
+    cls = type(accessor)
+    add("soundDB.{} query plan".format(accessor.endpointName))
+
+    ## Entries
+    filters = ", ".join("{}={!r}".format(field, value) for field, value in sorted(iteritems(accessor._filters)))
+    add("  Endpoint:      {}{}".format(accessor.endpointName, " ({})".format(filters) if filters else ""))
+    entries = accessor._locate()
+    paths = [ str(entry) for entry in entries ]
+    sizes = [ executors.entrySize(entry) for entry in entries ]
+    totalBytes = sum(sizes)
+    add("  Entries:       {} files, {}{}".format(
+        len(entries), memory.formatSize(totalBytes), " (largest {})".format(memory.formatSize(max(sizes))) if sizes else ""
+    ))
+    for path in paths[:3]:
+        add("                   {}".format(path))
+    if len(paths) > 3:
+        add("                   ... {} more".format(len(paths) - 3))
+    if "dataset" in getattr(accessor._endpoint, "fields", ()):
+        counts = collections.Counter(entry.dataset for entry in entries)
+        add("  Datasets:      " + ", ".join("{} ({} files)".format(label, count) for label, count in sorted(iteritems(counts))))
+    if accessor._n is not None:
+        add("  Limit:         first {} entries".format(accessor._n))
+    # The Entries which will actually be parsed: those sampled, less any the zone maps rule out (below)
+    parsed = entries
+    if accessor._sample is not None:
+        sample = accessor._sample
+        fields, strata = sample.stratify(entries, accessor._endpoint)
+        parsed = sample.choose(entries, accessor._endpoint)
+        add("  Sample:        {} of {} entries, from {} strata by {}{}".format(
+            len(parsed), len(entries), len(strata), ", ".join(fields) or "(nothing)",
+            ", {:.0%} of rows".format(sample.rows) if sample.rows is not None else ""
+        ))
+    if accessor._where is not None:
+        add("  Where:         {}".format(accessor._where.text))
+    if accessor._sort is not None and not any(isinstance(do, operations.Stage) for do in accessor._chain):
+        add("  Sort:          {!r}".format(accessor._sort))
+
+    ## Parameters and operations
+    if accessor._prepareStateParams:
+        params = ", ".join("{}={!r}".format(k, v) for k, v in sorted(iteritems(accessor._prepareStateParams)))
+        add("  Parameters:    {}".format(params))
+    else:
+        add("  Parameters:    (defaults)")
+
+    add("  Operations:{}".format("    (none)" if len(accessor._chain) == 0 else ""))
+    grouped = False
+    for i, do in enumerate(accessor._chain):
+        if isinstance(do, operations.Stage):
+            if not grouped:
+                add("    {}. {}    <- per-Entry before this, per-{} after".format(i + 1, describeOp(do), do.unit))
+            else:
+                add("    {}. {}    <- per-{} after".format(i + 1, describeOp(do), do.unit))
+            grouped = True
+        else:
+            add("    {}. {}{}".format(i + 1, describeOp(do), "" if grouped else "  (per Entry)"))
+
+    ## Optimizations
+    optimizations = list(accessor._pushdowns())
+    if accessor._where is not None:
+        zoneIndex = zonemaps.Index(accessor)
+        unknown = sum(1 for entry in entries if zoneIndex.lookup(entry) is None)
+        skipped = []
+        kept = set(id(entry) for entry in zonemaps.prune(entries, accessor._where, zoneIndex, skipped))
+        parsed = [ entry for entry in parsed if id(entry) in kept ]
+        optimizations.append("zone maps: {} of {} files ruled out by where=; {} without statistics yet (they'll be recorded)".format(
+            len(skipped), len(entries), unknown
+        ))
+    if accessor._sort is None and accessor._sample is None:
+        # (a sample is chosen from the full listing, and a sort or Stage needs it all too)
+        optimizations.append("streaming discovery: parsing starts as soon as the first file is found")
+    workers = next((do.workers for do in accessor._chain if getattr(do, "workers", None)), None)
+    parallel = 1
+    if workers:
+        parallel = workers
+        optimizations.append("parallel groups: {} worker processes".format(workers))
+    elif accessor._executor is not None:
+        parallel = executors.parallelism(accessor._executor)
+        optimizations.append("executor: {} ({} at once{})".format(
+            type(accessor._executor).__name__, parallel, ", {} retries".format(accessor._retries) if accessor._retries else ""
+        ))
+        inWorkers = operations.perEntry(accessor._chain)
+        if inWorkers:
+            if executors.canSend(accessor._executor, inWorkers):
+                optimizations.append("fused operations: the first {} operations run in the executor's workers, right after parsing".format(len(inWorkers)))
+            else:
+                optimizations.append("fused operations: the first {} operations can't be pickled, so they run in this process".format(len(inWorkers)))
+    elif daemon.enabled():
+        status = daemon.info()
+        optimizations.append("daemon: files are listed and parsed by the soundDB daemon (pid {}, {} parsed files cached, {})".format(
+            status["pid"], status["cached"], memory.formatSize(status["cachedBytes"])
+        ))
+    if "dataset" in getattr(accessor._endpoint, "fields", ()):
+        optimizations.append("federated: each Dataset is read ahead of the parser on its own threads")
+    compressed = sum(1 for path in paths if compression.compressionOf(path) is not None)
+    if compressed:
+        optimizations.append("{} of {} files are compressed (decompressed on background threads)".format(compressed, len(paths)))
+    if staging.enabled():
+        hits = sum(1 for path in paths if staging.isStaged(path))
+        optimizations.append("staging cache: {} of {} files already staged locally".format(hits, len(paths)))
+    if memory.getMemoryLimit() is not None:
+        optimizations.append("memory limit: {} ({} in use)".format(memory.formatSize(memory.getMemoryLimit()), memory.formatSize(memory.used())))
+    add("  Optimizations:{}".format("" if optimizations else " (none)"))
+    for optimization in optimizations:
+        add("    - {}".format(optimization))
+
+    ## Cost
+    measured = throughput(accessor)
+    if measured is None:
+        add("  Estimated parse time: unknown (no {} files parsed yet this session)".format(cls.__name__))
+    else:
+        rate, count = measured
+        sizeOf = dict(zip(paths, sizes))
+        parsedBytes = sum(sizeOf[str(entry)] for entry in parsed)
+        seconds = parsedBytes / rate / parallel
+        add("  Estimated parse time: {} for {} files, {} (at {}/s per thread, measured over {} files{})".format(
+            formatDuration(seconds), len(parsed), memory.formatSize(parsedBytes), memory.formatSize(rate), count,
+            "; assuming {}x parallel speedup".format(parallel) if parallel > 1 else ""
+        ))
+
+    return "\n".join(lines)
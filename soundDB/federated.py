@@ -0,0 +1,211 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+from future.utils import iteritems, itervalues
+from past.builtins import basestring
+from future.moves import queue
+
+import heapq
+import collections
+import concurrent.futures
+import itertools
+import operator
+import threading
+
+"""
+Querying several iyore Datasets (i.e. one per drive or share) as though they were one.
+
+An Accessor given a list or dict of Datasets uses a ``FederatedEndpoint`` in place of a single Endpoint.
+Every Entry it yields gets an extra ``dataset`` field: the key of its Dataset in the dict, or for a list,
+the Dataset's path (or its position in the list, if it has no path). So results can be grouped, sorted,
+or filtered by ``dataset`` like any other field.
+
+Each Dataset's files are found by its own thread, and when parsing, each Dataset has its own threads which read
+the next few files from disk (into the OS's file cache) ahead of the parser, so every disk is kept busy at once
+rather than one at a time. With a sort (or ``.group()``), each Dataset's Entries are sorted on its own thread,
+then the sorted streams are merged.
+"""
+
+# How many files ahead of the parser to read from each Dataset, and with how many threads per Dataset
+PREFETCH = 4
+IO_THREADS = 2
+CHUNK = 1 << 20
+
+def labelFor(ds, position):
+    path = getattr(ds, "path", None) or getattr(ds, "root", None)
+    return str(path) if path is not None else str(position)
+
+def labelEntry(entry, label):
+    """
+    Add the field ``dataset= label`` to ``entry``
+    """
+    fields = dict(entry.fields)
+    fields["dataset"] = label
+    entry.fields = fields
+    try:
+        setattr(entry, "dataset", label)
+    except AttributeError:
+        pass
+    return entry
+
+def warm(path):
+    """
+    Read the whole file at ``path`` and throw the bytes away, so parsing it next reads from the OS's cache
+    """
+    buf = bytearray(CHUNK)
+    with open(path, "rb", buffering= 0) as f:
+        while f.readinto(buf):
+            pass
+
+def sortKey(sort):
+    if sort is None or hasattr(sort, "__call__"):
+        return sort
+    if isinstance(sort, basestring):
+        return operator.attrgetter(sort)
+    sort = tuple(sort)
+    return lambda entry: tuple(getattr(entry, field) for field in sort)
+
+def matchesLabel(label, condition):
+    if condition is None:
+        return True
+    if isinstance(condition, basestring):
+        return label == condition
+    if isinstance(condition, dict):
+        # iyore-style exclusion: {value: False}
+        return label not in condition
+    if hasattr(condition, "__call__"):
+        return bool(condition(label))
+    return label in [str(value) for value in condition]
+
+class Source(object):
+    """
+    The thread listing (and maybe sorting) the Entries of one Dataset, and putting them on ``out`` as ``(position, entry)``
+    """
+    finished = object()
+
+    def __init__(self, position, label, endpoint, out, stop, key, n, items, filters):
+        self.position = position
+        self.label = label
+        self.out = out
+        self.stop = stop
+        args = (endpoint, key, n, items, filters)
+        self.thread = threading.Thread(target= self.run, args= args, name= "soundDB-dataset-{}".format(label))
+        self.thread.daemon = True
+
+    def run(self, endpoint, key, n, items, filters):
+        try:
+            # without a global sort, each Dataset needs to supply at most n Entries
+            entries = endpoint(sort= None, n= n if key is None else None, items= items, **filters)
+            entries = ( labelEntry(entry, self.label) for entry in entries )
+            if key is not None:
+                entries = sorted(entries, key= key)
+            for entry in entries:
+                if self.stop.is_set():
+                    return
+                self.out.put((self.position, entry))
+            self.out.put((self.position, self.finished))
+        except BaseException as e:
+            self.out.put((self.position, e))
+
+class FederatedEndpoint(object):
+    """
+    Stand-in for an ``iyore.Endpoint`` which yields the Entries of the same-named Endpoint in several Datasets
+    """
+    def __init__(self, datasets, endpointName):
+        if isinstance(datasets, dict):
+            labeled = [ (str(label), ds) for label, ds in iteritems(datasets) ]
+        else:
+            labeled = [ (labelFor(ds, i), ds) for i, ds in enumerate(datasets) ]
+        if len(labeled) == 0:
+            raise ValueError("No Datasets given")
+
+        self.endpoints = []
+        for label, ds in labeled:
+            try:
+                self.endpoints.append( (label, getattr(ds, endpointName)) )
+            except AttributeError:
+                raise ValueError('No endpoint "{}" exists in the dataset "{}"'.format(endpointName, label))
+
+        fields = []
+        for label, endpoint in self.endpoints:
+            if "dataset" in endpoint.fields:
+                raise ValueError('The "{}" endpoint in dataset "{}" already has a field named "dataset"'.format(endpointName, label))
+            fields.extend(field for field in endpoint.fields if field not in fields)
+        self.fields = fields + ["dataset"]
+
+    def __call__(self, sort= None, n= None, items= None, **filters):
+        datasetCondition = filters.pop("dataset", None)
+        endpoints = [ (label, endpoint) for label, endpoint in self.endpoints if matchesLabel(label, datasetCondition) ]
+        entries = self._read(endpoints, sortKey(sort), n, items, filters)
+        return itertools.islice(entries, n) if n is not None else entries
+
+    def _read(self, endpoints, key, n, items, filters):
+        stop = threading.Event()
+        if key is None:
+            # Entries come out in whatever order the Datasets produce them
+            out = queue.Queue()
+            outs = [out] * len(endpoints)
+        else:
+            outs = [ queue.Queue() for endpoint in endpoints ]
+        sources = [ Source(i, label, endpoint, outs[i], stop, key, n, items, filters) for i, (label, endpoint) in enumerate(endpoints) ]
+        for source in sources:
+            source.thread.start()
+
+        def take(out):
+            position, item = out.get()
+            if isinstance(item, BaseException):
+                raise item
+            return position, item
+
+        try:
+            if key is None:
+                remaining = len(sources)
+                while remaining > 0:
+                    position, entry = take(out)
+                    if entry is Source.finished:
+                        remaining -= 1
+                    else:
+                        yield entry
+            else:
+                def stream(out):
+                    for seq in itertools.count():
+                        position, entry = take(out)
+                        if entry is Source.finished:
+                            return
+                        yield (key(entry), position, seq, entry)
+                for entryKey, position, seq, entry in heapq.merge(*[ stream(out) for out in outs ]):
+                    yield entry
+        finally:
+            stop.set()
+
+    def prefetch(self, entries):
+        """
+        Yield ``entries`` (from this Endpoint) in order, reading the next few files of each Dataset
+        on that Dataset's own threads before they're yielded
+        """
+        pools = {}
+        window = collections.deque()
+        ahead = PREFETCH * len(self.endpoints)
+        try:
+            for entry in entries:
+                label = entry.fields.get("dataset")
+                if label not in pools:
+                    pools[label] = concurrent.futures.ThreadPoolExecutor(IO_THREADS)
+                window.append( (entry, pools[label].submit(warm, str(entry))) )
+                while len(window) > ahead:
+                    yield finishWarming(*window.popleft())
+            while window:
+                yield finishWarming(*window.popleft())
+        finally:
+            for entry, future in window:
+                future.cancel()
+            for pool in itervalues(pools):
+                pool.shutdown(wait= False)
+
+def finishWarming(entry, future):
+    try:
+        future.result()
+    except (IOError, OSError):
+        # leave reporting unreadable files to the parser
+        pass
+    return entry
@@ -0,0 +1,144 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import itertools
+import collections
+import concurrent.futures
+import traceback
+
+from . import memory
+from . import executors
+from . import sharedmem
+from . import operations
+
+"""
+Processing the groups of ``.group(..., workers= n)`` concurrently in worker processes.
+
+Each worker parses all the Entries of one group, applies the operations before ``.group()`` to each,
+concatenates them, applies the operations after it up to the next stage (i.e. another ``.group()``), and sends back
+only the result(s) for that group. Results come back in the same order as the groups would have been processed
+one-by-one, and any later stages run on them in this process, since they can combine several groups.
+With ``where=``, the worker filters each file's rows too (but statistics for skipping files aren't recorded).
+
+The Accessor, its state, and the operations chain (as ``operations`` records) are pickled and sent to the worker
+along with the paths of the group's Entries; only the results are sent back, through shared memory
+where possible (see ``sharedmem``). If any of that can't be pickled (i.e. an operation was given a lambda),
+the groups are just processed one at a time instead.
+"""
+
+def splitChain(chain, groupAt):
+    """
+    ``(preGroup, perGroup, rest)``: the parts of ``chain`` the workers apply to each Entry (before ``chain[groupAt]``)
+    and to each group (the Ops after it), and the rest, starting at the next Stage, which runs in this process
+    """
+    perGroup = operations.perEntry(chain[groupAt + 1:])
+    return chain[:groupAt], perGroup, chain[groupAt + 1 + len(perGroup):]
+
+def canSend(accessor, state, chain, groupAt):
+    """
+    Whether everything the workers need to process the groups of ``chain[groupAt]`` can be sent to them
+    """
+    preGroup, perGroup, rest = splitChain(chain, groupAt)
+    return operations.picklable(accessor, state, preGroup, perGroup)
+
+def processGroup(accessor, state, key, paths, preGroup, perGroup):
+    """
+    Run in a worker process: parse and process the group ``key``, made of the files at ``paths``,
+    returning a list of the ``(key, data)`` results for that group.
+    """
+    def parsed():
+        for path in paths:
+            try:
+                data = accessor._parseEntry(path, state)
+                if accessor._where is not None:
+                    data = accessor._where.filter(data)
+                    if len(data) == 0:
+                        continue
+            except Exception:
+                accessor._write('Error while parsing "{}":'.format(path))
+                accessor._write( traceback.format_exc() )
+            else:
+                yield path, data
+
+    datas = [ data for path, data in operations.execute(preGroup, parsed(), accessor._write) ]
+    if len(datas) == 0:
+        return []
+
+    results = operations.execute(perGroup, iter([ (key, operations.concatData(datas)) ]), accessor._write)
+    return [ (resultKey, sharedmem.pack(data)) for resultKey, data in results ]
+
+def groupSize(groupEntries):
+    return sum(executors.entrySize(entry) for entry in groupEntries)
+
+def runGroups(accessor, entries, state, chain, groupAt, progress= True):
+    """
+    Process each group in ``entries`` (which must already be sorted by group) on its own worker process,
+    and run the results, in group order, through the rest of ``chain``. Returns an iterator of ``(key, data)``.
+
+    Like ``executors.parseAll``, only as many groups are submitted at once as are expected to fit in the memory budget
+    (see ``memory.setMemoryLimit``), though always at least one.
+    """
+    preGroup, perGroup, rest = splitChain(chain, groupAt)
+    return operations.execute(rest, processed(accessor, entries, state, chain[groupAt], preGroup, perGroup, progress), accessor._write)
+
+def processed(accessor, entries, state, stage, preGroup, perGroup, progress):
+    """
+    ``(key, data)`` of each group's results from the workers, in group order
+    """
+    groups = [ (key, list(subiter)) for key, subiter in itertools.groupby(entries, stage.groupFunc) ]
+    window = 2 * stage.workers
+
+    sharedmem.ensureTracker()
+    pool = concurrent.futures.ProcessPoolExecutor(stage.workers)
+    bar = accessor._progressBar(total= sum(len(groupEntries) for key, groupEntries in groups)) if progress and accessor._progbar else None
+
+    groups = iter(groups)
+    held = []   # the next group, if it was taken from ``groups`` but didn't fit in the memory budget
+    pending = collections.deque()   # (key, groupEntries, future, expectedBytes), in group order
+
+    def refill():
+        room = memory.available() - sum(expected for key, groupEntries, future, expected in pending)
+        while len(pending) < window:
+            group = held.pop() if held else next(groups, None)
+            if group is None:
+                break
+            key, groupEntries = group
+            expected = memory.estimate(groupSize(groupEntries)) or 0
+            if expected > room and pending:
+                # Always keep at least one group going, even if it alone is expected to be over budget
+                held.append(group)
+                break
+            room -= expected
+            future = pool.submit(processGroup, accessor, state, key, [ str(entry) for entry in groupEntries ], preGroup, perGroup)
+            pending.append((key, groupEntries, future, expected))
+
+    try:
+        refill()
+        while pending:
+            key, groupEntries, future, expected = pending[0]
+            try:
+                results = [ (resultKey, sharedmem.unpack(data)) for resultKey, data in future.result() ]
+            except KeyboardInterrupt:
+                raise
+            except Exception:
+                accessor._write('Error in worker process while processing group "{}":'.format(key))
+                accessor._write( traceback.format_exc() )
+                results = []
+            pending.popleft()
+
+            if bar is not None:
+                bar.update(len(groupEntries))
+            for result in results:
+                yield result
+            refill()
+    except KeyboardInterrupt:
+        accessor._write("Interrupted while processing groups")
+    finally:
+        for key, groupEntries, future, expected in pending:
+            if not future.cancel():
+                # already running (or done): free its shared memory once it finishes
+                sharedmem.releaseWhenDone(future)
+        pool.shutdown(wait= False)
+        if bar is not None:
+            bar.close()
@@ -0,0 +1,304 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+from future.utils import (iteritems, itervalues)
+
+import os
+import types
+import pickle
+import hashlib
+import functools
+
+import numpy as np
+
+from . import operations
+from .atomicwrite import writeAtomic
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+"""
+Named, persisted results of Accessor queries which are updated incrementally.
+
+A materialized result is stored in a pickle file named after the result, together with the
+``(mtime, size)`` stamp of every Entry which went into it. When it's refreshed, only Entries which are
+new or have changed since the last run are parsed. If the operations chain contains ``.group()``,
+only the groups those Entries (or Entries which have since disappeared) belong to are recomputed;
+the stored results for every other group are reused as-is.
+
+To recompute a group without re-parsing its unchanged Entries, the per-Entry data going into ``.group()``
+(the result of any operations before it in the chain) is also saved, one file per Entry, in a
+``<name>.partials`` directory next to the result. Pass ``partials= False`` to skip that (and instead
+re-parse every Entry in an affected group) when the per-Entry data is too large to be worth storing.
+
+If anything about the query itself changes---the Accessor, its filters, its parameters, or the operations
+chain---the fingerprint stored with the result won't match, and it's recomputed from scratch.
+"""
+
+DEFAULT_STORE = os.path.join(os.path.expanduser("~"), ".soundDB", "materialized")
+FORMAT_VERSION = 1
+
+def fingerprint(*objs, **kwargs):
+    """
+    Hex digest identifying the given objects by value, rather than by identity.
+
+    Functions (including lambdas and closures) are identified by their code, constants, defaults, and the
+    contents of their closures, so the same chain built in a different session has the same fingerprint.
+    Instances of any type in ``skip`` are ignored.
+    """
+    skip = kwargs.pop("skip", ())
+    h = hashlib.sha1()
+    for obj in objs:
+        _feed(h, obj, skip, set())
+    return h.hexdigest()
+
+def _feed(h, obj, skip, seen):
+    update = lambda *parts: h.update("\x1f".join(str(part) for part in parts).encode("utf-8"))
+
+    if skip and isinstance(obj, skip):
+        update("<skipped>")
+        return
+    if id(obj) in seen:
+        update("<recursion>")
+        return
+
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes, np.generic)):
+        update(type(obj).__name__, repr(obj))
+        return
+
+    seen.add(id(obj))
+    if isinstance(obj, (list, tuple)):
+        update(type(obj).__name__, len(obj))
+        for item in obj:
+            _feed(h, item, skip, seen)
+    elif isinstance(obj, (dict, Mapping)):
+        update("dict", len(obj))
+        for key in sorted(obj, key= repr):
+            _feed(h, key, skip, seen)
+            _feed(h, obj[key], skip, seen)
+    elif isinstance(obj, (set, frozenset)):
+        update("set", *sorted(repr(item) for item in obj))
+    elif isinstance(obj, types.FunctionType):
+        update("function", obj.__module__, getattr(obj, "__qualname__", obj.__name__))
+        _feed(h, obj.__code__, skip, seen)
+        _feed(h, obj.__defaults__, skip, seen)
+        _feed(h, obj.__kwdefaults__, skip, seen)
+        for cell in obj.__closure__ or ():
+            try:
+                contents = cell.cell_contents
+            except ValueError:
+                # empty cell
+                contents = None
+            _feed(h, contents, skip, seen)
+        # attributes set on the function
+        _feed(h, {k: v for k, v in iteritems(obj.__dict__)}, skip, seen)
+    elif isinstance(obj, (operations.Op, operations.Stage)):
+        update(type(obj).__name__)
+        # ``description`` only restates the other attributes, with reprs that can include memory addresses
+        _feed(h, { k: v for k, v in iteritems(vars(obj)) if k != "description" }, skip, seen)
+    elif isinstance(obj, types.CodeType):
+        update("code", obj.co_code, obj.co_names, obj.co_varnames)
+        _feed(h, obj.co_consts, skip, seen)
+    elif isinstance(obj, types.MethodType):
+        update("method", obj.__func__.__name__)
+        _feed(h, obj.__func__, skip, seen)
+        _feed(h, obj.__self__, skip, seen)
+    elif isinstance(obj, functools.partial):
+        update("partial")
+        _feed(h, obj.func, skip, seen)
+        _feed(h, obj.args, skip, seen)
+        _feed(h, obj.keywords, skip, seen)
+    elif isinstance(obj, (type, types.BuiltinFunctionType)):
+        update("named", getattr(obj, "__module__", None), getattr(obj, "__qualname__", obj.__name__))
+    elif isinstance(obj, np.ndarray):
+        update("ndarray", obj.dtype, obj.shape)
+        h.update(np.ascontiguousarray(obj).tobytes())
+    else:
+        # Last resort. If the repr includes a memory address, the fingerprint
+        # won't match next time, so the result is just recomputed from scratch---safe, if slow.
+        update(type(obj).__name__, repr(obj))
+
+def queryFingerprint(accessor):
+    """
+    Fingerprint of everything about an Accessor that determines its results, other than the files themselves.
+    """
+    from .accessor import Accessor
+
+    filters = { k: v for k, v in iteritems(accessor._filters) if k != "items" }
+    return fingerprint(
+        type(accessor).__module__,
+        type(accessor).__name__,
+        accessor.endpointName,
+        filters,
+        accessor._prepareStateParams,
+        accessor._sort,
+        accessor._n,
+        accessor._chain,
+        accessor._where.text if getattr(accessor, "_where", None) is not None else None,
+        skip= (Accessor,)
+    )
+
+def entryStamp(entry):
+    """
+    ``(mtime, size)`` of the file for ``entry``, used to tell whether it has changed since it was last read.
+    """
+    stat = os.stat(str(entry))
+    return (stat.st_mtime, stat.st_size)
+
+def _dump(obj, path):
+    with open(path, "wb") as f:
+        pickle.dump(obj, f, protocol= pickle.HIGHEST_PROTOCOL)
+
+class Store(object):
+    """
+    The files making up a single materialized result.
+    """
+    def __init__(self, name, store= None):
+        store = store or DEFAULT_STORE
+        self.path = os.path.join(store, name + ".pkl")
+        self.partialsDir = os.path.join(store, name + ".partials")
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                record = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return record if record.get("version") == FORMAT_VERSION else None
+
+    def save(self, record):
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        writeAtomic(self.path, lambda tmp: _dump(record, tmp))
+
+    def _partialPath(self, path):
+        return os.path.join(self.partialsDir, hashlib.sha1(path.encode("utf-8")).hexdigest() + ".pkl")
+
+    def loadPartial(self, path):
+        with open(self._partialPath(path), "rb") as f:
+            return pickle.load(f)
+
+    def hasPartial(self, path):
+        return os.path.exists(self._partialPath(path))
+
+    def savePartial(self, path, data):
+        if not os.path.isdir(self.partialsDir):
+            os.makedirs(self.partialsDir)
+        writeAtomic(self._partialPath(path), lambda tmp: _dump(data, tmp))
+
+    def removePartial(self, path):
+        try:
+            os.remove(self._partialPath(path))
+        except OSError:
+            pass
+
+    def clearPartials(self):
+        if os.path.isdir(self.partialsDir):
+            for filename in os.listdir(self.partialsDir):
+                os.remove(os.path.join(self.partialsDir, filename))
+
+def refresh(accessor, name, store= None, partials= True):
+    """
+    Bring the materialized result ``name`` for ``accessor`` up to date, and return a list of its ``(key, data)``
+    tuples in the order the Accessor would yield them.
+    """
+    if any(isinstance(do, operations.Window) for do in accessor._chain):
+        # A changed Entry can affect any window overlapping it, and those aren't tracked
+        raise TypeError("Results of .window() can't be materialized; use .combine() instead")
+
+    store = Store(name, store)
+    queryID = queryFingerprint(accessor)
+
+    record = store.load()
+    if record is None or record["fingerprint"] != queryID:
+        record = { "version": FORMAT_VERSION, "fingerprint": queryID, "entries": {}, "results": {}, "partials": partials }
+        store.clearPartials()
+    elif record["partials"] != partials:
+        # Partials from an earlier run may be missing or stale, so don't trust any of them
+        store.clearPartials()
+        record["partials"] = partials
+
+    state = accessor.prepareState(accessor._endpoint, accessor._filters, **accessor._prepareStateParams)
+    entries = accessor._locate()
+    stamps = { entry.path: entryStamp(entry) for entry in entries }
+
+    previous = record["entries"]
+    changed = [ entry for entry in entries if entry.path not in previous or previous[entry.path][0] != stamps[entry.path] ]
+    removed = set(previous).difference(stamps)
+
+    groupAt = next((i for i, do in enumerate(accessor._chain) if isinstance(do, operations.Group)), None)
+    if groupAt is None:
+        keysAndDatas = _refreshEntries(accessor, record, entries, changed, removed, stamps, state)
+    else:
+        keysAndDatas = _refreshGroups(accessor, store, record, entries, changed, removed, stamps, state, groupAt)
+
+    store.save(record)
+    return keysAndDatas
+
+def _refreshEntries(accessor, record, entries, changed, removed, stamps, state):
+    results = record["results"]
+    for path in removed:
+        results.pop(path, None)
+        record["entries"].pop(path, None)
+
+    for entry in changed:
+        results.pop(entry.path, None)
+        # Until it's successfully processed, keep the Entry marked as changed so it's retried next time
+        record["entries"][entry.path] = (None, None)
+    for entry, data in accessor._run(changed, state):
+        results[entry.path] = data
+        record["entries"][entry.path] = (stamps[entry.path], None)
+
+    return [ (entry, results[entry.path]) for entry in entries if entry.path in results ]
+
+def _refreshGroups(accessor, store, record, entries, changed, removed, stamps, state, groupAt):
+    groupFunc = accessor._chain[groupAt].groupFunc
+    preGroup, fromGroup = accessor._chain[:groupAt], accessor._chain[groupAt:]
+
+    previous = record["entries"]
+    groups = { entry.path: groupFunc(entry) for entry in entries }
+    affected = { groups[entry.path] for entry in changed }
+    affected.update( previous[path][1] for path in removed )
+    # an Entry whose group has changed (say, a different ``group`` function with the same fingerprint) affects both
+    affected.update( previous[path][1] for path in groups if path in previous and previous[path][1] != groups[path] )
+
+    fresh = { entry.path for entry in changed }
+    for path in removed:
+        store.removePartial(path)
+        del previous[path]
+
+    affectedEntries = [ entry for entry in entries if groups[entry.path] in affected ]
+
+    def preGroupData():
+        for entry in accessor._progress(affectedEntries):
+            if record["partials"] and entry.path not in fresh and store.hasPartial(entry.path):
+                data = store.loadPartial(entry.path)
+            else:
+                processed = list(accessor._run([entry], state, chain= preGroup, progress= False))
+                if len(processed) == 0:
+                    # Parsing or the operations chain failed (and the error was already reported).
+                    # Leave it marked as changed, so it's retried next time.
+                    previous[entry.path] = (None, groups[entry.path])
+                    continue
+                data = processed[0][1]
+                if record["partials"]:
+                    store.savePartial(entry.path, data)
+            previous[entry.path] = (stamps[entry.path], groups[entry.path])
+            yield entry, data
+
+    results = record["results"]
+    for group in affected:
+        results.pop(group, None)
+
+    for group, data in operations.execute(fromGroup, preGroupData(), accessor._write):
+        results[group] = data
+
+    orderedGroups = []
+    for entry in entries:
+        group = groups[entry.path]
+        if group in results and (len(orderedGroups) == 0 or orderedGroups[-1] != group):
+            orderedGroups.append(group)
+    return [ (group, results[group]) for group in orderedGroups ]
@@ -0,0 +1,199 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+from future.utils import itervalues
+from past.builtins import basestring
+
+import os
+import re
+import gc
+import sys
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+"""
+A process-wide budget for how much memory soundDB's results may take up.
+
+Set it with ``soundDB.setMemoryLimit("8GB")``, or the ``SOUNDDB_MEMORY_LIMIT`` environment variable.
+With no limit set (the default), none of this does anything.
+
+Every parsed result (and the result of the operations chain for it) is measured when it's produced---with
+``memory_usage(deep= True)`` for pandas structures, ``nbytes`` for arrays---and counted until it's garbage-collected.
+Against that count:
+
+- Parsing on an executor only submits as many files as should fit in the remaining budget,
+  judged by how much memory each byte of file has turned into so far.
+- Before parsing each file, and before concatenating a group in ``.group()`` or the results in ``.combine()``,
+  the budget is checked. If it's already used up by results still being held on to (by group and combine
+  buffers, or by your own code), a ``MemoryLimitError`` is raised, rather than waiting for the OS to kill the process.
+"""
+
+class MemoryLimitError(MemoryError):
+    pass
+
+_units = { "": 1, "b": 1, "k": 1e3, "kb": 1e3, "m": 1e6, "mb": 1e6, "g": 1e9, "gb": 1e9, "t": 1e12, "tb": 1e12,
+           "kib": 2 ** 10, "mib": 2 ** 20, "gib": 2 ** 30, "tib": 2 ** 40 }
+
+def parseSize(size):
+    """
+    Number of bytes in ``size``: an int, or a string like ``"8GB"``, ``"512 MiB"``, or ``"1.5g"``. None means no limit.
+    """
+    if size is None or (isinstance(size, basestring) and size.strip() == ""):
+        return None
+    if isinstance(size, basestring):
+        match = re.match(r"^\s*([0-9.]+)\s*([a-zA-Z]*)\s*$", size)
+        if match is None or match.group(2).lower() not in _units:
+            raise ValueError('Could not understand memory size "{}"'.format(size))
+        return int(float(match.group(1)) * _units[match.group(2).lower()])
+    return int(size)
+
+def formatSize(nbytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(nbytes) < 1000:
+            return "{:.1f} {}".format(nbytes, unit)
+        nbytes /= 1000
+    return "{:.1f} TB".format(nbytes)
+
+_lock = threading.Lock()
+_limit = parseSize(os.environ.get("SOUNDDB_MEMORY_LIMIT"))
+_used = [0]
+# Running totals of file bytes parsed and result bytes they produced, to estimate the memory of files not yet parsed
+_observed = [0, 0]
+
+def setMemoryLimit(limit):
+    """
+    Limit the memory soundDB's results may use, process-wide, to ``limit``
+    (bytes, or a string like ``"8GB"``). Pass None to remove the limit.
+    """
+    global _limit
+    _limit = parseSize(limit)
+
+def getMemoryLimit():
+    return _limit
+
+def used():
+    """
+    Bytes taken up by tracked results which haven't been garbage-collected yet
+    """
+    return _used[0]
+
+def sizeOf(obj):
+    """
+    Approximate number of bytes ``obj`` takes up, including the contents of object-dtype columns
+    """
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep= True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep= True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if hasattr(obj, "nbytes") and not isinstance(obj, type):
+        # xarray, and other array-likes
+        try:
+            return int(obj.nbytes)
+        except Exception:
+            pass
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(sizeOf(item) for item in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(sizeOf(item) for item in itervalues(obj))
+    return sys.getsizeof(obj)
+
+# {id(obj): weakref to obj} of everything currently tracked, so nothing is counted twice
+_tracked = {}
+
+def _release(key, nbytes):
+    with _lock:
+        _used[0] -= nbytes
+        _tracked.pop(key, None)
+
+def track(obj, path= None):
+    """
+    Count ``obj`` against the memory limit until it's garbage-collected, and return it.
+
+    If ``path`` is given, it's the file ``obj`` was parsed from, used to estimate
+    how much memory files of a given size will take up once parsed.
+    Objects which can't be weakly referenced (like Python scalars) are small, and aren't tracked.
+    """
+    if _limit is None:
+        return obj
+    ref = _tracked.get(id(obj))
+    if ref is not None and ref() is obj:
+        return obj
+    try:
+        ref = weakref.ref(obj)
+    except TypeError:
+        return obj
+
+    nbytes = sizeOf(obj)
+    fileSize = 0
+    if path is not None:
+        try:
+            fileSize = os.path.getsize(path)
+        except OSError:
+            pass
+    with _lock:
+        _tracked[id(obj)] = ref
+        _used[0] += nbytes
+        if fileSize:
+            _observed[0] += fileSize
+            _observed[1] += nbytes
+    weakref.finalize(obj, _release, id(obj), nbytes)
+    return obj
+
+def trackAll(iterator):
+    """
+    Track the data in an iterator of ``(key, data)``
+    """
+    if _limit is None:
+        return iterator
+    return ( (key, track(data)) for key, data in iterator )
+
+def estimate(fileSize):
+    """
+    Estimated bytes of memory a file of ``fileSize`` bytes will take up once parsed, based on the files parsed so far
+    (or None if nothing has been parsed yet)
+    """
+    if _observed[0] == 0:
+        return None
+    return fileSize * _observed[1] / _observed[0]
+
+def available():
+    """
+    Bytes left in the budget (infinite if there's no limit)
+    """
+    if _limit is None:
+        return float("inf")
+    return _limit - _used[0]
+
+def checkConcat(datas, what):
+    """
+    ``check`` that there's room to concatenate ``datas`` into a new structure
+    """
+    if _limit is not None:
+        check(what, extra= sum(sizeOf(data) for data in datas))
+
+def check(what, extra= 0):
+    """
+    Raise ``MemoryLimitError`` if the tracked results, plus ``extra`` bytes about to be allocated, exceed the limit.
+    ``what`` describes what's about to happen, for the error message.
+    """
+    if _limit is None or _used[0] + extra <= _limit:
+        return
+    # Results which are no longer referenced, but stuck in reference cycles, would otherwise still be counted
+    gc.collect()
+    if _used[0] + extra <= _limit:
+        return
+    raise MemoryLimitError(
+        "soundDB memory limit of {limit} would be exceeded {what}: {used} of results are currently held in memory{extra}. "
+        "Try reading fewer columns, resampling, or reducing data before .group() or .combine(), "
+        "or raise the limit with soundDB.setMemoryLimit().".format(
+            limit= formatSize(_limit),
+            what= what,
+            used= formatSize(_used[0]),
+            extra= ", and {} more is needed".format(formatSize(extra)) if extra else ""
+        )
+    )
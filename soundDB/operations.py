@@ -0,0 +1,418 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+from future.utils import iteritems
+from past.builtins import basestring
+
+import sys
+import pickle
+import operator
+import traceback
+
+import pandas as pd
+
+from . import memory
+from .pyramid import intervalOf
+
+"""
+The operations chain of an Accessor, as a list of plain, picklable records.
+
+Each attribute access, indexing, or call chained onto an Accessor appends an ``Op``, which transforms one piece of
+data on its own. ``.group()`` and ``.window()`` append a ``Stage``, which works on the stream of ``(key, data)`` as a whole:
+data is ``push``ed into it one piece at a time, and it emits results whenever it has them (and at ``flush``).
+
+To run a chain, ``compile`` fuses each run of consecutive Ops into a single function, so a piece of data goes
+through all of them in one call, rather than through a generator per Op. Since the records are just data,
+the Ops before the first Stage can be sent along with the parse task to a worker process (see ``executors``
+and ``groups``), so only their (usually much smaller) result has to be sent back.
+
+When an Op fails, the error names the Op and the Entry (or group) it was processing, and that piece of data is
+skipped, as before.
+"""
+
+class OperationError(Exception):
+    """
+    An Op failed. ``text`` is the formatted error, ready to report (and to send back from a worker process).
+    """
+    def __init__(self, op, text):
+        super(OperationError, self).__init__("{} failed: {}".format(op.description, text.strip()))
+        self.op = op
+        self.text = text
+
+    def __reduce__(self):
+        return (OperationError, (self.op, self.text))
+
+def reportError(report, error, key):
+    """
+    Report the OperationError ``error``, raised while processing ``key``, with the function ``report``
+    """
+    report('Error in operations chain at `{}` while processing "{}":'.format(error.op.description, str(key)))
+    report(error.text)
+
+class Op(object):
+    """
+    A step of the operations chain applied to each piece of data independently
+    """
+    # Whether to report the full traceback when this fails, or just the exception
+    fullTraceback = False
+
+    def apply(self, data):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return "<{} {}>".format(type(self).__name__, self.description)
+
+class GetAttr(Op):
+    def __init__(self, attr):
+        self.attr = attr
+        self.description = ".{}".format(attr)
+
+    def apply(self, data):
+        return getattr(data, self.attr)
+
+class GetItem(Op):
+    def __init__(self, index):
+        self.index = index
+        self.description = "[{}]".format(", ".join(repr(i) for i in index))
+
+    def apply(self, data):
+        return data.__getitem__(*self.index)
+
+class Call(Op):
+    fullTraceback = True
+
+    def __init__(self, args, kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        self.description = "({})".format(", ".join([ repr(arg) for arg in args ] + [ "{}= {!r}".format(k, v) for k, v in sorted(iteritems(kwargs)) ]))
+
+    def apply(self, data):
+        return data(*self.args, **self.kwargs)
+
+class Fused(object):
+    """
+    A run of consecutive Ops, applied to a piece of data in one call
+    """
+    def __init__(self, ops):
+        self.ops = list(ops)
+
+    def __call__(self, data):
+        for op in self.ops:
+            try:
+                data = op.apply(data)
+            except KeyboardInterrupt:
+                raise
+            except Exception:
+                if op.fullTraceback:
+                    text = traceback.format_exc()
+                else:
+                    exc_type, exc_value, exc_traceback = sys.exc_info()
+                    text = "".join(traceback.format_exception_only(exc_type, exc_value))
+                raise OperationError(op, text)
+        return data
+
+    def stream(self, iterator, report):
+        for key, data in iterator:
+            try:
+                yield key, self(data)
+            except KeyboardInterrupt:
+                report('Interrupted in operations chain while processing "{}"'.format(str(key)))
+                break
+            except OperationError as e:
+                reportError(report, e, key)
+
+class Stage(object):
+    """
+    A step of the operations chain which works on the stream of ``(key, data)`` as a whole.
+
+    ``start()`` returns a runner with ``push(key, data)`` and ``flush()`` methods, each returning an iterable of
+    the ``(key, data)`` results ready so far. One runner is used per run of the chain.
+    """
+    workers = None
+    # What the Stage yields, for ``explain``
+    unit = None
+
+    def start(self):
+        raise NotImplementedError
+
+    def stream(self, iterator, report):
+        runner = self.start()
+        for key, data in iterator:
+            try:
+                results = runner.push(key, data)
+            except KeyboardInterrupt:
+                report('Interrupted in operations chain while processing "{}"'.format(str(key)))
+                return
+            except Exception:
+                exc_type, exc_value, exc_traceback = sys.exc_info()
+                reportError(report, OperationError(self, "".join(traceback.format_exception_only(exc_type, exc_value))), key)
+                continue
+            for result in results:
+                yield result
+        for result in runner.flush():
+            yield result
+
+    def __repr__(self):
+        return "<{} {}>".format(type(self).__name__, self.description)
+
+def concatData(datas):
+    """
+    Concatenate the data of a group, if possible; otherwise return them as a tuple
+    """
+    datas = tuple(datas)
+    if len(datas) == 1:
+        return datas[0]
+    # TODO: use GroupbyApplier.compute()-like logic for concat/promote?
+    memory.checkConcat(datas, "while concatenating a group")
+    try:
+        return pd.concat(datas)
+    except TypeError:
+        return datas
+
+class Group(Stage):
+    """
+    ``.group(*groups)``: concatenate the data of consecutive Entries in the same group
+    """
+    def __init__(self, groups, workers= None):
+        if len(groups) == 0:
+            raise TypeError("No groups given to groupby")
+        elif len(groups) > 1:
+            if all(isinstance(group, basestring) for group in groups):
+                groupFunc = operator.attrgetter(*groups)
+            else:
+                raise TypeError("If multiple groups are given, all must be strings")
+        else:
+            group = groups[0]
+            if isinstance(group, basestring):
+                groupFunc = operator.attrgetter(group)
+            elif hasattr(group, "__call__"):
+                groupFunc = group
+            else:
+                raise ValueError('Argument to groupby must be a string or function, instead got "{}"'.format(type(group)))
+
+        self.groups = groups
+        self.groupFunc = groupFunc
+        self.unit = "group"
+        self.workers = workers if workers is not None and workers > 1 else None
+        self.description = ".group({}{})".format(", ".join(repr(group) for group in groups), ", workers= {}".format(workers) if self.workers else "")
+
+    def concat(self, datas):
+        return concatData(datas)
+
+    def start(self):
+        return _GroupRunner(self)
+
+class _GroupRunner(object):
+    def __init__(self, group):
+        self.group = group
+        self.key = None
+        self.datas = []
+
+    def push(self, entry, data):
+        key = self.group.groupFunc(entry)
+        ready = []
+        if self.datas and key != self.key:
+            ready = self.flush()
+        self.key = key
+        self.datas.append(data)
+        return ready
+
+    def flush(self):
+        if not self.datas:
+            return []
+        key, datas = self.key, self.datas
+        self.key, self.datas = None, []
+        return [ (key, self.group.concat(datas)) ]
+
+class Window(Stage):
+    """
+    ``.window(size, step= None, by= None)``: yield the data within each ``size``-long window of time,
+    every ``step``, across consecutive Entries.
+
+    Windows start at multiples of ``step`` (like ``resample``), and each covers ``[start, start + size)``.
+    Data must be time-indexed pandas objects arriving in time order. Only the tail of the data the next window
+    could still need is kept between Entries, so memory is bounded by one window plus one Entry.
+    """
+    def __init__(self, size, step= None, by= None):
+        self.size = intervalOf(size)
+        self.step = intervalOf(step) if step is not None else self.size
+        if self.size <= pd.Timedelta(0) or self.step <= pd.Timedelta(0):
+            raise ValueError("Window size and step must be positive")
+        if by is None or hasattr(by, "__call__"):
+            self.byFunc = by
+        elif isinstance(by, basestring):
+            self.byFunc = operator.attrgetter(by)
+        elif isinstance(by, (list, tuple)) and all(isinstance(field, basestring) for field in by):
+            self.byFunc = operator.attrgetter(*by)
+        else:
+            raise ValueError('`by` must be a field name, list of field names, or function, instead got "{}"'.format(type(by)))
+
+        self.by = by
+        self.unit = "window"
+        self.description = ".window({!r}{}{})".format(
+            size, ", step= {!r}".format(step) if step is not None else "", ", by= {!r}".format(by) if by is not None else ""
+        )
+
+    def sortKey(self, entry):
+        """
+        Order of Entries to window: by ``by``, then by path (i.e. time, within a site)
+        """
+        return (self.byFunc(entry), entry.path) if self.byFunc is not None else entry.path
+
+    def start(self):
+        return _WindowRunner(self)
+
+class _WindowRunner(object):
+    def __init__(self, window):
+        self.window = window
+        self.series = None  # ``by`` key of the series being windowed
+        self.buffer = None  # data not yet past every window which could need it
+        self.start = None   # start of the next window to yield
+        self.last = None    # last time seen in the series
+
+    def push(self, entry, data):
+        if not isinstance(getattr(data, "index", None), pd.DatetimeIndex):
+            raise TypeError("Data to window must have a DatetimeIndex, not {}".format(type(getattr(data, "index", data)).__name__))
+        if len(data) == 0:
+            return []
+
+        ready = []
+        series = self.window.byFunc(entry) if self.window.byFunc is not None else None
+        if self.buffer is not None and series != self.series:
+            ready = self.flush()
+        self.series = series
+
+        if self.buffer is None:
+            self.buffer = data
+            # the first window containing any of the data, which may start before it
+            self.start = (data.index[0] - self.window.size).floor(self.window.step) + self.window.step
+        else:
+            if data.index[0] < self.last:
+                raise ValueError("Data starts at {}, before the data preceding it ends (at {}); windows need data in time order (to window each site separately, pass `by= \"site\"`)".format(data.index[0], self.last))
+            self.buffer = pd.concat([self.buffer, data]) if len(self.buffer) > 0 else data
+        self.last = data.index[-1]
+
+        # Windows ending at or before the last time seen can't get any more data
+        ready.extend(self._windows(self.last))
+        return ready
+
+    def flush(self):
+        if self.buffer is None:
+            return []
+        # The rest, down to the last window starting before the data ends (which may be partial)
+        ready = self._windows(None)
+        self.buffer = self.start = self.last = None
+        return ready
+
+    def _key(self, start):
+        return (self.series, start) if self.window.byFunc is not None else start
+
+    def _windows(self, until):
+        size, step = self.window.size, self.window.step
+        windows = []
+        while len(self.buffer) > 0:
+            first = self.buffer.index[0]
+            if first >= self.start + size:
+                # skip past a gap in the data, to the first window containing any of it
+                self.start += ((first - size - self.start) // step + 1) * step
+            end = self.start + size
+            if until is not None and end > until:
+                break
+
+            index = self.buffer.index
+            stop = index.searchsorted(end, side= "left")
+            inWindow = self.buffer.iloc[index.searchsorted(self.start, side= "left"):stop]
+            if len(inWindow) > 0:
+                windows.append( (self._key(self.start), inWindow) )
+
+            self.start += step
+            self.buffer = self.buffer.iloc[index.searchsorted(self.start, side= "left"):]
+        return windows
+
+def compile(chain):
+    """
+    Steps to run ``chain``: a ``Fused`` for each run of consecutive Ops, and each Stage as-is
+    """
+    steps = []
+    run = []
+    for op in chain:
+        if isinstance(op, Op):
+            run.append(op)
+        else:
+            if run:
+                steps.append(Fused(run))
+                run = []
+            steps.append(op)
+    if run:
+        steps.append(Fused(run))
+    return steps
+
+def execute(chain, iterator, report):
+    """
+    Run the ``(key, data)`` in ``iterator`` through ``chain``, reporting errors with ``report``
+    """
+    for step in compile(chain):
+        iterator = step.stream(iterator, report)
+    return iterator
+
+class Pipeline(object):
+    """
+    ``chain`` run push-style, so one stream of ``(key, data)`` can be fed to several chains at once (see ``sharedscan``):
+    ``push(key, data)`` and ``flush()`` each return a list of the ``(key, data)`` results ready so far.
+    Errors are reported with ``report``, and the data that caused them dropped, as with ``execute``.
+    """
+    def __init__(self, chain, report):
+        self.report = report
+        self.steps = compile(chain)
+        self.runners = [ None if isinstance(step, Fused) else step.start() for step in self.steps ]
+
+    def _through(self, i, items):
+        step, runner = self.steps[i], self.runners[i]
+        results = []
+        for key, data in items:
+            try:
+                if runner is None:
+                    results.append((key, step(data)))
+                else:
+                    results.extend(runner.push(key, data))
+            except OperationError as e:
+                reportError(self.report, e, key)
+            except KeyboardInterrupt:
+                raise
+            except Exception:
+                exc_type, exc_value, exc_traceback = sys.exc_info()
+                reportError(self.report, OperationError(step, "".join(traceback.format_exception_only(exc_type, exc_value))), key)
+        return results
+
+    def push(self, key, data):
+        items = [(key, data)]
+        for i in range(len(self.steps)):
+            items = self._through(i, items)
+        return items
+
+    def flush(self):
+        items = []
+        for i, runner in enumerate(self.runners):
+            items = self._through(i, items)
+            if runner is not None:
+                items.extend(runner.flush())
+        return items
+
+def perEntry(chain):
+    """
+    The leading Ops of ``chain``, which apply to each Entry's data on its own
+    """
+    for i, op in enumerate(chain):
+        if not isinstance(op, Op):
+            return chain[:i]
+    return list(chain)
+
+def picklable(*objs):
+    """
+    Whether ``objs`` can be sent to a worker process (i.e. an Op's arguments aren't lambdas)
+    """
+    try:
+        pickle.dumps(objs, protocol= pickle.HIGHEST_PROTOCOL)
+        return True
+    except Exception:
+        return False
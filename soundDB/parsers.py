@@ -5,12 +5,20 @@ from future.utils import (iteritems, itervalues)
 from past.builtins import basestring
 
 from .accessor import Accessor
+from . import audio
+from .compression import openEntry
+from .csvreader import readCSV
+from . import memory
+from . import pyramid
+from . import decibels
 
 import pandas as pd
 import numpy as np
 import xarray as xr
 import re
+import os
 import collections
+import concurrent.futures
 import warnings
 
 """
@@ -75,6 +83,17 @@ under its ``endpointName``.
 
 
 
+class HeaderLayouts(object):
+    """
+    The parser's names for each distinct set of columns in the NVSPL files of one query (see ``NVSPL.columnNamesOf``).
+    Its repr doesn't depend on what's been seen, so a state holding it fingerprints the same throughout the query.
+    """
+    def __init__(self):
+        self.layouts = {}
+
+    def __repr__(self):
+        return "HeaderLayouts()"
+
 class NVSPL(Accessor):
     """
     NVSPL-specific Parameters
@@ -88,6 +107,33 @@ class NVSPL(Accessor):
 
         Columns to read, either by name or number
 
+    resample : str or pandas offset, default None
+
+        Average each file down to this resolution as it's read (i.e. ``"1min"`` or ``"1h"``), so only the averaged
+        data is ever held in memory. Sound level columns (the 1/3rd-octave bands, ``dbA``, ``dbC``, and ``dbF``)
+        are energy-averaged (logarithmically); ``WindDir`` is averaged as an angle; other numeric columns are
+        averaged arithmetically, and for the rest the first value in each interval is kept. Must evenly divide
+        one hour, since each file holds one hour of data.
+
+    stats : list of str, or dict of {str: list of str}, default None
+
+        Statistics of the 1-second data in each ``resample`` interval to include as additional columns, named
+        like ``dbA_L90``. Can be ``"Lmax"``, ``"Lmin"``, ``"Lxx"`` for the level exceeded xx percent of the time
+        (i.e. ``"L10"``, ``"L50"``, ``"L90"``), or ``"count"`` for the number of seconds with data.
+        A list applies to ``dbA``; use a dict to specify statistics for other columns,
+        i.e. ``{"dbA": ["L90"], "dbC": ["Lmax"]}``.
+
+    resolution : str or pandas offset, default None
+
+        Read summaries at this resolution (i.e. ``"10min"``, ``"1h"``, ``"1D"``) from the Dataset's level-of-detail
+        pyramid, built with ``.updatePyramid()`` (or ``python -m soundDB.pyramid``), instead of parsing every second.
+        Must evenly divide one hour, or be a whole number of hours evenly dividing one day. Columns are as with
+        ``resample``, plus ``dbA_Lmin``, ``dbA_Lmax``, ``dbA_L10``, ``dbA_L50``, ``dbA_L90``, and ``dbA_count``
+        (percentiles only at the pyramid's own resolutions: 1 minute, 10 minutes, 1 hour, and 1 day).
+        Files not yet in the pyramid (or changed since) are parsed and resampled as usual, if the resolution
+        is an hour or less. At coarser resolutions, each interval is returned for the first file in it,
+        and the rest of its files give empty DataFrames.
+
     Example Resulting DataFrame
     ---------------------------
 
@@ -153,45 +199,127 @@ class NVSPL(Accessor):
 
     endpointName = "nvspl"
 
-    def parse(self, nvsplFileEntry, state= (None, None, 1)):
-        timestamps, columns, index_index = state
+    levelColumns = [
+        '12.5', '15.8', '20', '25', '31.5', '40', '50', '63', '80', '100',
+        '125', '160', '200', '250', '315', '400', '500', '630', '800', '1000',
+        '1250', '1600', '2000', '2500', '3150', '4000', '5000', '6300', '8000',
+        '10000', '12500', '16000', '20000', 'dbA', 'dbC', 'dbF'
+    ]
+
+    def parse(self, nvsplFileEntry, state= (None, None, 1, None, None, None, None)):
+        timestamps, columns, index_index, resample, stats, resolution, layouts = state
 
-        df = pd.read_csv(str(nvsplFileEntry),
-                         engine= 'c',
-                         # sep= ',',
-                         parse_dates= True,
-                         index_col= index_index,
-                         usecols= columns
-                         )
+        if resolution is not None:
+            return self.readPyramid(nvsplFileEntry, resolution, columns)
+
+        with openEntry(nvsplFileEntry) as f:
+            df = readCSV(f, self._engine,
+                             # sep= ',',
+                             parse_dates= True,
+                             index_col= index_index,
+                             usecols= columns
+                             )
 
         # Make column names slightly nicer
         df.index.name = "date"
-        renamedColumns = { column: column.replace('H', '').replace('p', '.') for column in df.columns if re.match(r"H\d+p?\d*", column) is not None }
-        df.rename(columns= renamedColumns, inplace= True)
+        df.columns = self.columnNamesOf(df.columns, layouts)
 
         # TODO: rename dbA, dbT to dBA, dBT for consistencty
         # TODO: potentially drop siteID column
 
-        # Coerce numeric columns to floats, in case of "-Infinity" values
-        try:
-            numericCols = [
-                '12.5', '15.8', '20', '25', '31.5', '40', '50', '63', '80', '100',
-                '125', '160', '200', '250', '315', '400', '500', '630', '800', '1000',
-                '1250', '1600', '2000', '2500', '3150', '4000', '5000', '6300', '8000',
-                '10000', '12500', '16000', '20000', 'dbA', 'dbC', 'dbF',
-                'Voltage','WindSpeed', 'WindDir', 'TempIns', 'TempOut', 'Humidity'
-             ]
-            presentNumericCols = df.columns.intersection(numericCols)
-            if len(presentNumericCols) > 0:
-                # df[presentNumericCols] = df[presentNumericCols].convert_objects(convert_dates= False, convert_numeric= True, convert_timedeltas= False, copy= False)
-                df[presentNumericCols].astype('float32', copy= False, errors= 'ignore')
-
-        except KeyError:
-            pass
+        if resample is not None:
+            df = self.resampleLevels(df, resample, stats)
 
         return df
 
-    def prepareState(self, endpoint, endpointParams, timestamps= None, columns= None):
+    def columnNamesOf(self, columns, layouts= None):
+        """
+        The parser's names for the columns of a file (i.e. "H12p5" becomes "12.5"),
+        worked out once per distinct set of columns and kept in ``layouts`` (from ``prepareState``)
+        """
+        key = tuple(columns)
+        names = layouts.layouts.get(key) if layouts is not None else None
+        if names is None:
+            names = [ column.replace('H', '').replace('p', '.') if re.match(r"H\d+p?\d*", column) is not None else column for column in columns ]
+            if layouts is not None:
+                layouts.layouts[key] = names
+        return names
+
+    def readPyramid(self, nvsplFileEntry, resolution, columns= None):
+        """
+        Summaries of one file at ``resolution`` from the pyramid, or from the file itself if the pyramid doesn't have it yet
+        """
+        summary = pyramid.read(str(nvsplFileEntry), resolution)
+        if summary is None:
+            if pyramid.intervalOf(resolution) > pd.Timedelta(hours= 1):
+                raise ValueError('"{}" is not in the NVSPL pyramid, or has changed since it was built; '
+                                 'update it with .updatePyramid() to read it at a resolution of {}'.format(nvsplFileEntry, resolution))
+            full = self.parse(nvsplFileEntry)
+            summary = self.resampleLevels(full, resolution, pyramid.statsFor(resolution))
+        if columns is not None:
+            # The names asked for, in the parser's naming (i.e. "H12p5" becomes "12.5"), and their statistics
+            names = { column.replace('H', '').replace('p', '.') if re.match(r"H\d+p?\d*", column) else column for column in columns }
+            summary = summary[[ column for column in summary.columns if column in names or column.rsplit("_", 1)[0] in names ]]
+        return summary
+
+    def updatePyramid(self):
+        """
+        Build or update the level-of-detail pyramid of the NVSPL files this Accessor selects (see ``soundDB.pyramid``),
+        re-reading only the days with new or changed files. Returns the number of days summarized.
+        """
+        rawState = NVSPL.prepareState(self, self._endpoint, self._filters)
+        return pyramid.update(self._locate(), lambda entry: self.parse(entry, rawState), self.resampleLevels, progress= self._progbar is not False)
+
+    @classmethod
+    def resampleLevels(cls, df, rule, stats= None):
+        """
+        Average NVSPL data down to the resolution ``rule``, energy-averaging sound levels.
+        See the ``resample`` and ``stats`` parameters of the NVSPL Accessor.
+        """
+        levelCols = df.columns.intersection(cls.levelColumns)
+        numericCols = df.columns.difference(levelCols).difference(["WindDir"])
+        numericCols = [ col for col in numericCols if pd.api.types.is_numeric_dtype(df[col]) ]
+        otherCols = df.columns.difference(levelCols).difference(numericCols).difference(["WindDir"])
+
+        parts = []
+        if len(levelCols) > 0:
+            levels = df[levelCols].apply(pd.to_numeric, errors= "coerce")
+            # "-Infinity" seconds contribute no energy
+            parts.append(decibels.toLevels(decibels.toEnergy(levels).resample(rule).mean()))
+        if len(numericCols) > 0:
+            parts.append(df[numericCols].resample(rule).mean())
+        if "WindDir" in df.columns:
+            radians = np.deg2rad(pd.to_numeric(df["WindDir"], errors= "coerce"))
+            components = pd.DataFrame({"sin": np.sin(radians), "cos": np.cos(radians)}, index= df.index).resample(rule).mean()
+            parts.append( (np.rad2deg(np.arctan2(components["sin"], components["cos"])) % 360).rename("WindDir") )
+        if len(otherCols) > 0:
+            parts.append(df[otherCols].resample(rule).first())
+
+        resampled = pd.concat(parts, axis= 1)
+        # keep the original column order
+        resampled = resampled[[ col for col in df.columns if col in resampled.columns ]]
+
+        if stats:
+            for column, columnStats in iteritems(stats):
+                if column not in df.columns:
+                    continue
+                series = pd.to_numeric(df[column], errors= "coerce").resample(rule)
+                for stat in columnStats:
+                    if stat == "Lmax":
+                        values = series.max()
+                    elif stat == "Lmin":
+                        values = series.min()
+                    elif stat == "count":
+                        values = series.count()
+                    else:
+                        # Lxx: the level exceeded xx% of the time, i.e. the (100 - xx)th percentile
+                        values = series.quantile(1 - float(stat[1:]) / 100)
+                    resampled["{}_{}".format(column, stat)] = values
+
+        resampled.index.name = df.index.name
+        return resampled
+
+    def prepareState(self, endpoint, endpointParams, timestamps= None, columns= None, resample= None, stats= None, resolution= None):
 
         if timestamps is not None:
             # make dict of endpoint restriction args
@@ -205,7 +333,8 @@ class NVSPL(Accessor):
             if all(isinstance(column, basestring) for column in columns):
                 if "STime" not in columns:
                     columns = ["STime"] + columns
-                index_index = 0
+                # by name: read_csv counts positions in file order, not in the order of ``columns``
+                index_index = "STime"
             elif all(isinstance(column, int) for column in columns):
                 if 1 not in columns:
                     columns = [1] + columns
@@ -214,8 +343,196 @@ class NVSPL(Accessor):
             else:
                 raise TypeError("columns must be a list of strings or of integers")
 
-        return (timestamps, columns, index_index)
+        if resample is not None:
+            interval = pd.Timedelta(pd.tseries.frequencies.to_offset(resample))
+            if interval > pd.Timedelta(hours= 1) or pd.Timedelta(hours= 1) % interval != pd.Timedelta(0):
+                raise ValueError("resample interval must evenly divide one hour (the length of an NVSPL file), not {}".format(resample))
+
+        if stats is not None:
+            if resample is None:
+                raise TypeError("stats can only be used along with resample")
+            if not isinstance(stats, dict):
+                stats = {"dbA": stats}
+            for column, columnStats in iteritems(stats):
+                for stat in columnStats:
+                    if stat not in ("Lmax", "Lmin", "count") and re.match(r"^L\d+(\.\d+)?$", stat) is None:
+                        raise ValueError('Unknown statistic "{}"; must be "Lmax", "Lmin", "count", or "Lxx", i.e. "L90"'.format(stat))
+
+        if resolution is not None:
+            if resample is not None or stats is not None:
+                raise TypeError("resolution can't be used along with resample or stats")
+            if columns is not None and not all(isinstance(column, basestring) for column in columns):
+                raise TypeError("columns must be given by name when using resolution")
+            interval = pyramid.intervalOf(resolution)
+            if interval <= pd.Timedelta(hours= 1):
+                valid = pd.Timedelta(hours= 1) % interval == pd.Timedelta(0)
+            else:
+                valid = interval % pd.Timedelta(hours= 1) == pd.Timedelta(0) and pd.Timedelta(days= 1) % interval == pd.Timedelta(0)
+            if not valid:
+                raise ValueError("resolution must evenly divide one hour, or be whole hours evenly dividing one day, not {}".format(resolution))
+
+        return (timestamps, columns, index_index, resample, stats, resolution, HeaderLayouts())
+
+    def _columnParams(self, columns):
+        if self._prepareStateParams.get("timestamps") is not None:
+            return None
+        # Back to the names in the file (i.e. "12.5" -> "H12p5"); stats columns (i.e. "dbA_L90") come from their base column
+        stats = self._prepareStateParams.get("stats") is not None or self._prepareStateParams.get("resolution") is not None
+        fileColumns = set()
+        for column in columns:
+            if column == "date":
+                continue
+            if stats and column not in self.levelColumns and column.rsplit("_", 1)[0] in columns + self.levelColumns:
+                column = column.rsplit("_", 1)[0]
+            fileColumns.add("H" + column.replace(".", "p") if re.match(r"^\d+(\.\d+)?$", column) else column)
+        if not fileColumns and self._prepareStateParams.get("resample") is not None:
+            # resampling needs at least one column besides the date
+            fileColumns.add("dbA")
+        return { "columns": ["STime"] + sorted(fileColumns) }
+
+    def _pushdowns(self):
+        params = self._prepareStateParams
+        pushdowns = []
+        if params.get("columns") is not None:
+            pushdowns.append("column pruning: only {} columns are parsed".format(len(params["columns"])))
+        if params.get("timestamps") is not None:
+            pushdowns.append("time pruning: only the requested timestamps are kept from each file")
+        if params.get("resample") is not None:
+            pushdowns.append("resampled to {!r} as each file is parsed{}".format(params["resample"], ", with stats" if params.get("stats") else ""))
+        if params.get("resolution") is not None:
+            level = pyramid.levelFor(params["resolution"])
+            pushdowns.append("level of detail: {!r} read from the pyramid's {} level, where built".format(
+                params["resolution"], level[0] if level else "(none: parsing every file)"
+            ))
+        return pushdowns
+
+
+class WAV(Accessor):
+    """
+    Compute NVSPL-style 1-second sound levels from WAV audio recordings.
+
+    Audio files are memory-mapped and processed in blocks, computing the spectrum of each second with an FFT.
+    Levels are the 33 1/3rd-octave bands from 12.5 Hz to 20 kHz, plus A-weighted, C-weighted, and flat
+    (unweighted) overall levels. Only the first second-aligned portion of each file is used: a trailing partial
+    second is dropped.
+
+    WAV-specific Parameters
+    -----------------------
+
+    calibration : float, default 0
+
+        Sound level, in dB, of a full-scale signal (one whose samples have a mean square of 1).
+        This is added to every level; with the default of 0, levels are in dB relative to full scale.
+
+    channel : int, default 0
+
+        Which channel of multi-channel recordings to analyze
+
+    blockSeconds : int, default 60
 
+        Number of seconds of audio to process at once. Larger blocks are somewhat faster, but use more memory.
+
+    workers : int, default None
+
+        Process blocks of each file on this many threads at once
+
+    Resulting DataFrame
+    -------------------
+
+    Has the same columns as the NVSPL Accessor's results, in the same order, so it can be concatenated with them.
+    The start time of each file is taken from the ``year``, ``month``, ``day``, ``hour``, ``min``, and ``sec`` fields
+    of its Entry if present, otherwise from a ``YYYYMMDD_HHMMSS`` timestamp in its filename. ``SiteID`` is the Entry's
+    ``unit`` and ``site`` fields. Columns which can't be derived from audio (``Voltage``, ``WindSpeed``, etc.) are NaN.
+    """
+
+    endpointName = "wav"
+
+    otherColumns = [
+        'Voltage', 'WindSpeed', 'WindDir', 'TempIns', 'TempOut', 'Humidity', 'INVID', 'INSID',
+        'GChar1', 'GChar2', 'GChar3', 'AdjustmentsApplied', 'CalibrationAdjustment',
+        'GPSTimeAdjustment', 'GainAdjustment', 'Status'
+    ]
+
+    def parse(self, entry, state= None):
+        if state is None:
+            state = self.prepareState(None, None)
+
+        samples, fmt, toFloat = audio.memmapWav(str(entry))
+        rate = fmt.rate
+        if fmt.rate not in state["filterBanks"]:
+            state["filterBanks"][rate] = audio.FilterBank(rate)
+        filterBank = state["filterBanks"][rate]
+
+        seconds = samples.shape[0] // rate
+        blockSeconds = state["blockSeconds"]
+        channel = state["channel"]
+
+        def process(start):
+            stop = min(start + blockSeconds, seconds)
+            frames = toFloat(samples[start * rate : stop * rate, channel]).reshape(stop - start, rate)
+            return filterBank.levels(frames, state["calibration"])
+
+        blockStarts = range(0, seconds, blockSeconds)
+        if state["workers"] and state["workers"] > 1:
+            # numpy's FFT and matrix multiplication release the GIL, so threads run blocks in parallel
+            with concurrent.futures.ThreadPoolExecutor(state["workers"]) as pool:
+                blocks = list(pool.map(process, blockStarts))
+        else:
+            blocks = [ process(start) for start in blockStarts ]
+
+        levels = np.vstack(blocks) if len(blocks) > 0 else np.empty((0, len(NVSPL.levelColumns)))
+        index = pd.date_range(self.startTime(entry), periods= seconds, freq= "s", name= "date")
+        df = pd.DataFrame(levels, index= index, columns= NVSPL.levelColumns)
+
+        fields = getattr(entry, "fields", None) or {}
+        df.insert(0, "SiteID", fields.get("unit", "") + fields.get("site", "") or None)
+        for column in self.otherColumns:
+            df[column] = np.nan
+
+        return df
+
+    @staticmethod
+    def startTime(entry):
+        """
+        Start time of the recording in ``entry``, from its fields or filename
+        """
+        fields = getattr(entry, "fields", None) or {}
+        if all(field in fields for field in ("year", "month", "day", "hour")):
+            return pd.Timestamp(int(fields["year"]), int(fields["month"]), int(fields["day"]),
+                                int(fields["hour"]), int(fields.get("min", 0)), int(fields.get("sec", 0)))
+
+        match = re.search(r"(\d{8})[_T-]?(\d{6})", os.path.basename(str(entry)))
+        if match is not None:
+            return pd.to_datetime(match.group(1) + match.group(2), format= "%Y%m%d%H%M%S")
+
+        warnings.warn('Could not determine the start time of "{}"; timestamps will start at 1970-01-01'.format(str(entry)))
+        return pd.Timestamp(0)
+
+    def prepareState(self, endpoint, endpointParams, calibration= 0, channel= 0, blockSeconds= 60, workers= None):
+        return {
+            "calibration": calibration,
+            "channel": channel,
+            "blockSeconds": blockSeconds,
+            "workers": workers,
+            "filterBanks": {}   # {sample rate: audio.FilterBank}, built as needed
+        }
+
+    def _pushdowns(self):
+        pushdowns = ["memory-mapped: samples are read straight from the file, {} seconds at a time".format(self._prepareStateParams.get("blockSeconds", 60))]
+        workers = self._prepareStateParams.get("workers")
+        if workers and workers > 1:
+            pushdowns.append("blocks of each file are processed on {} threads".format(workers))
+        return pushdowns
+
+class Audio(WAV):
+    """
+    Same as the WAV Accessor, but for the ``audio`` Endpoint.
+
+    Compute NVSPL-style 1-second sound levels from WAV audio recordings.
+    See the WAV Accessor (``soundDB.wav``) for details.
+    """
+
+    endpointName = "audio"
 
 class SRCID(Accessor):
     """
@@ -246,15 +563,14 @@ class SRCID(Accessor):
 
     def parse(self, entry):
 
-        with open(str(entry)) as f:
-            # Determine version; older versions immediately start with header, newer has version comment
-            firstline = f.readline()
-            if not firstline.startswith(r"%%"):
-                f.seek(0)   # Rewind, as we just consumed the header row.
-                            # Otherwise, we consumed the comment row, which is fine
+        with openEntry(entry) as f:
+            # Determine version; older versions immediately start with header, newer has version comment.
+            # (Peek rather than read and rewind, since a compressed file can't be rewound.)
+            if f.peek(2)[:2] == b"%%":
+                f.readline()    # skip the version comment row
 
-            data = pd.read_csv(f,
-                                engine= "c",
+            data = readCSV(f, self._engine,
+                                strings= ["nvsplDate", "tagDate"],
                                 sep= "\t",
                                 # skiprows= 1,
                                 parse_dates= False)
@@ -316,12 +632,12 @@ class LoudEvents(Accessor):
 
     def parse(self, entry):
 
-        data = pd.read_csv(str(entry),
-                            engine= "c",
-                            sep= "\t",
-                            index_col= 0,
-                            parse_dates= True,
-                            infer_datetime_format= True)
+        with openEntry(entry) as f:
+            data = readCSV(f, self._engine,
+                                sep= "\t",
+                                index_col= 0,
+                                parse_dates= True,
+                                infer_datetime_format= True)
 
         # if data.index.name is not None: data.index.name = data.index.name.lower()
         data.columns = list(range(24)) * 3
@@ -351,7 +667,7 @@ class Audibility(Accessor):
     endpointName = "audibility"
 
     def parse(self, entry):
-        with open(str(entry), "rb") as f:
+        with openEntry(entry) as f:
             header = None
             metadata = {}
             while header is None:
@@ -362,8 +678,7 @@ class Audibility(Accessor):
                 else:
                     header = line[1:].lower().split()
 
-            df = pd.read_csv(f,
-                             engine= "c",
+            df = readCSV(f, self._engine,
                              sep= "\t",
                              header= None,
                              comment= "#")
@@ -393,7 +708,29 @@ class Audibility(Accessor):
 
 class DailyPA(Accessor):
     """
-    The result will be indexed on two levels: `date` and `srcid`.
+    DailyPA-specific Parameters
+    ---------------------------
+
+    cube : bool, default False
+
+        Instead of a MultiIndexed DataFrame, return each file as an ``xarray.Dataset`` with dimensions
+        ``site``, ``date`` (datetime64), ``srcid``, and ``hour`` (0--23) or ``period``
+        (``"07-18h"``, ``"19-06h"``, ``"08-15h"``, ``"16-07h"``, ``"00-23h"``), with variables:
+
+        - ``percent`` (site, date, srcid, hour): float32 percent time audible in each hour
+        - ``periodPercent`` (site, date, srcid, period): float32 percent time audible in each period
+        - ``nEvents``, ``eLenMean`` (site, date, srcid, period): int32 number and mean length of events
+        - ``covered`` (site, date): whether the site has data for that date
+
+        Days or srcids a site doesn't have are NaN in the float variables, and 0 in the int ones.
+        ``.combine()`` assembles the cubes from every file into one, allocating it just once, so queries become
+        vectorized selections, i.e. percent time audible for 1.x sources across all sites in July::
+
+            >> cube = soundDB.dailypa(ds, cube= True).combine()
+            >> cube.periodPercent.sel(srcid= [s for s in cube.srcid.values if s.startswith("1.")],
+                                      date= slice("2015-07-01", "2015-07-31"), period= "00-23h")
+
+    Without ``cube``, the result will be indexed on two levels: `date` and `srcid`.
     This allows for interesting sub-indexing, such as::
 
         >> data.loc["2013-06-29", :]
@@ -461,12 +798,35 @@ class DailyPA(Accessor):
     """
     endpointName = "dailypa"
 
-    def parse(self, entry):
-        data = pd.read_csv(str(entry),
-                           engine= "c",
-                           sep= "\t",
-                           parse_dates= False,
-                           index_col= [0, 1])
+    hourColumns = ["{:02d}h".format(hour) for hour in range(24)]
+    periods = ["07-18h", "19-06h", "08-15h", "16-07h", "00-23h"]
+    # the same periods, as named in each group of columns
+    periodPercentColumns = ["07-18h", "19h-06h", "08-15h", "16-07h", "00-23h"]
+    nEventsColumns = ["nEvents_07-18h", "nEvents_19-06h", "nEvents_08-15h", "nEvents_16-07h", "nEvents_24Hr"]
+    eLenMeanColumns = ["eLenMean_07-18h", "eLenMean_19-06h", "eLenMean_08-15h", "eLenMean_16-07h", "eLenMean_24Hr"]
+
+    # {variable: (columns, trailing dimension, dtype, fill value)}
+    cubeVariables = collections.OrderedDict([
+        ("percent",       (hourColumns,          "hour",   np.float32, np.nan)),
+        ("periodPercent", (periodPercentColumns, "period", np.float32, np.nan)),
+        ("nEvents",       (nEventsColumns,       "period", np.int32,   0)),
+        ("eLenMean",      (eLenMeanColumns,      "period", np.int32,   0)),
+    ])
+
+    def prepareState(self, endpoint, endpointParams, cube= False):
+        return cube
+
+    def _pushdowns(self):
+        return ["cube: typed arrays, assembled with one allocation by .combine()"] if self._prepareStateParams.get("cube") else []
+
+    def parse(self, entry, state= False):
+        cube = state
+        with openEntry(entry) as f:
+            data = readCSV(f, self._engine,
+                               strings= ["nvsplDate"],
+                               sep= "\t",
+                               parse_dates= False,
+                               index_col= [0, 1])
 
         data.index.names = ["date", "srcid"]
 
@@ -474,6 +834,9 @@ class DailyPA(Accessor):
         if data.index[-1][0] == 'nvsplDate':
             data = data.iloc[:-1, :]
 
+        if cube:
+            return self.toCube(data, self.siteOf(entry))
+
         ## Pandas cannot seem to handle a MultiIndex with dates;
         ## slicing syntax becomes even crazier, and often doesn't even work.
         ## So date conversion is disabled for now.
@@ -487,6 +850,96 @@ class DailyPA(Accessor):
 
         return data.apply(pd.to_numeric, raw= True, errors= "coerce")
 
+    @staticmethod
+    def siteOf(entry):
+        fields = getattr(entry, "fields", None) or {}
+        site = fields.get("unit", "") + fields.get("site", "")
+        if site:
+            return site
+        match = re.search(r"DAILYPA_(\w+?)\.", os.path.basename(str(entry)))
+        return match.group(1) if match is not None else str(entry)
+
+    @classmethod
+    def toCube(cls, data, site):
+        """
+        Convert one file's (date, srcid)-indexed DataFrame into a cube with a single ``site``
+        """
+        dateCodes, dates = pd.factorize(data.index.get_level_values(0), sort= True)
+        srcidCodes, srcids = pd.factorize(data.index.get_level_values(1).astype(str), sort= True)
+        shape = (1, len(dates), len(srcids))
+
+        variables = {}
+        for name, (columns, dim, dtype, fill) in iteritems(cls.cubeVariables):
+            block = data.reindex(columns= columns)
+            # Only columns which didn't parse as numbers need converting, not every column
+            values = np.column_stack([
+                (column.values if column.dtype.kind in "fiu" else pd.to_numeric(column, errors= "coerce").values)
+                for _, column in block.items()
+            ]).astype(np.float64)
+            if fill == 0:
+                values = np.nan_to_num(values)
+            array = np.full(shape + (len(columns),), fill, dtype= dtype)
+            array[0, dateCodes, srcidCodes, :] = values
+            variables[name] = (("site", "date", "srcid", dim), array)
+        variables["covered"] = (("site", "date"), np.ones(shape[:2], dtype= bool))
+
+        return xr.Dataset(variables, coords= {
+            "site": [site],
+            "date": pd.to_datetime(np.asarray(dates)),
+            "srcid": np.asarray(srcids, dtype= object),
+            "hour": np.arange(24),
+            "period": cls.periods
+        })
+
+    @classmethod
+    def assembleCubes(cls, cubes):
+        """
+        Assemble single-site cubes into one, allocating each variable once and filling it in place
+        """
+        sites = list(collections.OrderedDict.fromkeys(site for cube in cubes for site in cube.site.values))
+        dates = pd.DatetimeIndex(np.unique(np.concatenate([ cube.date.values for cube in cubes ])))
+        srcids = pd.Index(np.unique(np.concatenate([ cube.srcid.values.astype(str) for cube in cubes ])).astype(object))
+        sitesIndex = pd.Index(sites)
+        shape = (len(sites), len(dates), len(srcids))
+
+        nbytes = sum(np.dtype(dtype).itemsize * len(columns) for columns, dim, dtype, fill in itervalues(cls.cubeVariables))
+        memory.check("while assembling the DailyPA cube", extra= int(np.prod(shape)) * nbytes)
+
+        arrays = collections.OrderedDict(
+            (name, np.full(shape + (len(columns),), fill, dtype= dtype))
+            for name, (columns, dim, dtype, fill) in iteritems(cls.cubeVariables)
+        )
+        covered = np.zeros(shape[:2], dtype= bool)
+        for cube in cubes:
+            siteAt = sitesIndex.get_indexer(cube.site.values)
+            dateAt = dates.get_indexer(cube.date.values)
+            srcidAt = srcids.get_indexer(cube.srcid.values.astype(str))
+            where = np.ix_(siteAt, dateAt, srcidAt)
+            for name, array in iteritems(arrays):
+                array[where] = cube[name].values
+            covered[np.ix_(siteAt, dateAt)] |= cube["covered"].values
+
+        variables = { name: (("site", "date", "srcid", cls.cubeVariables[name][1]), array) for name, array in iteritems(arrays) }
+        variables["covered"] = (("site", "date"), covered)
+        return xr.Dataset(variables, coords= {
+            "site": sites,
+            "date": dates.rename("date"),
+            "srcid": srcids.values,
+            "hour": np.arange(24),
+            "period": cls.periods
+        })
+
+    def _combineResults(self, keysAndDatas, func, ID, *args, **kwargs):
+        if not self._prepareStateParams.get("cube"):
+            return super(DailyPA, self)._combineResults(keysAndDatas, func, ID, *args, **kwargs)
+
+        keysAndDatas = list(keysAndDatas)
+        isCube = lambda data: isinstance(data, xr.Dataset) and "site" in data.dims and "covered" in data
+        if len(keysAndDatas) == 0 or not all(isCube(data) for key, data in keysAndDatas):
+            # the operations chain turned the cubes into something else
+            return super(DailyPA, self)._combineResults(keysAndDatas, func, ID, *args, **kwargs)
+        return func(self.assembleCubes([ data for key, data in keysAndDatas ]), *args, **kwargs)
+
 class Metrics(Accessor):
     """
     Read all tables from a metrics file.
@@ -585,7 +1038,7 @@ class Metrics(Accessor):
     endpointName = "metrics"
 
     def parse(self, entry):
-        with open(str(entry)) as f:
+        with openEntry(entry, text= True) as f:
             versionLine = f.readline()
 
         version = self.MetricsReader.parseVersionLine(versionLine)
@@ -595,6 +1048,20 @@ class Metrics(Accessor):
             raise TypeError("No metrics reader for version {}".format(version))
 
     def __init__(self, *args, **kwargs):
+        self._buildReaders()
+        super(Metrics, self).__init__(*args, **kwargs)
+
+    def __getstate__(self):
+        # The readers hold namedtuple classes created on the fly, which can't be pickled; rebuild them instead
+        state = super(Metrics, self).__getstate__()
+        state.pop("metricsReaders", None)
+        return state
+
+    def __setstate__(self, state):
+        super(Metrics, self).__setstate__(state)
+        self._buildReaders()
+
+    def _buildReaders(self):
         self.metricsVersions = {
             "1.35": {
                 "hourlyMedian"              : {'dBA': "Median Hourly Metrics (dBA)", 'dBT': "Median Hourly Metrics (dBT)"},
@@ -611,7 +1078,6 @@ class Metrics(Accessor):
         }
 
         self.metricsReaders = { version: self.MetricsReader(version, metricNames) for version, metricNames in iteritems(self.metricsVersions) }
-        super(Metrics, self).__init__(*args, **kwargs)
 
     class MetricsReader(object):
         """
@@ -708,10 +1174,11 @@ class Metrics(Accessor):
 
         @staticmethod
         def splMean(*spls):
-            return 10 * np.log10( np.sum(10**(spl/10) for spl in spls) / len(spls) )
+            # NaN if any of them is missing, rather than the mean of the rest
+            return decibels.energyMeanOf(*spls, skipna= False)
 
         def __call__(self, entry):
-            with open(str(entry)) as f:
+            with openEntry(entry, text= True) as f:
                 txt = f.read()
 
             sections = txt.split("\n\n")[:-1] # file is terminated by double-linebreak, so we don't need the final empty section
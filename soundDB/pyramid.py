@@ -0,0 +1,357 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+from future.utils import iteritems
+
+import os
+import sys
+import json
+import bisect
+import threading
+import collections
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from . import decibels
+from .atomicwrite import writeAtomic
+
+"""
+A level-of-detail pyramid of NVSPL data, for plotting months or years of it without reading every second.
+
+For each directory of NVSPL files, ``update`` writes summaries of them at each of ``LEVELS`` (1 minute,
+10 minutes, 1 hour, 1 day) into a ``.nvspl_pyramid`` directory alongside them, one gzipped CSV per site,
+level, and month. The summaries are in the same format as ``soundDB.nvspl(..., resample= ..., stats= ...)``:
+sound levels energy-averaged, other numeric columns averaged, plus ``STATS`` of dBA (minimum, maximum,
+percentiles, and the number of seconds summarized) for each interval.
+
+A ``manifest.json`` records the size, modification time, site, and hour of every file summarized. Updating
+only re-reads the days which have new or changed hour files, and rewrites just their months.
+
+``soundDB.nvspl(ds, resolution= "1h")`` then reads summaries from the pyramid instead of parsing the files
+(see ``read``): from the coarsest level that evenly divides the resolution, combining its rows if needed.
+"""
+
+# (name, interval), finest first
+LEVELS = [ ("1min", pd.Timedelta(minutes= 1)), ("10min", pd.Timedelta(minutes= 10)), ("1h", pd.Timedelta(hours= 1)), ("1D", pd.Timedelta(days= 1)) ]
+STATS = { "dbA": ["Lmin", "Lmax", "L10", "L50", "L90", "count"] }
+DIRECTORY = ".nvspl_pyramid"
+MANIFEST = "manifest.json"
+# Number of month files kept in memory for reading
+CACHE_SIZE = 16
+
+def pyramidDir(path):
+    """
+    The pyramid directory for the NVSPL file at ``path``
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(path)), DIRECTORY)
+
+def siteOf(entry):
+    fields = getattr(entry, "fields", {})
+    site = fields.get("site")
+    if site is None:
+        return "all"
+    return fields.get("unit", "") + site
+
+def intervalOf(resolution):
+    """
+    ``resolution`` (a string like ``"10min"`` or a pandas offset) as a Timedelta
+    """
+    offset = pd.tseries.frequencies.to_offset(resolution)
+    try:
+        return pd.Timedelta(offset)
+    except ValueError:
+        # newer pandas won't convert a calendar Day
+        return offset.n * pd.Timedelta(days= 1)
+
+def levelFor(resolution):
+    """
+    ``(name, interval)`` of the coarsest pyramid level which evenly divides ``resolution``, or None if it's finer than all of them
+    """
+    resolution = intervalOf(resolution)
+    candidates = [ (name, interval) for name, interval in LEVELS if interval <= resolution and resolution % interval == pd.Timedelta(0) ]
+    return candidates[-1] if candidates else None
+
+def statsFor(resolution):
+    """
+    The statistics included at ``resolution``: all of ``STATS`` at a pyramid level itself,
+    but no percentiles when rows of a level must be combined (percentiles can't be)
+    """
+    level = levelFor(resolution)
+    if level is None or level[1] == intervalOf(resolution):
+        return STATS
+    return { column: [ stat for stat in stats if stat in ("Lmin", "Lmax", "count") ] for column, stats in iteritems(STATS) }
+
+###
+# Manifest
+###
+
+def _fileKey(path):
+    stat = os.stat(path)
+    return [stat.st_size, int(stat.st_mtime)]
+
+def _loadManifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST), "r") as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return { "files": {} }
+
+def _saveManifest(directory, manifest):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent= 1, sort_keys= True)
+    writeAtomic(os.path.join(directory, MANIFEST), write)
+
+###
+# Building
+###
+
+def _monthPath(directory, site, level, month):
+    return os.path.join(directory, site, level, "{}.csv.gz".format(month))
+
+def _readMonth(path):
+    return pd.read_csv(path, index_col= 0, parse_dates= True)
+
+def _writeMonth(path, rows):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    writeAtomic(path, lambda tmp: rows.to_csv(tmp, compression= "gzip"))
+
+def summarize(data, summarizeLevel):
+    """
+    ``{level name: rows}`` summarizing ``data`` (one day of one site) at every level,
+    without the empty intervals where there was no data
+    """
+    levels = {}
+    for name, interval in LEVELS:
+        rows = summarizeLevel(data, name, STATS)
+        count = rows.get("dbA_count")
+        if count is not None:
+            rows = rows[count > 0]
+        levels[name] = rows
+    return levels
+
+def update(entries, read, summarizeLevel, progress= True):
+    """
+    Bring the pyramids of the NVSPL files ``entries`` up to date.
+
+    ``read(entry)`` parses a file at full resolution; ``summarizeLevel(data, rule, stats)`` resamples it.
+    Returns the number of days (of one site each) summarized.
+    """
+    byDirectory = collections.defaultdict(list)
+    for entry in entries:
+        byDirectory[pyramidDir(str(entry))].append(entry)
+
+    updated = 0
+    for directory, dirEntries in sorted(iteritems(byDirectory)):
+        manifest = _loadManifest(directory)
+        files = manifest["files"]
+        changed = [ entry for entry in dirEntries if files.get(os.path.basename(str(entry)), {}).get("key") != _fileKey(str(entry)) ]
+
+        days = collections.defaultdict(dict)    # {(site, day): {basename: data}}
+        # Files which have been deleted leave their days to be re-summarized without them
+        for name, record in list(iteritems(files)):
+            if not os.path.exists(os.path.join(os.path.dirname(directory), name)):
+                del files[name]
+                days[(record["site"], pd.Timestamp(record["hour"]).floor("D"))]
+        if len(changed) == 0 and len(days) == 0:
+            continue
+
+        # Read the changed files, to find the days (of each site) they cover
+        changed = tqdm(changed, desc= "Reading new hours", unit= "files") if progress else changed
+        for entry in changed:
+            path = str(entry)
+            data = read(entry)
+            if len(data) == 0:
+                continue
+            name = os.path.basename(path)
+            hour = data.index[0].floor("h")
+            if name in files:
+                # in case it used to hold a different hour
+                days[(files[name]["site"], pd.Timestamp(files[name]["hour"]).floor("D"))]
+            files[name] = { "key": _fileKey(path), "site": siteOf(entry), "hour": hour.isoformat() }
+            days[(files[name]["site"], hour.floor("D"))][name] = data
+
+        # Re-summarize each of those days in full, including its unchanged hours
+        dayItems = sorted(iteritems(days))
+        dayItems = tqdm(dayItems, desc= "Summarizing days", unit= "days") if progress else dayItems
+        byMonth = collections.defaultdict(dict)    # {(site, month): {day: {level: rows}}}
+        for (site, day), dayData in dayItems:
+            for name, record in iteritems(files):
+                if name not in dayData and record["site"] == site and pd.Timestamp(record["hour"]).floor("D") == day:
+                    path = os.path.join(os.path.dirname(directory), name)
+                    if os.path.exists(path):
+                        dayData[name] = read(path)
+            if dayData:
+                data = pd.concat([ dayData[name] for name in sorted(dayData) ]).sort_index()
+                levels = summarize(data, summarizeLevel)
+            else:
+                levels = { level: None for level, interval in LEVELS }
+            byMonth[(site, day.strftime("%Y-%m"))][day] = levels
+
+        for (site, month), monthDays in iteritems(byMonth):
+            for level, interval in LEVELS:
+                path = _monthPath(directory, site, level, month)
+                parts = [ levels[level] for day, levels in sorted(iteritems(monthDays)) if levels[level] is not None ]
+                if os.path.exists(path):
+                    existing = _readMonth(path)
+                    keep = ~existing.index.floor("D").isin(list(monthDays))
+                    parts.insert(0, existing[keep])
+                if parts:
+                    _writeMonth(path, pd.concat(parts).sort_index())
+                elif os.path.exists(path):
+                    os.remove(path)
+            updated += len(monthDays)
+
+        _saveManifest(directory, manifest)
+    return updated
+
+###
+# Reading
+###
+
+_lock = threading.Lock()
+_cache = collections.OrderedDict()    # {(path, file key): DataFrame}
+
+def _cached(path, load):
+    try:
+        key = (path, tuple(_fileKey(path)))
+    except OSError:
+        return None
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    value = load(path)
+    with _lock:
+        _cache[key] = value
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last= False)
+    return value
+
+def _manifestInfo(manifestPath):
+    manifest = _loadManifest(os.path.dirname(manifestPath))
+    hours = collections.defaultdict(list)
+    for name, record in iteritems(manifest["files"]):
+        hours[record["site"]].append(pd.Timestamp(record["hour"]))
+    for site in hours:
+        hours[site].sort()
+    return manifest["files"], hours
+
+def lookup(path):
+    """
+    ``(site, hour, hours of that site)`` of the NVSPL file at ``path`` if the pyramid has it, up to date; otherwise None
+    """
+    directory = pyramidDir(path)
+    info = _cached(os.path.join(directory, MANIFEST), _manifestInfo)
+    if info is None:
+        return None
+    files, hours = info
+    record = files.get(os.path.basename(path))
+    try:
+        if record is None or record["key"] != _fileKey(path):
+            return None
+    except OSError:
+        return None
+    return record["site"], pd.Timestamp(record["hour"]), hours[record["site"]]
+
+def read(path, resolution):
+    """
+    Summaries of the NVSPL file at ``path`` at ``resolution`` (which must evenly divide one day) from its pyramid,
+    or None if the pyramid doesn't have it, up to date, or has no level fine enough.
+
+    For resolutions of an hour or more, an interval may span several files; its row is returned for the
+    first of them (in time), and an empty DataFrame for the others.
+    """
+    level = levelFor(resolution)
+    found = lookup(path)
+    if level is None or found is None:
+        return None
+    site, hour, hours = found
+    levelName, interval = level
+    resolution = intervalOf(resolution)
+
+    rows = _cached(_monthPath(pyramidDir(path), site, levelName, hour.strftime("%Y-%m")), _readMonth)
+    if rows is None:
+        return None
+
+    if resolution < pd.Timedelta(hours= 1):
+        start, end = hour, hour + pd.Timedelta(hours= 1)
+        selected = rows[(rows.index >= start) & (rows.index < end)]
+    else:
+        start = hour.floor(resolution)
+        end = start + resolution
+        # Only the first file in the interval returns it; the others return no rows, with the same columns
+        if hours[bisect.bisect_left(hours, start)] != hour:
+            selected = rows.iloc[0:0]
+        else:
+            selected = rows[(rows.index >= start) & (rows.index < end)]
+    if resolution == interval:
+        return selected
+    return combine(selected, resolution)
+
+def combine(rows, resolution):
+    """
+    Combine pyramid ``rows`` into intervals of ``resolution``: sound levels energy-averaged and other numbers averaged,
+    both weighted by the seconds each row summarizes, ``WindDir`` averaged as an angle, minimums and maximums
+    of minimums and maximums, counts summed, and the first value of anything else. Percentiles are dropped.
+    """
+    from .parsers import NVSPL
+    counts = rows["dbA_count"] if "dbA_count" in rows.columns else pd.Series(1, index= rows.index)
+    bins = rows.index.floor(resolution)
+    weights = counts.where(counts > 0)
+
+    def weightedMean(values):
+        values = values.where(weights.notnull())
+        present = values.notnull()
+        total = (values * weights).groupby(bins).sum(min_count= 1)
+        return total / weights.where(present).groupby(bins).sum()
+
+    columns = collections.OrderedDict()
+    for column in rows.columns:
+        if column.endswith(("_Lmin",)):
+            columns[column] = rows[column].groupby(bins).min()
+        elif column.endswith("_Lmax"):
+            columns[column] = rows[column].groupby(bins).max()
+        elif column.endswith("_count"):
+            columns[column] = rows[column].groupby(bins).sum()
+        elif "_L" in column:
+            continue
+        elif column in NVSPL.levelColumns:
+            columns[column] = decibels.toLevels(weightedMean(decibels.toEnergy(rows[column])))
+        elif column == "WindDir":
+            radians = np.deg2rad(rows[column])
+            columns[column] = np.rad2deg(np.arctan2(weightedMean(np.sin(radians)), weightedMean(np.cos(radians)))) % 360
+        elif pd.api.types.is_numeric_dtype(rows[column]):
+            columns[column] = weightedMean(rows[column])
+        else:
+            columns[column] = rows[column].groupby(bins).first()
+    combined = pd.DataFrame(columns)
+    combined.index.name = rows.index.name
+    return combined
+
+def main(argv= None):
+    import argparse
+    import iyore
+    from .parsers import NVSPL
+
+    parser = argparse.ArgumentParser(prog= "python -m soundDB.pyramid", description= "Build or update the NVSPL level-of-detail pyramid of a Dataset.")
+    parser.add_argument("dataset", help= "path to the iyore Dataset")
+    parser.add_argument("filters", nargs= "*", metavar= "field=value", help= 'only summarize Entries matching these, i.e. "site=BELA"')
+    args = parser.parse_args(argv)
+
+    filters = {}
+    for condition in args.filters:
+        field, equals, value = condition.partition("=")
+        if not equals:
+            parser.error('Filters must look like field=value, not "{}"'.format(condition))
+        filters[field] = value
+
+    days = NVSPL(iyore.Dataset(args.dataset), **filters).updatePyramid()
+    print("Summarized {} days".format(days))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+from future.utils import iteritems, itervalues
+from past.builtins import basestring
+
+import re
+import zlib
+import collections
+
+import numpy as np
+import pandas as pd
+
+from . import operations
+from . import decibels
+
+"""
+Approximate queries: reading a stratified random sample of Entries (and optionally of rows within each file),
+and estimating statistics of the data with bootstrap confidence intervals.
+
+Entries are stratified by their ``site``, ``year``, ``month``, and ``hour`` fields (whichever the Endpoint has,
+and as many of them as leave a few sampled Entries per stratum),
+shuffled within each stratum, and then interleaved so that every prefix of the sample is itself close to a
+proportional stratified sample. So reading the sample in order refines an estimate progressively, and stopping
+at any point (or interrupting with Ctrl-C) still leaves a representative sample.
+
+Estimates weight each Entry by the number of Entries in its stratum over the number sampled from it so far,
+and confidence intervals come from a stratified bootstrap over Entries (not rows, since the seconds within a
+file aren't independent). Only strata with at least one Entry read yet are represented.
+"""
+
+STRATA = ("site", "year", "month", "hour")
+# Values kept from each Entry for estimates (a uniform random subset, if it has more)
+MAX_VALUES = 2000
+# Average number of Entries to sample from each stratum, at least (see ``Sample.stratify``)
+MIN_PER_STRATUM = 2
+
+Estimate = collections.namedtuple("Estimate", [
+    "value",        # the estimate
+    "low",          # lower and upper bounds of the confidence interval
+    "high",
+    "confidence",   # i.e. 0.95
+    "entries",      # Entries read so far
+    "total",        # Entries in the population being sampled
+])
+
+class Sample(object):
+    """
+    How to sample an Accessor's data: ``soundDB.nvspl(ds, sample= soundDB.Sample(entries= 0.1, rows= 0.05))``.
+
+    Parameters
+    ----------
+
+    entries : float or int, default 1.0
+        Fraction of the Entries in each stratum to read (at least one per stratum), or a total number of Entries.
+        ``1.0`` reads them all, in random stratified order (useful for progressive estimates).
+
+    rows : float, default None
+        Fraction of the rows of each file to keep (chosen at random, kept in order).
+
+    by : list of str, default None
+        Fields to stratify by. Default: whichever of ``site``, ``year``, ``month``, and ``hour`` the Endpoint has.
+
+    seed : int, default None
+        Random seed, for a reproducible sample. If None, one is chosen at random (and kept, so iterating
+        over the same Accessor twice reads the same sample).
+    """
+    def __init__(self, entries= 1.0, rows= None, by= None, seed= None):
+        if isinstance(entries, float):
+            if not 0 < entries <= 1:
+                raise ValueError("entries must be a fraction between 0 and 1, or a number of Entries")
+        elif not isinstance(entries, int) or entries < 1:
+            raise ValueError("entries must be a fraction between 0 and 1, or a number of Entries")
+        if rows is not None and not 0 < rows <= 1:
+            raise ValueError("rows must be a fraction between 0 and 1")
+        self.entries = entries
+        self.rows = rows
+        self.by = [by] if isinstance(by, basestring) else by
+        self.seed = seed if seed is not None else int(np.random.randint(0, 2**31 - 1))
+
+    def __repr__(self):
+        return "Sample(entries= {!r}, rows= {!r}, by= {!r}, seed= {!r})".format(self.entries, self.rows, self.by, self.seed)
+
+    @classmethod
+    def of(cls, sample):
+        """
+        ``sample`` as a Sample (a number is the ``entries`` to sample), or None
+        """
+        if sample is None or isinstance(sample, Sample):
+            return sample
+        if isinstance(sample, (int, float)) and not isinstance(sample, bool):
+            return cls(entries= sample)
+        raise TypeError("sample must be a fraction of Entries, a number of Entries, or a soundDB.Sample, not {}".format(type(sample).__name__))
+
+    def strataFields(self, endpoint):
+        if self.by is not None:
+            return list(self.by)
+        fields = getattr(endpoint, "fields", ())
+        return [ field for field in STRATA if field in fields ]
+
+    def stratify(self, entries, endpoint):
+        """
+        ``(fields, {stratum: [entries]})``, strata in order of first appearance.
+
+        Fields are dropped from the end (i.e. ``hour``, then ``month``) until at least ``MIN_PER_STRATUM`` Entries
+        would be sampled from each stratum on average, so there's something to estimate the spread within each from.
+        """
+        entries = list(entries)
+        fields = self.strataFields(endpoint)
+        wanted = self.entries * len(entries) if isinstance(self.entries, float) else min(self.entries, len(entries))
+        while True:
+            strata = collections.OrderedDict()
+            for entry in entries:
+                strata.setdefault(tuple(getattr(entry, field) for field in fields), []).append(entry)
+            if not fields or wanted >= MIN_PER_STRATUM * len(strata):
+                return fields, strata
+            fields = fields[:-1]
+
+    def choose(self, entries, endpoint):
+        """
+        The Entries to read from ``entries``, in progressive order: every prefix is close to a proportional stratified sample
+        """
+        rng = np.random.RandomState(self.seed)
+        ranked = []
+        fields, strata = self.stratify(entries, endpoint)
+        for stratum, members in iteritems(strata):
+            order = rng.permutation(len(members))
+            if isinstance(self.entries, float):
+                order = order[:max(1, int(np.round(self.entries * len(members))))]
+            # The i-th pick from a stratum of N comes at about i/N of the way through the sample
+            jitter = rng.uniform(size= len(order))
+            ranked.extend( ((i + jitter[i]) / len(members), members[j]) for i, j in enumerate(order) )
+        ranked.sort(key= lambda rankAndEntry: rankAndEntry[0])
+        chosen = [ entry for rank, entry in ranked ]
+        if isinstance(self.entries, int):
+            chosen = chosen[:self.entries]
+        return chosen
+
+    def rowsOf(self, data, path):
+        """
+        A random ``rows`` fraction of the rows of ``data`` (if it's a pandas object), kept in order
+        """
+        if self.rows is None or self.rows >= 1 or not isinstance(data, (pd.DataFrame, pd.Series)):
+            return data
+        # seeded per file, so the same rows are chosen wherever the file is parsed
+        rng = np.random.RandomState((self.seed ^ zlib.crc32(str(path).encode("utf-8"))) & 0x7fffffff)
+        keep = np.sort(rng.choice(len(data), size= int(np.round(self.rows * len(data))), replace= False))
+        return data.iloc[keep]
+
+def statistic(stat):
+    """
+    A function of ``(values, weights)`` computing ``stat``: "mean", "median", "std", "leq" (energy average of decibels),
+    a quantile as a float (i.e. 0.9), or an exceedance level as "Lxx" (i.e. "L90", the level exceeded 90% of the time)
+    """
+    if stat == "mean":
+        return lambda values, weights: np.average(values, weights= weights)
+    if stat == "median":
+        return lambda values, weights: weightedQuantile(values, weights, 0.5)
+    if stat == "std":
+        def std(values, weights):
+            mean = np.average(values, weights= weights)
+            return np.sqrt(np.average((values - mean) ** 2, weights= weights))
+        return std
+    if stat == "leq":
+        return lambda values, weights: decibels.toLevels(np.average(decibels.toEnergy(values), weights= weights))
+    if isinstance(stat, float) and 0 <= stat <= 1:
+        return lambda values, weights: weightedQuantile(values, weights, stat)
+    if isinstance(stat, basestring) and re.match(r"^L\d+(\.\d+)?$", stat):
+        q = 1 - float(stat[1:]) / 100
+        return lambda values, weights: weightedQuantile(values, weights, q)
+    raise ValueError('Unknown statistic {!r}; must be "mean", "median", "std", "leq", a quantile, or "Lxx", i.e. "L90"'.format(stat))
+
+def weightedQuantile(values, weights, q):
+    order = np.argsort(values)
+    values, weights = values[order], weights[order]
+    positions = np.cumsum(weights) - 0.5 * weights
+    return np.interp(q * weights.sum(), positions, values)
+
+def valuesOf(data, column, path, seed):
+    """
+    The finite values of ``data`` (``data[column]``, if given) as a float array, and how many there were,
+    keeping a random subset of at most ``MAX_VALUES``
+    """
+    if column is not None:
+        data = data[column]
+    if isinstance(data, pd.DataFrame):
+        raise TypeError("Data is a DataFrame; give the column to estimate from, or select it in the operations chain")
+    values = np.asarray(data, dtype= float).ravel()
+    values = values[np.isfinite(values)]
+    count = len(values)
+    if count > MAX_VALUES:
+        rng = np.random.RandomState((seed ^ zlib.crc32(str(path).encode("utf-8"))) & 0x7fffffff)
+        values = values[rng.choice(count, size= MAX_VALUES, replace= False)]
+    return values, count
+
+class Estimator(object):
+    """
+    Accumulates the values of each Entry read, by stratum, and estimates ``stat`` from them
+    """
+    def __init__(self, stat, strataSizes, confidence= 0.95, resamples= 200, seed= 0):
+        self.stat = statistic(stat)
+        self.strataSizes = strataSizes
+        self.confidence = confidence
+        self.resamples = resamples
+        self.rng = np.random.RandomState(seed)
+        # {stratum: [(values, weight per value)]}
+        self.read = collections.OrderedDict()
+        self.count = 0
+
+    def add(self, stratum, values, count):
+        if len(values) == 0:
+            return
+        self.read.setdefault(stratum, []).append((values, count / len(values)))
+        self.count += 1
+
+    def _compute(self, picks):
+        values, weights = [], []
+        for stratum, chosen in picks:
+            members = self.read[stratum]
+            stratumWeight = self.strataSizes[stratum] / len(members)
+            for i in chosen:
+                memberValues, memberWeight = members[i]
+                values.append(memberValues)
+                weights.append(np.full(len(memberValues), stratumWeight * memberWeight))
+        return self.stat(np.concatenate(values), np.concatenate(weights))
+
+    def estimate(self):
+        total = sum(itervalues(self.strataSizes)) if self.strataSizes else 0
+        if self.count == 0:
+            return Estimate(np.nan, np.nan, np.nan, self.confidence, 0, total)
+        value = self._compute([ (stratum, range(len(members))) for stratum, members in iteritems(self.read) ])
+        if self.resamples == 0:
+            return Estimate(value, np.nan, np.nan, self.confidence, self.count, total)
+        replicates = [
+            self._compute([ (stratum, self.rng.randint(0, len(members), size= len(members))) for stratum, members in iteritems(self.read) ])
+            for r in range(self.resamples)
+        ]
+        alpha = (1 - self.confidence) / 2
+        low, high = np.percentile(replicates, [100 * alpha, 100 * (1 - alpha)])
+        return Estimate(value, low, high, self.confidence, self.count, total)
+
+def reader(accessor, stat= "mean", column= None, confidence= 0.95, resamples= 200):
+    """
+    An ``Estimator`` of ``stat`` over the data of ``accessor``, and a generator which reads its sample
+    (or all its Entries) in progressive order, adding each Entry's values to the Estimator and yielding the Entry
+    """
+    if any(isinstance(do, operations.Stage) for do in accessor._chain):
+        raise TypeError("Estimates are made from each Entry's data; remove .group() or .window() from the chain")
+    sample = accessor._sample or Sample()
+
+    population = accessor._locate()
+    fields, strata = sample.stratify(population, accessor._endpoint)
+    strataOf = { str(entry): stratum for stratum, members in iteritems(strata) for entry in members }
+    estimator = Estimator(stat, { stratum: len(members) for stratum, members in iteritems(strata) }, confidence, resamples, sample.seed)
+
+    def read():
+        state = accessor.prepareState(accessor._endpoint, accessor._filters, **accessor._prepareStateParams)
+        for entry, data in accessor._run(sample.choose(population, accessor._endpoint), state):
+            # a DataFrame without a column (TypeError) is a mistake in the query, not in one Entry, so it isn't caught
+            try:
+                values, count = valuesOf(data, column, entry, sample.seed)
+            except (KeyError, ValueError) as e:
+                accessor._write('Can\'t estimate from "{}": {}'.format(str(entry), e))
+                continue
+            estimator.add(strataOf[str(entry)], values, count)
+            yield entry
+
+    return estimator, read()
+
+def estimates(accessor, stat= "mean", column= None, every= 10, confidence= 0.95, resamples= 200):
+    """
+    Generator of ``Estimate``s of ``stat`` over the data of ``accessor``, after every ``every`` Entries read and at the end
+    """
+    estimator, reading = reader(accessor, stat, column, confidence, resamples)
+    sinceLast = 0
+    try:
+        for entry in reading:
+            sinceLast += 1
+            if sinceLast >= every:
+                sinceLast = 0
+                yield estimator.estimate()
+    finally:
+        reading.close()
+    if sinceLast > 0 or estimator.count == 0:
+        yield estimator.estimate()
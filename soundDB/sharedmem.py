@@ -0,0 +1,215 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import os
+import collections
+
+import numpy as np
+import pandas as pd
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None
+
+try:
+    import xarray as xr
+except ImportError:
+    xr = None
+
+"""
+Sending parsed data from worker processes back to the parent through shared memory, instead of pickling it.
+
+In the worker, ``pack`` copies the numeric columns of a DataFrame (or Series, or the values of a DataArray)
+into a single ``multiprocessing.shared_memory`` segment, grouped by dtype into 2-D blocks laid out the way
+pandas stores them, and returns a small picklable ``Packed`` description of it. Everything else (the index,
+column names, non-numeric columns) is pickled as usual. In the parent, ``unpack`` maps the segment and rebuilds
+the DataFrame around views of it, so the numeric data is never copied or serialized again.
+
+Segment lifetime: as soon as the parent maps a segment, it unlinks it, so the memory is freed by the OS once
+the last array viewing it is garbage-collected. Segments the parent never gets to (because the query was
+interrupted or closed early) are unlinked with ``release`` as their tasks finish. As a last resort,
+every segment is registered with the parent's multiprocessing resource tracker (``ensureTracker`` is called
+before workers start, so they share it), which unlinks anything left over when the parent exits.
+Only used on POSIX, and only for local process pools (not Dask, whose workers may be on other machines).
+"""
+
+# Don't bother with shared memory for data smaller than this; pickling is cheaper
+MIN_BYTES = 1 << 16
+ALIGNMENT = 64
+
+Packed = collections.namedtuple("Packed", [
+    "kind",         # "frame", "series", or "dataarray"
+    "segment",      # name of the shared memory segment
+    "blocks",       # [(dtype, shape, offset, positions)]: positions are column numbers (frames) or None
+    "rest",         # everything that isn't in shared memory, pickled as usual
+])
+
+def available():
+    return shared_memory is not None and os.name == "posix"
+
+def ensureTracker():
+    """
+    Start this process's resource tracker, if it isn't running, so worker processes started afterwards share it
+    """
+    if available():
+        resource_tracker.ensure_running()
+
+def _isNumeric(dtype):
+    return isinstance(dtype, np.dtype) and dtype.kind in "biufc"
+
+def _layout(arrays):
+    """
+    Offsets of each array in one segment, aligned, and the total size
+    """
+    offsets = []
+    size = 0
+    for array in arrays:
+        size = -(-size // ALIGNMENT) * ALIGNMENT
+        offsets.append(size)
+        size += array.nbytes
+    return offsets, max(size, 1)
+
+def _write(arrays):
+    """
+    Copy ``arrays`` into a new segment, returning its name and their offsets.
+    The segment is left for the parent to unlink.
+    """
+    offsets, size = _layout(arrays)
+    shm = shared_memory.SharedMemory(create= True, size= size)
+    try:
+        for array, offset in zip(arrays, offsets):
+            view = np.ndarray(array.shape, dtype= array.dtype, buffer= shm.buf, offset= offset)
+            view[...] = array
+            del view
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return shm.name, offsets
+
+def pack(data):
+    """
+    Move the numeric data of ``data`` into shared memory, returning a ``Packed``, or ``data`` itself
+    if it isn't a pandas or xarray structure with enough numeric data to be worth it.
+    """
+    if not available():
+        return data
+    if isinstance(data, pd.Series):
+        packed = _packFrame(data.to_frame())
+        return packed._replace(kind= "series", rest= packed.rest + (data.name,)) if isinstance(packed, Packed) else data
+    if isinstance(data, pd.DataFrame):
+        return _packFrame(data)
+    if xr is not None and isinstance(data, xr.DataArray) and _isNumeric(data.dtype) and data.nbytes >= MIN_BYTES:
+        values = np.ascontiguousarray(data.values)
+        name, offsets = _write([values])
+        rest = (data.dims, data.coords, data.name, data.attrs)
+        return Packed("dataarray", name, [(values.dtype.str, values.shape, offsets[0], None)], rest)
+    return data
+
+def _packFrame(df):
+    byDtype = collections.OrderedDict()
+    for position, dtype in enumerate(df.dtypes):
+        if _isNumeric(dtype):
+            byDtype.setdefault(dtype.str, []).append(position)
+    if sum(np.dtype(dtype).itemsize * len(positions) for dtype, positions in byDtype.items()) * len(df) < MIN_BYTES:
+        return df
+
+    # Each block is (columns, rows), C-ordered: how pandas stores a block internally, so no copy is needed to rebuild it
+    blocks = [ (dtype, positions, np.ascontiguousarray(df.iloc[:, positions].values.T)) for dtype, positions in byDtype.items() ]
+    name, offsets = _write([ values for dtype, positions, values in blocks ])
+
+    numeric = { position for dtype, positions in byDtype.items() for position in positions }
+    others = [ (position, df.columns[position], df.iloc[:, position]) for position in range(df.shape[1]) if position not in numeric ]
+    rest = (df.index, df.columns, others)
+    return Packed("frame", name, [ (dtype, values.shape, offset, positions) for (dtype, positions, values), offset in zip(blocks, offsets) ], rest)
+
+def _attach(name):
+    """
+    Map the segment ``name`` and unlink it, returning the ``mmap``. The memory lives as long as arrays referencing the mmap.
+    """
+    shm = shared_memory.SharedMemory(name= name)
+    shm.unlink()
+    # Detach the mmap from the SharedMemory object, so closing (or collecting) it
+    # doesn't unmap memory which arrays still point into; the arrays keep the mmap alive instead
+    mm = shm._mmap
+    shm._buf.release()
+    shm._buf = None
+    shm._mmap = None
+    shm.close()
+    return mm
+
+def unpack(packed):
+    """
+    Rebuild the data described by ``packed`` around views of its shared memory (or return ``packed`` if it isn't a ``Packed``)
+    """
+    if not isinstance(packed, Packed):
+        return packed
+    mm = _attach(packed.segment)
+    views = [ np.frombuffer(mm, dtype= np.dtype(dtype), count= int(np.prod(shape)), offset= offset).reshape(shape)
+              for dtype, shape, offset, positions in packed.blocks ]
+
+    if packed.kind == "dataarray":
+        dims, coords, name, attrs = packed.rest
+        return xr.DataArray(views[0], dims= dims, coords= coords, name= name, attrs= attrs)
+
+    index, columns, others = packed.rest[:3]
+    # Start from the largest block (which becomes the DataFrame's first block as-is), then insert
+    # every other column at its original position, in order of position, without copying
+    order = sorted(range(len(views)), key= lambda i: views[i].size, reverse= True)
+    first = order[0]
+    firstPositions = packed.blocks[first][3]
+    df = pd.DataFrame(views[first].T, index= index, columns= columns[firstPositions], copy= False)
+
+    remaining = [ (position, columns[position], pd.Series(views[i][j], index= index, copy= False))
+                  for i in order[1:] for j, position in enumerate(packed.blocks[i][3]) ]
+    remaining.extend( (position, name, pd.Series(column.values, index= index, copy= False)) for position, name, column in others )
+    present = sorted(firstPositions)
+    for position, name, values in sorted(remaining, key= lambda item: item[0]):
+        loc = int(np.searchsorted(present, position))
+        df.insert(loc, name, values, allow_duplicates= True)
+        present.insert(loc, position)
+
+    if packed.kind == "series":
+        return df.iloc[:, 0].rename(packed.rest[3])
+    return df
+
+def release(packed):
+    """
+    Free the shared memory of a ``Packed`` that will never be unpacked. Returns whether there was any to free
+    (False if it was already unlinked, i.e. by ``unpack``).
+    """
+    if isinstance(packed, Packed):
+        try:
+            shm = shared_memory.SharedMemory(name= packed.segment)
+        except (OSError, ValueError):
+            return False
+        shm.close()
+        shm.unlink()
+        return True
+    return False
+
+def handOff(packed):
+    """
+    Stop tracking the shared memory of ``packed`` in this process, because it's been sent to an unrelated process
+    (not a child sharing our resource tracker), which will unlink it
+    """
+    if isinstance(packed, Packed):
+        resource_tracker.unregister("/" + packed.segment, "shared_memory")
+
+def releaseWhenDone(future):
+    """
+    Arrange for the shared memory of ``future``'s result (if it produces one) to be freed when it finishes
+    """
+    def discard(future):
+        if not future.cancelled() and future.exception() is None:
+            result = future.result()
+            if isinstance(result, list):
+                # a group's results: [(key, data)]
+                for key, data in result:
+                    release(data)
+            else:
+                release(result)
+    future.add_done_callback(discard)
@@ -0,0 +1,193 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+from future.utils import iteritems
+
+import os
+import collections
+
+import pandas as pd
+
+from . import operations
+from . import materialized
+from . import federated
+from . import zonemaps
+
+"""
+Running several Accessor queries with one pass over their data: ``soundDB.multi(q1, q2, ...)``.
+
+Queries which parse files the same way (the same kind of Accessor with the same parameters) share a scan: the Entries
+any of them read are listed once per distinct set of filters, each file is parsed once, and its data is fed to the
+operations chain of every query that reads that Entry (see ``operations.Pipeline``), after that query's ``where=``.
+Each query's results are combined at the end, just as ``.combine()`` would.
+
+The scan reads Entries in one order, so queries whose chains need a different order (a different ``sort``, ``.group()``,
+or ``.window()``) get a scan of their own. Queries without a sort join any scan, and their results are put back in the
+order they'd have come in by themselves. ``.group(workers= n)`` is ignored: every group is processed in this process.
+
+Each query gets a shallow copy of pandas data (with pandas' copy-on-write, as good as a copy), so operations which
+modify the data in place don't affect the other queries.
+"""
+
+def multi(*accessors, **named):
+    """
+    Run several Accessor queries with one pass over their data, returning each one's combined results.
+
+    ``soundDB.multi(q1, q2, q3)`` returns a list of results, in order; ``soundDB.multi(dba= q1, bands= q2)``
+    returns a dict of them by name. Each result is what ``.combine()`` would have returned for that query.
+    """
+    if accessors and named:
+        raise TypeError("Give the queries either all by position or all by name")
+    from .accessor import Accessor
+    queries = list(iteritems(named)) if named else list(enumerate(accessors))
+    for label, accessor in queries:
+        if not isinstance(accessor, Accessor):
+            raise TypeError("multi takes Accessor queries, not {}".format(type(accessor).__name__))
+
+    if len(set(id(accessor) for label, accessor in queries)) < len(queries):
+        raise ValueError("The same Accessor was given more than once")
+
+    results = collections.OrderedDict( (label, []) for label, accessor in queries )
+    labels = { id(accessor): label for label, accessor in queries }
+    located = {}
+    for scan in plan([ accessor for label, accessor in queries ], located):
+        run(scan, [ results[labels[id(member)]] for member in scan.members ])
+
+    combined = [ (label, accessor._combineResults(iter(results[label]), lambda x: x, accessor.ID)) for label, accessor in queries ]
+    return collections.OrderedDict(combined) if named else [ result for label, result in combined ]
+
+def clone(accessor, **attrs):
+    """
+    A shallow copy of ``accessor``, with ``attrs`` changed (``copy.copy`` would only keep what's pickled)
+    """
+    copied = object.__new__(type(accessor))
+    copied.__dict__.update(accessor.__dict__)
+    copied.__dict__.update(attrs)
+    return copied
+
+def parseKey(accessor):
+    """
+    Fingerprint of how ``accessor`` parses files: queries with the same one can share the data of each file
+    """
+    sample = accessor._sample
+    return materialized.fingerprint(
+        type(accessor).__module__, type(accessor).__name__, accessor._prepareStateParams, accessor._engine,
+        (sample.rows, sample.seed) if sample is not None and sample.rows is not None else None
+    )
+
+def entriesOf(accessor, located):
+    """
+    The Entries ``accessor`` reads, listing them only once for every query with the same Endpoint and filters
+    """
+    filters = accessor._filters
+    if accessor._sample is not None or accessor._n is not None or "items" in filters:
+        return accessor._entries()
+    key = (id(accessor._endpoint), materialized.fingerprint(filters))
+    if key not in located:
+        located[key] = clone(accessor, _sort= None)._locate()
+    entries = located[key]
+    sortKey = federated.sortKey(accessor._sort)
+    return sorted(entries, key= sortKey) if sortKey is not None else list(entries)
+
+class Scan(object):
+    """
+    One pass over the union of the Entries of ``members``, all of which parse files the same way
+    """
+    def __init__(self, sortKey= None):
+        self.sortKey = sortKey
+        self.members = []
+        # for each member: {path: position in the order it reads them}
+        self.positions = []
+
+    def add(self, accessor, entries):
+        self.members.append(accessor)
+        self.positions.append({ os.path.abspath(str(entry)): i for i, entry in enumerate(entries) })
+        if len(self.members) == 1:
+            self.entries = collections.OrderedDict()
+        for entry in entries:
+            self.entries.setdefault(os.path.abspath(str(entry)), entry)
+
+    def ordered(self):
+        entries = list(self.entries.values())
+        return sorted(entries, key= self.sortKey) if self.sortKey is not None else entries
+
+def plan(accessors, located):
+    """
+    Split ``accessors`` into Scans: by how they parse files, then by the order they need to read them in
+    """
+    scans = collections.OrderedDict()
+    unsorted = []
+    for accessor in accessors:
+        entries = entriesOf(accessor, located)
+        if accessor._sort is None:
+            unsorted.append((accessor, entries))
+            continue
+        key = (parseKey(accessor), materialized.fingerprint(accessor._sort))
+        if key not in scans:
+            scans[key] = Scan(federated.sortKey(accessor._sort))
+        scans[key].add(accessor, entries)
+
+    for accessor, entries in unsorted:
+        # order doesn't matter to these (it's restored at the end), so join any scan that parses the same way
+        key = next((key for key in scans if key[0] == parseKey(accessor)), (parseKey(accessor), None))
+        if key not in scans:
+            scans[key] = Scan()
+        scans[key].add(accessor, entries)
+    return list(scans.values())
+
+def run(scan, outputs):
+    """
+    Parse each Entry of ``scan`` once, and feed it through the chain of each member that reads it,
+    appending each member's ``(key, data)`` results to its list in ``outputs``
+    """
+    first = scan.members[0]
+    parser = clone(first, _chain= [], _where= None, _progbar= True if first._progbar is None else first._progbar)
+
+    pipelines = [ operations.Pipeline(member._chain, member._write) for member in scan.members ]
+    wheres = [ member._where for member in scan.members ]
+    index = zonemaps.Index(first) if any(where is not None for where in wheres) else None
+    recordStats = first._sample is None or first._sample.rows is None
+
+    def readers(path):
+        """
+        Numbers of the members which read the Entry at ``path``
+        """
+        return [ i for i, positions in enumerate(scan.positions) if path in positions ]
+
+    def needed(entries):
+        for entry in entries:
+            path = os.path.abspath(str(entry))
+            zonemap = index.lookup(entry) if index is not None else None
+            if any(wheres[i] is None or zonemap is None or wheres[i].possible(zonemap) for i in readers(path)):
+                yield entry
+
+    state = first.prepareState(first._endpoint, first._filters, **first._prepareStateParams)
+    try:
+        for entry, data in parser._run(needed(scan.ordered()), state, chain= []):
+            if index is not None and recordStats:
+                index.record(entry, data)
+            members = readers(os.path.abspath(str(entry)))
+            for n, i in enumerate(members):
+                # the last one can have the original
+                memberData = data.copy(deep= False) if isinstance(data, (pd.DataFrame, pd.Series)) and n < len(members) - 1 else data
+                if wheres[i] is not None:
+                    try:
+                        memberData = wheres[i].filter(memberData)
+                    except Exception as e:
+                        scan.members[i]._write('Error applying where= to "{}": {}'.format(str(entry), e))
+                        continue
+                    if len(memberData) == 0:
+                        continue
+                outputs[i].extend(pipelines[i].push(entry, memberData))
+    except KeyboardInterrupt:
+        first._write("Interrupted; combining the results so far")
+    finally:
+        if index is not None:
+            index.save()
+
+    for i, pipeline in enumerate(pipelines):
+        outputs[i].extend(pipeline.flush())
+        if scan.members[i]._sort is None:
+            # back in the order this query would have read them in by itself
+            positions = scan.positions[i]
+            outputs[i].sort(key= lambda keyAndData: positions.get(os.path.abspath(str(keyAndData[0])), -1))
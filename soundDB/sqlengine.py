@@ -0,0 +1,483 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+from future.utils import iteritems
+from past.builtins import basestring
+
+import os
+import json
+import time
+import inspect
+import hashlib
+import operator
+import traceback
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+from .accessor import Accessor
+from . import parsers
+from . import daemon
+from . import materialized
+from .atomicwrite import writeAtomic
+
+"""
+Querying the archive with SQL, through an embedded DuckDB database: ``soundDB.sql(ds, "SELECT ...")``.
+
+Every Endpoint named in the query (``nvspl``, ``srcid``, ...) becomes a virtual table, scanned by streaming each
+matching file's parsed DataFrame into DuckDB as an Arrow record batch. DuckDB then runs the query with its own
+multithreaded, vectorized engine, so only one file's data is held at a time on the way in.
+Each table has the DataFrame's index (i.e. ``date`` for NVSPL) and columns, plus every field of the Entries
+(``site``, ``year``, ...): as integers if every value is a whole number, otherwise as strings. That's decided over all
+the Endpoint's files, not just those a query matches, so a field has the same type however the query filters it.
+
+Before anything is parsed, the query is inspected (using DuckDB's own parser) for work that can be skipped:
+
+- Conditions on Entry fields in the top-level ``WHERE`` clause (comparisons, ``IN``, ``BETWEEN``, and ``OR``s of
+  them, joined by ``AND``) are pushed down into iyore's discovery as filters, so non-matching files aren't even found.
+  They're applied conservatively (keeping any file they might match), and DuckDB still applies the full ``WHERE``.
+- Only columns the query mentions are read: for Accessors which support it (i.e. NVSPL's ``columns=``),
+  they're the only columns parsed; otherwise the rest are dropped before being sent to DuckDB.
+
+With ``cache=``, each file's full parsed DataFrame is also kept as a Parquet file in that directory, and later
+queries read just the columns they need from it, rather than parsing the file again.
+"""
+
+COMPARISONS = {
+    "COMPARE_EQUAL": operator.eq,
+    "COMPARE_LESSTHAN": operator.lt,
+    "COMPARE_LESSTHANOREQUALTO": operator.le,
+    "COMPARE_GREATERTHAN": operator.gt,
+    "COMPARE_GREATERTHANOREQUALTO": operator.ge,
+}
+# The comparison to use when the constant is on the left
+FLIPPED = {
+    "COMPARE_EQUAL": "COMPARE_EQUAL",
+    "COMPARE_LESSTHAN": "COMPARE_GREATERTHAN",
+    "COMPARE_LESSTHANOREQUALTO": "COMPARE_GREATERTHANOREQUALTO",
+    "COMPARE_GREATERTHAN": "COMPARE_LESSTHAN",
+    "COMPARE_GREATERTHANOREQUALTO": "COMPARE_LESSTHANOREQUALTO",
+}
+NUMERIC_TYPES = { "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT", "FLOAT", "DOUBLE", "DECIMAL" }
+
+def accessorClasses():
+    """
+    ``{endpointName: Accessor subclass}`` for every table that can be queried
+    """
+    predicate = lambda obj: inspect.isclass(obj) and issubclass(obj, Accessor) and obj is not Accessor
+    return { cls.endpointName: cls for name, cls in inspect.getmembers(parsers, predicate) }
+
+def sql(ds, query, cache= None, params= None, **kwargs):
+    """
+    Run the SQL ``query`` over the Endpoints of ``ds`` and return the result as a pandas DataFrame.
+
+    Parameters
+    ----------
+
+    ds : iyore.Dataset, or list of them
+        The Dataset whose Endpoints the query's tables refer to, as for any Accessor.
+
+    query : str
+        A DuckDB SQL query. Tables are named after Endpoints (``nvspl``, ``srcid``, ...).
+
+    cache : str, default None
+        Directory to keep a Parquet copy of each parsed file in, to read from instead of parsing it again.
+
+    params : dict of {str: dict}, default None
+        Extra parameters or filters for the Accessor of each table, i.e. ``{"nvspl": {"resample": "1min"}}``.
+
+    **kwargs
+        Passed on to the Accessor of every table (i.e. ``executor=``, ``engine=``, ``progbar=``).
+
+    Examples
+    --------
+
+    >>> soundDB.sql(ds, "SELECT site, date_trunc('hour', date) AS hour, avg(dbA) FROM nvspl WHERE year >= 2015 GROUP BY 1, 2")
+
+    Each table is streamed into DuckDB once, so a query can't refer to the same table twice (i.e. a self-join);
+    use a ``WITH`` clause selecting it into a ``MATERIALIZED`` CTE instead.
+    """
+    if duckdb is None or pa is None:
+        raise ImportError("soundDB.sql requires duckdb and pyarrow (pip install duckdb pyarrow)")
+    params = params or {}
+
+    classes = accessorClasses()
+    tree = parseTree(query)
+    if tree is None:
+        # let DuckDB report the syntax error
+        return duckdb.execute(query).df()
+    tables = [ table for table in tablesReferenced(tree) if table in classes ]
+    referenced = columnsReferenced(tree)
+    fieldFilters = whereFilters(tree)
+
+    con = duckdb.connect()
+    scans = []
+    try:
+        for table in tables:
+            accessor = classes[table](ds, **dict(kwargs, **params.get(table, {})))
+            pushFilters(accessor, fieldFilters.get(table, {}))
+            schema, batches = scan(accessor, referenced, cache)
+            scans.append(batches)
+            con.register(table, pa.RecordBatchReader.from_batches(schema, batches))
+        return con.execute(query).df()
+    finally:
+        con.close()
+        for batches in scans:
+            stopScan(batches)
+
+def stopScan(batches):
+    """
+    Close the generator of a scan DuckDB may not have finished (i.e. with LIMIT), on this thread,
+    rather than leaving it to whichever of DuckDB's threads drops it last
+    """
+    while True:
+        try:
+            batches.close()
+            return
+        except ValueError:
+            # one of DuckDB's threads is still reading ahead from it
+            time.sleep(0.01)
+
+## Inspecting the query
+
+def parseTree(query):
+    """
+    DuckDB's parse tree of ``query``, as JSON, or None if it can't be parsed (DuckDB will report why when it's run)
+    """
+    tree = json.loads(duckdb.execute("SELECT json_serialize_sql(?::VARCHAR)", [query]).fetchone()[0])
+    return None if tree.get("error") else tree
+
+def _walk(node):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            for child in _walk(value):
+                yield child
+    elif isinstance(node, list):
+        for item in node:
+            for child in _walk(item):
+                yield child
+
+def tablesReferenced(tree):
+    """
+    Lowercased names of every table the query reads from (including any CTEs), in order
+    """
+    names = []
+    for node in _walk(tree):
+        if node.get("type") == "BASE_TABLE" and node.get("table_name") and node["table_name"].lower() not in names:
+            names.append(node["table_name"].lower())
+    return names
+
+def columnsReferenced(tree):
+    """
+    Lowercased names of every column the query mentions, or None if it uses ``*`` (so every column is needed)
+    """
+    names = set()
+    for node in _walk(tree):
+        cls = node.get("class")
+        if cls == "STAR":
+            return None
+        if cls == "COLUMN_REF":
+            names.add(node["column_names"][-1].lower())
+    return names
+
+def _constant(node):
+    """
+    The Python value of a CONSTANT node, or None if it isn't a number or string constant
+    """
+    if not isinstance(node, dict) or node.get("class") != "CONSTANT" or node["value"].get("is_null"):
+        return None
+    valueType = node["value"]["type"]
+    value = node["value"]["value"]
+    if valueType["id"] == "DECIMAL":
+        return value / 10 ** valueType["type_info"]["scale"]
+    if valueType["id"] in NUMERIC_TYPES:
+        return value
+    if valueType["id"] == "VARCHAR":
+        return value
+    return None
+
+def _columnOf(node):
+    if isinstance(node, dict) and node.get("class") == "COLUMN_REF":
+        return node["column_names"][-1].lower()
+    return None
+
+def _asNumber(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _matches(compare, constant):
+    """
+    A function of an Entry field's value (a string) which is True wherever ``value <compare> constant``
+    might be true in SQL---whether the field's column ends up as strings or as numbers
+    """
+    number = _asNumber(constant)
+    def match(value):
+        # as strings
+        if isinstance(constant, basestring) and compare(value, constant):
+            return True
+        # as numbers (a string column compared to a number is an error in DuckDB anyway, so keep it)
+        valueNumber = _asNumber(value)
+        if valueNumber is None or number is None:
+            return not isinstance(constant, basestring)
+        return compare(valueNumber, number)
+    return match
+
+def _predicate(node):
+    """
+    ``(field, function)`` for a condition on a single column, or None if it can't be turned into one
+    """
+    cls, kind = node.get("class"), node.get("type")
+    if cls == "COMPARISON" and kind in COMPARISONS:
+        field, constant = _columnOf(node["left"]), _constant(node["right"])
+        if field is None:
+            field, constant, kind = _columnOf(node["right"]), _constant(node["left"]), FLIPPED[kind]
+        if field is None or constant is None:
+            return None
+        return field, _matches(COMPARISONS[kind], constant)
+    if cls == "OPERATOR" and kind == "COMPARE_IN":
+        field = _columnOf(node["children"][0])
+        constants = [ _constant(child) for child in node["children"][1:] ]
+        if field is None or any(constant is None for constant in constants):
+            return None
+        matches = [ _matches(operator.eq, constant) for constant in constants ]
+        return field, lambda value: any(match(value) for match in matches)
+    if cls == "BETWEEN":
+        field, lower, upper = _columnOf(node["input"]), _constant(node["lower"]), _constant(node["upper"])
+        if field is None or lower is None or upper is None:
+            return None
+        above, below = _matches(operator.ge, lower), _matches(operator.le, upper)
+        return field, lambda value: above(value) and below(value)
+    if cls == "CONJUNCTION" and kind == "CONJUNCTION_OR":
+        predicates = [ _predicate(child) for child in node["children"] ]
+        if any(predicate is None for predicate in predicates) or len({ field for field, match in predicates }) != 1:
+            return None
+        matches = [ match for field, match in predicates ]
+        return predicates[0][0], lambda value: any(match(value) for match in matches)
+    return None
+
+def whereFilters(tree):
+    """
+    ``{table: {column: function}}`` of the conditions on single columns ANDed together in the top-level
+    ``WHERE`` clause, when it selects from a single table. Column names are lowercased.
+    """
+    statements = tree.get("statements", [])
+    if len(statements) != 1:
+        return {}
+    node = statements[0]["node"]
+    if node.get("type") != "SELECT_NODE" or node.get("where_clause") is None:
+        return {}
+    table = node.get("from_table") or {}
+    if table.get("type") != "BASE_TABLE" or table.get("schema_name"):
+        return {}
+
+    where = node["where_clause"]
+    conditions = where["children"] if where.get("class") == "CONJUNCTION" and where.get("type") == "CONJUNCTION_AND" else [where]
+    byField = {}
+    for condition in conditions:
+        predicate = _predicate(condition)
+        if predicate is not None:
+            byField.setdefault(predicate[0], []).append(predicate[1])
+    return { table["table_name"].lower(): { field: _allOf(matches) for field, matches in iteritems(byField) } }
+
+def _allOf(matches):
+    return lambda value: all(match(value) for match in matches)
+
+## Scanning a table
+
+def entryFields(accessor):
+    return list(getattr(accessor._endpoint, "fields", ()))
+
+def pushFilters(accessor, filters):
+    """
+    Add the conditions in ``filters`` (``{lowercased column: function}``) on Entry fields to ``accessor``'s filters,
+    unless a filter was already given for that field
+    """
+    for field in entryFields(accessor):
+        predicate = filters.get(field.lower())
+        if predicate is not None and field not in accessor._filters:
+            accessor._filters[field] = predicate
+
+def fieldTypes(accessor, entries):
+    """
+    ``{field: Arrow type}`` of each Entry field: ``int64`` if every value is a whole number in the Endpoint
+    (unfiltered; ``entries`` are used if there aren't any filters), otherwise ``string``
+    """
+    if accessor._filters:
+        listed = daemon.locate(accessor._endpoint, None, None, {})
+        entries = listed if listed is not None else list(accessor._endpoint())
+    return { field: pa.int64() if entries and all(str(getattr(entry, field)).isdigit() for entry in entries) else pa.string()
+             for field in entryFields(accessor) }
+
+def scan(accessor, referenced, cache= None):
+    """
+    ``(schema, batches)``: the Arrow schema and a generator of record batches of the data of every Entry ``accessor``
+    matches, with the Entry fields added as columns, and only the columns in ``referenced``
+    (lowercased names; None for all of them).
+    """
+    fields = entryFields(accessor)
+    entries = accessor._locate()
+    types = fieldTypes(accessor, entries)
+    store = Cache(cache, accessor) if cache is not None else None
+    state = accessor.prepareState(accessor._endpoint, accessor._filters, **accessor._prepareStateParams)
+
+    # The first file which parses is read in full, to learn which columns there are
+    first = firstFrame = None
+    while entries and firstFrame is None:
+        first = entries.pop(0)
+        firstFrame = store.read(first) if store is not None else None
+        if firstFrame is None:
+            try:
+                firstFrame = frameOf(accessor._parseEntry(first, state))
+            except Exception:
+                accessor._write('Error while parsing "{}":'.format(str(first)))
+                accessor._write( traceback.format_exc() )
+                continue
+            if store is not None:
+                store.write(first, firstFrame)
+
+    if firstFrame is None:
+        # No data to learn the columns from: just the fields, and any other column mentioned, as NULLs
+        names = fields + sorted((referenced or set()).difference(field.lower() for field in fields))
+        schema = pa.schema([ (name, types.get(name, pa.null())) for name in names ])
+        return schema, (batch for batch in [])
+
+    allColumns = list(firstFrame.columns)
+    if referenced is None:
+        columns = allColumns
+    else:
+        columns = [ column for column in allColumns if column.lower() in referenced ]
+        if not columns:
+            # i.e. only COUNT(*): still need something to count rows by
+            columns = allColumns[:1]
+
+    # with SELECT * (nothing referenced), every column is read anyway
+    if store is None and referenced is not None and "columns" not in accessor._prepareStateParams:
+        pushdown = accessor._columnParams(columns)
+        if pushdown:
+            accessor._prepareStateParams.update(pushdown)
+            state = accessor.prepareState(accessor._endpoint, accessor._filters, **accessor._prepareStateParams)
+
+    firstBatch = batchOf(firstFrame, columns, first, fields, types)
+    schema = firstBatch.schema
+
+    def batches():
+        yield firstBatch
+        for entry, frame in frames(accessor, entries, state, store, columns):
+            try:
+                batch = batchOf(frame, columns, entry, fields, types, schema)
+            except (pa.ArrowException, ValueError, TypeError):
+                accessor._write('Error while converting "{}" for SQL (are its columns different from the others?):'.format(str(entry)))
+                accessor._write( traceback.format_exc() )
+                continue
+            yield batch
+
+    return schema, batches()
+
+def frameOf(data):
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    if not isinstance(data, pd.DataFrame):
+        raise TypeError("Only tables of DataFrames can be queried with SQL, not {}".format(type(data).__name__))
+    if data.index.name is not None or isinstance(data.index, pd.MultiIndex) or not isinstance(data.index, pd.RangeIndex):
+        data = data.reset_index()
+    data.columns = [ str(column) for column in data.columns ]
+    return data
+
+def batchOf(frame, columns, entry, fields, fieldTypes, schema= None):
+    table = frame.reindex(columns= columns)
+    for column in columns:
+        if column not in frame.columns:
+            # missing from this file: NULLs, of whatever type the column has
+            table[column] = None
+    for field in fields:
+        if field not in table.columns:
+            value = getattr(entry, field)
+            table[field] = int(value) if fieldTypes[field] == pa.int64() else str(value)
+    if schema is not None:
+        table = table[schema.names]
+    return pa.RecordBatch.from_pandas(table, schema= schema, preserve_index= False)
+
+def frames(accessor, entries, state, store, columns):
+    """
+    ``(entry, DataFrame)`` for each of ``entries`` (skipping any which fail), from the cache if possible
+    """
+    if store is None:
+        for entry, data in accessor._run(entries, state):
+            yield entry, frameOf(data)
+        return
+
+    misses = [ entry for entry in entries if not store.has(entry) ]
+    # parsed in order (on the Accessor's executor, if it has one); failures are reported and left out
+    parsed = accessor._run(misses, state, progress= False)
+    pending = next(parsed, None)
+    for entry in entries:
+        if store.has(entry):
+            frame = store.read(entry, columns)
+            if frame is not None:
+                yield entry, frame
+            continue
+        if pending is not None and str(pending[0]) == str(entry):
+            frame = frameOf(pending[1])
+            store.write(entry, frame)
+            yield entry, frame
+            pending = next(parsed, None)
+
+class Cache(object):
+    """
+    Parquet copies of parsed files, named after the file's path, in a directory per Accessor configuration.
+    A copy is only used if the file's size and mtime haven't changed since it was made.
+    """
+    def __init__(self, directory, accessor):
+        configuration = materialized.fingerprint(
+            type(accessor).__module__, type(accessor).__name__,
+            { k: v for k, v in iteritems(accessor._prepareStateParams) if k != "columns" }
+        )
+        self.directory = os.path.join(directory, "{}-{}".format(accessor.endpointName, configuration[:12]))
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def _path(self, entry):
+        return os.path.join(self.directory, hashlib.sha1(os.path.abspath(str(entry)).encode("utf-8")).hexdigest() + ".parquet")
+
+    def _stamp(self, entry):
+        stamp = materialized.entryStamp(entry)
+        return json.dumps(list(stamp) if stamp is not None else None).encode("utf-8")
+
+    def has(self, entry):
+        path = self._path(entry)
+        if not os.path.exists(path):
+            return False
+        try:
+            metadata = pa.parquet.read_schema(path).metadata or {}
+        except (pa.ArrowException, OSError):
+            return False
+        return metadata.get(b"soundDB.stamp") == self._stamp(entry)
+
+    def read(self, entry, columns= None):
+        if not self.has(entry):
+            return None
+        try:
+            table = pa.parquet.read_table(self._path(entry), columns= list(columns) if columns is not None else None)
+        except (pa.ArrowException, OSError):
+            return None
+        return table.to_pandas()
+
+    def write(self, entry, frame):
+        table = pa.Table.from_pandas(frame, preserve_index= False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b"soundDB.stamp"] = self._stamp(entry)
+        table = table.replace_schema_metadata(metadata)
+        writeAtomic(self._path(entry), lambda tmp: pa.parquet.write_table(table, tmp))
@@ -0,0 +1,266 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import os
+import time
+import shutil
+import hashlib
+import threading
+import collections
+import concurrent.futures
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from . import memory
+from .atomicwrite import writeAtomic
+
+"""
+An optional local staging cache for data files on slow network shares.
+
+Turn it on with ``soundDB.setStagingCache("/local/ssd/soundDB-cache", quota= "50GB")``, or the
+``SOUNDDB_STAGING_DIR`` and ``SOUNDDB_STAGING_QUOTA`` environment variables. It sits below parsing:
+``compression.openEntry`` (which every parser uses) and WAV memory-mapping read the cached copy of a file
+whenever there is a valid one, so every Accessor benefits.
+
+While a query runs, the files it's about to parse are copied into the cache in batches, ahead of the parser,
+with large sequential reads. A cached copy is valid while its size and modification time match the original
+(copies are given the original's mtime). Each copy's access time is set whenever it's used, and when the cache
+grows past its quota, the least-recently-used copies are deleted.
+
+Everything is done with atomic renames, so several processes on the same host can share one cache directory:
+a half-written copy is never visible, and a copy deleted out from under a reader just means reading the original.
+"""
+
+BATCH = 16
+COPY_THREADS = 4
+COPY_BUFFER = 8 << 20
+
+_lock = threading.Lock()
+_config = { "directory": None, "quota": None }
+# Bytes this process believes are in the cache; re-measured whenever it evicts
+_cached = [None]
+
+def setStagingCache(directory, quota= "20GB"):
+    """
+    Stage data files in ``directory`` (created if needed), keeping its size under ``quota``
+    (bytes, or a string like ``"50GB"``). Pass None to stop staging.
+    """
+    if directory is not None:
+        directory = os.path.abspath(os.path.expanduser(directory))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+    with _lock:
+        _config["directory"] = directory
+        _config["quota"] = memory.parseSize(quota)
+        _cached[0] = None
+
+def enabled():
+    return _config["directory"] is not None
+
+def cachePath(path):
+    """
+    Where the staged copy of the file at ``path`` goes (keeping its extensions, so compression is still recognized)
+    """
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    name = os.path.basename(path)
+    extensions = name[name.index("."):] if "." in name else ""
+    return os.path.join(_config["directory"], digest[:2], digest + extensions)
+
+def _isValid(copy, source):
+    try:
+        copyStat = os.stat(copy)
+    except OSError:
+        return False
+    return copyStat.st_size == source.st_size and int(copyStat.st_mtime) == int(source.st_mtime)
+
+def _touch(copy, source):
+    # atime records when the copy was last used (for LRU); mtime stays the original's (for validation)
+    try:
+        os.utime(copy, (time.time(), source.st_mtime))
+    except OSError:
+        pass
+
+def localPath(path):
+    """
+    Path to read the file at ``path`` from: a valid staged copy if there is one (and staging is on),
+    otherwise ``path`` itself. Doesn't copy anything.
+    """
+    if not enabled():
+        return path
+    try:
+        source = os.stat(path)
+    except OSError:
+        return path
+    copy = cachePath(path)
+    if _isValid(copy, source):
+        _touch(copy, source)
+        return copy
+    return path
+
+def isStaged(path):
+    """
+    Whether there's a valid staged copy of the file at ``path`` (without counting as a use of it)
+    """
+    try:
+        return enabled() and _isValid(cachePath(path), os.stat(path))
+    except OSError:
+        return False
+
+def openLocal(path, opener):
+    """
+    ``opener(localPath(path))``, falling back to ``opener(path)`` if the staged copy was evicted in the meantime
+    """
+    local = localPath(path)
+    if local == path:
+        return opener(path)
+    try:
+        return opener(local)
+    except (IOError, OSError):
+        return opener(path)
+
+def stage(path):
+    """
+    Copy the file at ``path`` into the cache, unless there's already a valid copy. Returns the path of the copy.
+    """
+    source = os.stat(path)
+    copy = cachePath(path)
+    if _isValid(copy, source):
+        _touch(copy, source)
+        return copy
+    if _config["quota"] is not None and source.st_size > _config["quota"]:
+        return path
+
+    directory = os.path.dirname(copy)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # another process made it first
+            pass
+    def write(tmp):
+        with open(path, "rb") as src, open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER)
+        os.utime(tmp, (time.time(), source.st_mtime))
+    writeAtomic(copy, write)
+
+    _added(source.st_size)
+    return copy
+
+def _added(nbytes):
+    quota = _config["quota"]
+    if quota is None:
+        return
+    with _lock:
+        if _cached[0] is None:
+            _cached[0] = _measure()
+        else:
+            _cached[0] += nbytes
+        over = _cached[0] > quota
+    if over:
+        evict()
+
+def _copies():
+    directory = _config["directory"]
+    for subdir in os.listdir(directory):
+        subdirPath = os.path.join(directory, subdir)
+        if not os.path.isdir(subdirPath):
+            continue
+        for name in os.listdir(subdirPath):
+            if not name.endswith(".tmp"):
+                yield os.path.join(subdirPath, name)
+
+def _measure():
+    total = 0
+    for copy in _copies():
+        try:
+            total += os.stat(copy).st_size
+        except OSError:
+            pass
+    return total
+
+def evict():
+    """
+    Delete the least-recently-used copies until the cache is under 90% of its quota
+    """
+    quota = _config["quota"]
+    if quota is None or not enabled():
+        return
+    lockFile = open(os.path.join(_config["directory"], ".evict.lock"), "w")
+    try:
+        if fcntl is not None:
+            # Only one process evicts at a time; the others can skip it, since it's being done
+            try:
+                fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError):
+                return
+
+        copies = []
+        for copy in _copies():
+            try:
+                stat = os.stat(copy)
+            except OSError:
+                continue
+            copies.append((stat.st_atime, stat.st_size, copy))
+        copies.sort()
+
+        total = sum(size for atime, size, copy in copies)
+        target = 0.9 * quota
+        for atime, size, copy in copies:
+            if total <= target:
+                break
+            try:
+                os.remove(copy)
+                total -= size
+            except OSError:
+                pass
+        with _lock:
+            _cached[0] = total
+    finally:
+        lockFile.close()
+
+def prefetch(entries):
+    """
+    Yield ``entries`` in order, staging each one's file---in batches, on background threads---before it's yielded.
+    Files which can't be staged are left to be read from their original location.
+    """
+    if not enabled():
+        for entry in entries:
+            yield entry
+        return
+
+    pool = concurrent.futures.ThreadPoolExecutor(COPY_THREADS)
+    window = collections.deque()
+    entries = iter(entries)
+    exhausted = False
+    try:
+        while True:
+            if not exhausted and len(window) <= BATCH:
+                for i in range(BATCH):
+                    entry = next(entries, None)
+                    if entry is None:
+                        exhausted = True
+                        break
+                    window.append( (entry, pool.submit(stage, str(entry))) )
+            if len(window) == 0:
+                return
+            entry, future = window.popleft()
+            try:
+                future.result()
+            except (IOError, OSError):
+                pass
+            yield entry
+    finally:
+        for entry, future in window:
+            future.cancel()
+        pool.shutdown(wait= False)
+
+def _configureFromEnvironment():
+    directory = os.environ.get("SOUNDDB_STAGING_DIR")
+    if directory:
+        setStagingCache(directory, os.environ.get("SOUNDDB_STAGING_QUOTA") or "20GB")
+
+_configureFromEnvironment()
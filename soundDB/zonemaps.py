@@ -0,0 +1,372 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+from future.utils import iteritems
+from past.builtins import basestring
+
+import os
+import re
+import ast
+import json
+import operator
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from . import materialized
+from .atomicwrite import writeAtomic
+
+"""
+Skipping files which can't match a ``where=`` predicate, using statistics recorded the last time each was parsed.
+
+``where=`` is an expression over the columns of each file's data, like ``"dbA > 60"`` or
+``"MaxSPL >= 70 and srcType == 1.1"``: comparisons (chained ones too, like ``"40 < dbA <= 60"``), combined with
+``and``/``or``/``not`` (or ``&``/``|``/``~``). Names that aren't valid identifiers go in backticks (``"`12.5` > 50"``),
+and the time index can be compared to dates by its name (i.e. ``date``) or as ``index``. Only the rows matching
+the predicate are kept, and Entries with no matching rows aren't yielded at all.
+
+Whenever a query with ``where=`` parses a file, the zone map of the file's data---its row count, its time range,
+and the min, max, and mean of every numeric column---is recorded in a sidecar index: one JSON file per kind of
+Accessor and set of parsing parameters, in ``~/.soundDB/zonemaps``. Before later queries parse a file, they check
+its zone map (if it's up to date with the file's mtime and size), and skip it if no row could match; i.e. with
+``"dbA > 60"``, a file whose loudest second was 55 dBA. The check is conservative: anything it can't rule out
+(columns without statistics, comparisons between two columns, ``not``) is parsed.
+"""
+
+DEFAULT_STORE = os.path.join(os.path.expanduser("~"), ".soundDB", "zonemaps")
+FORMAT_VERSION = 1
+INDEX = "index"
+
+COMPARISONS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+# The same comparison, with its sides swapped: ``5 < x`` is ``x > 5``
+FLIPPED = { ast.Lt: ast.Gt, ast.LtE: ast.GtE, ast.Gt: ast.Lt, ast.GtE: ast.LtE, ast.Eq: ast.Eq, ast.NotEq: ast.NotEq }
+
+class Predicate(object):
+    """
+    A parsed ``where=`` expression
+    """
+    def __init__(self, text):
+        if not isinstance(text, basestring):
+            raise TypeError("where must be a string expression, like \"dbA > 60\", not {}".format(type(text).__name__))
+        self.text = text
+        # Swap backticked names for placeholder identifiers that ``ast`` can parse
+        self.names = {}
+        def placeholder(match):
+            name = "_name{}_".format(len(self.names))
+            self.names[name] = match.group(1)
+            return name
+        try:
+            self.tree = ast.parse(re.sub(r"`([^`]*)`", placeholder, text).strip(), mode= "eval").body
+        except SyntaxError as e:
+            raise ValueError("Invalid where expression {!r}: {}".format(text, e.msg))
+        self._check(self.tree)
+
+    def __repr__(self):
+        return "Predicate({!r})".format(self.text)
+
+    def _check(self, node):
+        if isinstance(node, ast.BoolOp):
+            for value in node.values:
+                self._check(value)
+        elif isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+            self._check(node.left)
+            self._check(node.right)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.Invert)):
+            self._check(node.operand)
+        elif isinstance(node, ast.Compare):
+            for op in node.ops:
+                if type(op) not in COMPARISONS:
+                    raise ValueError("Unsupported comparison in where expression {!r}".format(self.text))
+            for operand in [node.left] + node.comparators:
+                if not isinstance(operand, ast.Name) and self._constant(operand) is None:
+                    raise ValueError("Comparisons in where expressions must be between columns and constants: {!r}".format(self.text))
+        else:
+            raise ValueError("Unsupported where expression {!r}: use comparisons combined with and, or, and not".format(self.text))
+
+    def _name(self, node):
+        return self.names.get(node.id, node.id)
+
+    @staticmethod
+    def _constant(node):
+        """
+        ``(value,)`` if ``node`` is a constant (including a negative number), otherwise None
+        """
+        try:
+            return (ast.literal_eval(node),)
+        except ValueError:
+            return None
+
+    @property
+    def columns(self):
+        """
+        Names referenced by the predicate
+        """
+        return sorted(set( self._name(node) for node in ast.walk(self.tree) if isinstance(node, ast.Name) ))
+
+    ## Filtering rows
+
+    def filter(self, data):
+        """
+        The rows of ``data`` (a DataFrame or Series) matching the predicate
+        """
+        if not isinstance(data, (pd.DataFrame, pd.Series)):
+            raise TypeError("where= can only filter pandas data, not {}".format(type(data).__name__))
+        mask = self._evaluate(self.tree, data)
+        return data[np.asarray(mask, dtype= bool)]
+
+    def _evaluate(self, node, data):
+        if isinstance(node, ast.BoolOp):
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            masks = [ self._evaluate(value, data) for value in node.values ]
+            result = masks[0]
+            for mask in masks[1:]:
+                result = combine(result, mask)
+            return result
+        if isinstance(node, ast.BinOp):
+            combine = np.logical_and if isinstance(node.op, ast.BitAnd) else np.logical_or
+            return combine(self._evaluate(node.left, data), self._evaluate(node.right, data))
+        if isinstance(node, ast.UnaryOp):
+            return np.logical_not(self._evaluate(node.operand, data))
+
+        # Compare
+        operands = [ self._operand(operand, data) for operand in [node.left] + node.comparators ]
+        result = np.ones(len(data), dtype= bool)
+        for op, left, right in zip(node.ops, operands[:-1], operands[1:]):
+            left, right = self._comparable(left, right)
+            result &= np.asarray(COMPARISONS[type(op)](left, right), dtype= bool)
+        return result
+
+    def _operand(self, node, data):
+        constant = self._constant(node)
+        if constant is not None:
+            return constant[0]
+        name = self._name(node)
+        if isinstance(data, pd.Series):
+            if name in (data.name, "value"):
+                return data.values
+        elif name in data.columns:
+            return data[name].values
+        if name in (INDEX, data.index.name):
+            return np.asarray(data.index)
+        raise KeyError('No column "{}" to compare in where= (columns are: {})'.format(
+            name, ", ".join(str(c) for c in (data.columns if isinstance(data, pd.DataFrame) else [data.name]))
+        ))
+
+    @staticmethod
+    def _comparable(left, right):
+        # Dates are given as strings: compare them as timestamps against datetime columns
+        for a, b in ((left, right), (right, left)):
+            if isinstance(a, np.ndarray) and a.dtype.kind == "M" and isinstance(b, basestring):
+                b = np.datetime64(pd.Timestamp(b))
+                return (a, b) if a is left else (b, a)
+        return left, right
+
+    ## Ruling out files
+
+    def possible(self, zonemap):
+        """
+        Whether any row of the data summarized by ``zonemap`` could match (True unless it certainly can't)
+        """
+        if zonemap.get("rows") == 0:
+            return False
+        return self._possible(self.tree, zonemap)
+
+    def _possible(self, node, zonemap):
+        if isinstance(node, ast.BoolOp) or isinstance(node, ast.BinOp):
+            values = node.values if isinstance(node, ast.BoolOp) else [node.left, node.right]
+            conjunction = isinstance(getattr(node, "op", None), (ast.And, ast.BitAnd))
+            possibilities = [ self._possible(value, zonemap) for value in values ]
+            return all(possibilities) if conjunction else any(possibilities)
+        if isinstance(node, ast.UnaryOp):
+            # whether every row could match the operand isn't known from a min and max
+            return True
+
+        operands = [node.left] + node.comparators
+        for op, left, right in zip(node.ops, operands[:-1], operands[1:]):
+            leftConstant, rightConstant = self._constant(left), self._constant(right)
+            if isinstance(left, ast.Name) and rightConstant is not None:
+                name, op, value = self._name(left), type(op), rightConstant[0]
+            elif isinstance(right, ast.Name) and leftConstant is not None:
+                name, op, value = self._name(right), FLIPPED[type(op)], leftConstant[0]
+            else:
+                continue
+            # with a chained comparison, every link must be possible (though not necessarily for the same row)
+            if not rangeAllows(rangeOf(zonemap, name), op, value):
+                return False
+        return True
+
+def rangeOf(zonemap, name):
+    """
+    ``(min, max)`` of ``name`` in ``zonemap`` (as Timestamps, for dates), or None if unknown
+    """
+    if name in (INDEX, zonemap.get("indexName")) and zonemap.get("start") is not None:
+        return pd.Timestamp(zonemap["start"]), pd.Timestamp(zonemap["end"])
+    stats = zonemap.get("columns", {}).get(name)
+    if stats is None or stats["min"] is None:
+        return None
+    if stats.get("kind") == "datetime":
+        return pd.Timestamp(stats["min"]), pd.Timestamp(stats["max"])
+    return stats["min"], stats["max"]
+
+def rangeAllows(valueRange, op, value):
+    """
+    Whether some value in ``valueRange`` could satisfy ``x <op> value``
+    """
+    if valueRange is None:
+        return True
+    low, high = valueRange
+    try:
+        if isinstance(low, pd.Timestamp):
+            value = pd.Timestamp(value)
+        if op is ast.Gt:
+            return high > value
+        if op is ast.GtE:
+            return high >= value
+        if op is ast.Lt:
+            return low < value
+        if op is ast.LtE:
+            return low <= value
+        if op is ast.Eq:
+            return low <= value <= high
+        if op is ast.NotEq:
+            return not (low == high == value)
+    except (TypeError, ValueError):
+        # i.e. a string compared to a number: can't tell
+        return True
+    return True
+
+def _scalar(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def zonemapOf(data):
+    """
+    The zone map of ``data`` (a DataFrame or Series): row count, time range, and min/max/mean of each numeric (or datetime) column
+    """
+    frame = data.to_frame(data.name if data.name is not None else "value") if isinstance(data, pd.Series) else data
+    zonemap = { "rows": len(frame), "columns": {}, "indexName": frame.index.name, "start": None, "end": None }
+    if isinstance(frame.index, pd.DatetimeIndex) and len(frame) > 0:
+        zonemap["start"], zonemap["end"] = _scalar(frame.index.min()), _scalar(frame.index.max())
+
+    for name, column in iteritems(frame):
+        dtype = column.dtype
+        if not isinstance(dtype, np.dtype) or dtype.kind not in "biufM":
+            continue
+        values = column.values
+        if dtype.kind == "M":
+            present = values[~np.isnat(values)]
+            stats = { "kind": "datetime", "min": None, "max": None }
+            if len(present):
+                stats["min"], stats["max"] = _scalar(present.min()), _scalar(present.max())
+        else:
+            present = values[~np.isnan(values)] if dtype.kind == "f" else values
+            stats = { "min": None, "max": None, "mean": None }
+            if len(present):
+                finite = present[np.isfinite(present)] if dtype.kind == "f" else present
+                stats["min"], stats["max"] = _scalar(present.min()), _scalar(present.max())
+                stats["mean"] = _scalar(finite.mean()) if len(finite) else None
+        zonemap["columns"][str(name)] = stats
+    return zonemap
+
+class Index(object):
+    """
+    The zone maps of files parsed by one kind of Accessor with one set of parameters: a JSON sidecar file
+    mapping each file's path to its ``(mtime, size)`` stamp and zone map
+    """
+    def __init__(self, accessor, store= None):
+        queryID = materialized.fingerprint(type(accessor).__module__, type(accessor).__name__, accessor._prepareStateParams, accessor._engine)
+        self.path = os.path.join(store or DEFAULT_STORE, "{}-{}.json".format(accessor.endpointName, queryID[:12]))
+        self.zonemaps = self._load()
+        self.changed = {}
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                record = json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+        return record.get("files", {}) if record.get("version") == FORMAT_VERSION else {}
+
+    def lookup(self, entry):
+        """
+        The zone map of ``entry``, if there is one that's up to date with the file
+        """
+        path = os.path.abspath(str(entry))
+        recorded = self.changed.get(path) or self.zonemaps.get(path)
+        if recorded is None:
+            return None
+        try:
+            stamp = materialized.entryStamp(entry)
+        except OSError:
+            return None
+        return recorded["zonemap"] if list(recorded["stamp"]) == list(stamp) else None
+
+    def record(self, entry, data):
+        try:
+            stamp = materialized.entryStamp(entry)
+        except OSError:
+            return
+        self.changed[os.path.abspath(str(entry))] = { "stamp": list(stamp), "zonemap": zonemapOf(data) }
+
+    def save(self):
+        """
+        Write any newly recorded zone maps, merged with what's on disk (another process may have added some)
+        """
+        if not self.changed:
+            return
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        files = self._load()
+        files.update(self.changed)
+        def write(tmp):
+            with open(tmp, "w") as f:
+                json.dump({ "version": FORMAT_VERSION, "files": files }, f)
+        writeAtomic(self.path, write)
+        self.zonemaps = files
+        self.changed = {}
+
+def prune(entries, predicate, index, skipped= None):
+    """
+    Yield the Entries in ``entries`` whose zone maps don't rule out the predicate (or which don't have one yet).
+    Entries which are ruled out are appended to ``skipped``, if given.
+    """
+    for entry in entries:
+        zonemap = index.lookup(entry)
+        if zonemap is None or predicate.possible(zonemap):
+            yield entry
+        elif skipped is not None:
+            skipped.append(entry)
+
+def apply(keysAndDatas, predicate, index, report, record= True):
+    """
+    Record the zone map of each ``(entry, data)`` (if ``record``), and yield only the rows of ``data`` matching
+    ``predicate``, dropping Entries without any. The index is saved when the iterator is exhausted or closed.
+    """
+    try:
+        for entry, data in keysAndDatas:
+            try:
+                if record:
+                    index.record(entry, data)
+                data = predicate.filter(data)
+            except Exception:
+                report('Error applying where= to "{}":'.format(str(entry)))
+                report(traceback.format_exc())
+                continue
+            if len(data) > 0:
+                yield entry, data
+    finally:
+        index.save()
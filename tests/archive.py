@@ -0,0 +1,102 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from soundDB import parsers
+
+"""
+Small synthetic NVSPL archives for the tests.
+
+``Archive`` lists files the way an ``iyore.Dataset`` with an ``nvspl`` Endpoint would (Entries with a ``path``
+and one attribute per field, filtered by field value), without needing a structure file.
+"""
+
+BANDS = [ "H" + band.replace(".", "p") for band in parsers.NVSPL.levelColumns[:-3] ]
+COLUMNS = (["SiteID", "STime"] + BANDS + ["dbA", "dbC", "dbF", "Voltage", "WindSpeed", "WindDir", "TempIns", "TempOut",
+           "Humidity", "INVID", "INSID", "GChar1", "GChar2", "GChar3", "AdjustmentsApplied", "CalibrationAdjustment",
+           "GPSTimeAdjustment", "GainAdjustment", "Status"])
+
+PATTERN = re.compile(r"NVSPL_(?P<unit>[A-Z]{4})(?P<site>\w{4})_(?P<year>\d{4})_(?P<month>\d\d)_(?P<day>\d\d)_(?P<hour>\d\d)\.txt$")
+
+def writeNVSPL(directory, site, hour, seconds= 3600, dbA= None, seed= 0):
+    """
+    Write an NVSPL file for ``site`` (i.e. "DENABELA") starting at ``hour``, with one row per second for ``seconds``.
+    ``dbA`` sets the dbA of every row; otherwise levels are random. Returns its path.
+    """
+    hour = pd.Timestamp(hour)
+    rng = np.random.RandomState(seed)
+    data = pd.DataFrame(index= range(seconds))
+    data["SiteID"] = site
+    data["STime"] = pd.date_range(hour, periods= seconds, freq= "s").strftime("%Y-%m-%d %H:%M:%S")
+    for column in BANDS + ["dbA", "dbC", "dbF"]:
+        data[column] = np.round(rng.normal(30, 8, seconds), 1)
+    if dbA is not None:
+        data["dbA"] = dbA
+    for column in ["Voltage", "WindSpeed", "WindDir", "TempIns", "TempOut", "Humidity"]:
+        data[column] = np.round(rng.normal(10, 1, seconds), 1)
+    for column in ["INVID", "INSID", "GChar2", "AdjustmentsApplied", "CalibrationAdjustment", "GPSTimeAdjustment"]:
+        data[column] = ""
+    data["GChar1"] = "A"
+    data["GChar3"] = "Z"
+    data["GainAdjustment"] = 0
+    data["Status"] = 1
+
+    siteDir = os.path.join(str(directory), site)
+    if not os.path.isdir(siteDir):
+        os.makedirs(siteDir)
+    path = os.path.join(siteDir, "NVSPL_{}_{}.txt".format(site, hour.strftime("%Y_%m_%d_%H")))
+    data[COLUMNS].to_csv(path, index= False)
+    return path
+
+class Entry(object):
+    def __init__(self, path, fields):
+        self.path = path
+        self.fields = fields
+        for field, value in fields.items():
+            setattr(self, field, value)
+
+    def __str__(self):
+        return self.path
+
+    def __repr__(self):
+        return "Entry({!r})".format(self.path)
+
+class Endpoint(object):
+    def __init__(self, root):
+        self.root = str(root)
+        self.fields = list(PATTERN.groupindex)
+
+    def __call__(self, sort= None, n= None, items= None, **filters):
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                match = PATTERN.match(filename)
+                if match is not None and self.matches(match.groupdict(), filters):
+                    entries.append(Entry(os.path.join(dirpath, filename), match.groupdict()))
+        if sort is not None:
+            entries.sort(key= sort if callable(sort) else lambda entry: getattr(entry, sort))
+        return iter(entries[:n] if n is not None else entries)
+
+    @staticmethod
+    def matches(fields, filters):
+        for field, value in filters.items():
+            if callable(value):
+                if not value(fields[field]):
+                    return False
+            elif isinstance(value, (list, tuple, set)):
+                if fields[field] not in [ str(v) for v in value ]:
+                    return False
+            elif fields[field] != str(value):
+                return False
+        return True
+
+class Archive(object):
+    def __init__(self, root):
+        self.nvspl = Endpoint(root)
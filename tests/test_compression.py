@@ -0,0 +1,73 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import io
+import gzip
+import wave
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from soundDB import compression, compress, parsers
+
+# ``soundDB.audio`` is the Accessor of that name, not the module
+audio = importlib.import_module("soundDB.audio")
+
+def writeWav(path, seconds= 12, rate= 48000, channels= 2):
+    rng = np.random.RandomState(0)
+    samples = rng.randint(-2 ** 15, 2 ** 15, size= (seconds * rate, channels)).astype("<i2")
+    f = wave.open(path, "wb")
+    f.setnchannels(channels)
+    f.setsampwidth(2)
+    f.setframerate(rate)
+    f.writeframes(samples.tobytes())
+    f.close()
+    return samples
+
+def test_indexedGzipRoundTrip(tmpdir):
+    data = np.random.RandomState(0).randint(0, 16, size= 250000).astype("u1").tobytes()
+    path = str(tmpdir.join("data.gz"))
+    with open(path, "wb") as f:
+        compression.writeIndexedGzip(io.BytesIO(data), f, memberSize= 1 << 16)
+
+    # still an ordinary gzip file
+    with gzip.open(path, "rb") as f:
+        assert f.read() == data
+    index = compression.memberIndex(path)
+    assert [ uncompressed for compressed, uncompressed in index ] == list(range(0, len(data), 1 << 16)) + [len(data)]
+
+    f = compression.openSeekable(path)
+    assert f.read() == data
+    for position, length in [(0, 10), (65530, 20), (200000, 100000), (len(data) - 5, 10), (len(data) + 1, 10)]:
+        f.seek(position)
+        assert f.read(length) == data[position:position + length]
+    f.close()
+
+def test_openSeekableOnlyWhenCheap(tmpdir):
+    path = str(tmpdir.join("plain.gz"))
+    with gzip.open(path, "wb") as f:
+        f.write(b"no member index")
+    assert compression.openSeekable(path) is None
+    with compression.openEntry(path) as f:
+        assert f.read() == b"no member index"
+
+@pytest.mark.parametrize("fmt", ["gz", "xz"])
+def test_compressedWavReadInParts(tmpdir, fmt):
+    path = str(tmpdir.join("DENABELA_20150515_000000.wav"))
+    samples = writeWav(path)
+    compressed = compress.compressFile(path, fmt, None)
+
+    raw, fmtInfo, toFloat = audio.memmapWav(compressed)
+    # only indexed gzip files can be read a block at a time
+    assert isinstance(raw, audio.SampleReader) == (fmt == "gz")
+    assert raw.shape == samples.shape
+    # across the 1 MB gzip members, and past the end
+    np.testing.assert_array_equal(raw[48000:336000, 1], samples[48000:336000, 1])
+    np.testing.assert_array_equal(raw[500000:700000, 0], samples[500000:576000, 0])
+
+    wav = object.__new__(parsers.WAV)
+    state = wav.prepareState(None, None, blockSeconds= 2, workers= 2)
+    pd.testing.assert_frame_equal(wav.parse(compressed, state), wav.parse(path, wav.prepareState(None, None)))
@@ -0,0 +1,19 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import numpy as np
+import pandas as pd
+
+from soundDB import decibels
+
+def flatBands(level= 40.0, rows= 3):
+    return pd.DataFrame(np.full((rows, len(decibels.BANDS)), level), columns= decibels.BANDS)
+
+def test_bandLevelNominalLimits():
+    df = flatBands()
+    # 20 Hz to 1 kHz is the 18 bands "20" through "1000", both ends included
+    expected = 40.0 + 10 * np.log10(18)
+    np.testing.assert_allclose(decibels.bandLevel(df, 20, 1000).values, expected)
+    np.testing.assert_allclose(decibels.bandLevel(df, 20, 500).values, 40.0 + 10 * np.log10(15))
+    np.testing.assert_allclose(decibels.bandLevel(df.values, 20, 1000), expected)
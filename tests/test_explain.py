@@ -0,0 +1,23 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import importlib
+
+import soundDB
+
+from archive import Archive, writeNVSPL
+
+# the module, which the package namespace doesn't keep
+queryPlan = importlib.import_module("soundDB.explain")
+
+STREAMING = "streaming discovery"
+
+def test_streamingOnlyWhenDiscoveryStreams(tmpdir):
+    for hour in range(4):
+        writeNVSPL(tmpdir, "DENABELA", "2015-05-15 {:02d}:00".format(hour), seconds= 10)
+    ds = Archive(tmpdir)
+    assert STREAMING in queryPlan.explain(soundDB.nvspl(ds))
+    assert STREAMING not in queryPlan.explain(soundDB.nvspl(ds, sample= 0.5))
+    assert STREAMING not in queryPlan.explain(soundDB.nvspl(ds).group("site"))
+    assert STREAMING not in queryPlan.explain(soundDB.nvspl(ds, sort= "hour"))
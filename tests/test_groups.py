@@ -0,0 +1,34 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import soundDB
+
+from archive import Archive, writeNVSPL
+
+def makeArchive(root):
+    for site in ("DENABELA", "DENAWEBU"):
+        for hour in range(2):
+            writeNVSPL(root, site, "2015-05-15 {:02d}:00".format(hour), seconds= 600, seed= hour)
+    return Archive(root)
+
+def everything(key):
+    return "all"
+
+def lengths(query):
+    return [ (key, len(data)) for key, data in query ]
+
+def test_laterGroupMergesAcrossWorkerGroups(tmpdir, recwarn):
+    ds = makeArchive(tmpdir)
+    serial = lengths(soundDB.nvspl(ds, progbar= False).group("site").group(everything))
+    parallel = lengths(soundDB.nvspl(ds, progbar= False).group("site", workers= 2).group(everything))
+    assert serial == [("all", 2400)]
+    assert parallel == serial
+    # the groups really were processed by workers, rather than one at a time
+    assert len(recwarn) == 0
+
+def test_workersMatchSerial(tmpdir):
+    ds = makeArchive(tmpdir)
+    serial = soundDB.nvspl(ds, progbar= False).group("site").dbA.mean().combine()
+    parallel = soundDB.nvspl(ds, progbar= False).group("site", workers= 2).dbA.mean().combine()
+    assert serial.equals(parallel)
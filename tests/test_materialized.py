@@ -0,0 +1,21 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import sys
+import subprocess
+
+CHAIN = """
+from soundDB import materialized, operations
+chain = [
+    operations.GetAttr("pipe"),
+    operations.Call((lambda df: df.dbA.mean(),), {}),
+    operations.Group([lambda entry: entry.site]),
+]
+print(materialized.fingerprint(chain))
+"""
+
+def test_fingerprintSameAcrossProcesses():
+    # functions' reprs include their memory addresses, which differ from one process to the next
+    fingerprints = [ subprocess.check_output([sys.executable, "-c", CHAIN]) for i in range(2) ]
+    assert fingerprints[0] == fingerprints[1]
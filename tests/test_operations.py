@@ -0,0 +1,91 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from soundDB import operations
+
+from archive import Entry
+
+# (start, seconds) of each file, one row per second: back-to-back files, then gaps longer than any window
+FILES = [
+    ("2015-05-15 00:00:00", 600),
+    ("2015-05-15 00:10:00", 600),
+    ("2015-05-15 01:00:30", 270),
+    ("2015-05-15 03:07:13", 100),
+]
+
+def files(site= "BELA", seed= 0):
+    rng = np.random.RandomState(seed)
+    for start, seconds in FILES:
+        index = pd.date_range(start, periods= seconds, freq= "s", name= "date")
+        yield Entry("{}/{}".format(site, start), { "site": site }), pd.DataFrame({ "dbA": rng.normal(40, 5, seconds) }, index= index)
+
+def windowed(items, size, step= None, by= None):
+    errors = []
+    results = list(operations.execute([operations.Window(size, step= step, by= by)], iter(items), errors.append))
+    assert errors == []
+    return results
+
+def bruteForce(data, size, step):
+    """
+    ``(start, rows)`` of every window ``[start, start + size)``, with ``start`` a multiple of ``step``, that has any rows
+    """
+    size, step = pd.Timedelta(size), pd.Timedelta(step)
+    first = (data.index[0] - size).floor(step) + step
+    windows = []
+    for start in pd.date_range(first, data.index[-1], freq= step):
+        rows = data[(data.index >= start) & (data.index < start + size)]
+        if len(rows) > 0:
+            windows.append((start, rows))
+    return windows
+
+def assertSameWindows(results, expected):
+    assert [ key for key, data in results ] == [ key for key, data in expected ]
+    for (key, data), (expectedKey, expectedData) in zip(results, expected):
+        pd.testing.assert_frame_equal(data, expectedData, check_freq= False)
+
+@pytest.mark.parametrize("size, step", [
+    ("5min", None),     # back to back
+    ("5min", "2min"),   # overlapping
+    ("7min", "90s"),    # overlapping, and not dividing the files' lengths
+    ("1min", "10min"),  # with gaps between windows
+    ("2h", "1h"),       # spanning the gaps between files
+])
+def test_windowMatchesBruteForce(size, step):
+    data = pd.concat([ data for entry, data in files() ])
+    assertSameWindows(windowed(files(), size, step), bruteForce(data, size, step or size))
+
+def test_windowMatchesResample():
+    data = pd.concat([ data for entry, data in files() ])
+    sums = pd.Series({ key: window.dbA.sum() for key, window in windowed(files(), "5min") })
+    resampled = data.dbA.resample("5min").sum(min_count= 1).dropna()
+    np.testing.assert_allclose(sums.values, resampled.values)
+    assert list(sums.index) == list(resampled.index)
+
+def test_windowSpansFileBoundaries():
+    results = dict(windowed(files(), "4min"))
+    # 00:08 to 00:12 takes the last 2 minutes of the first file and the first 2 of the second
+    assert len(results[pd.Timestamp("2015-05-15 00:08")]) == 240
+    # the gap from 00:20 to 01:00:30 has no windows, but the partial one at 01:00 does
+    assert pd.Timestamp("2015-05-15 00:20") not in results
+    assert len(results[pd.Timestamp("2015-05-15 01:00")]) == 210
+
+def test_windowByPartitions():
+    items = list(files("BELA", seed= 0)) + list(files("WEBU", seed= 1))
+    results = windowed(items, "5min", "2min", by= "site")
+    for site in ("BELA", "WEBU"):
+        data = pd.concat([ data for entry, data in items if entry.site == site ])
+        expected = [ ((site, start), rows) for start, rows in bruteForce(data, "5min", "2min") ]
+        assertSameWindows([ (key, data) for key, data in results if key[0] == site ], expected)
+    # sites aren't mixed: each site's windows are all yielded before the next site's
+    assert [ key[0] for key, data in results ] == sorted(key[0] for key, data in results)
+
+def test_windowRejectsDataOutOfOrder():
+    items = list(files())
+    errors = []
+    list(operations.execute([operations.Window("5min")], iter([items[1], items[0]]), errors.append))
+    assert errors
@@ -0,0 +1,35 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import pytest
+
+import soundDB
+
+from archive import Archive, writeNVSPL
+
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+def makeArchive(root):
+    for site in ("DENABELA", "DENAWEBU"):
+        writeNVSPL(root, site, "2015-05-15 00:00", seconds= 60)
+    return Archive(root)
+
+def test_fieldTypesDontDependOnFilters(tmpdir):
+    ds = makeArchive(tmpdir)
+    query = "SELECT count(*) AS n FROM nvspl WHERE year + 0 >= 2015"
+    assert soundDB.sql(ds, query, progbar= False).n[0] == 120
+    # no files match: still an integer year, and an empty count rather than a type error
+    assert soundDB.sql(ds, query, params= { "nvspl": { "site": "ZZZZ" } }, progbar= False).n[0] == 0
+    assert soundDB.sql(ds, "SELECT count(*) AS n FROM nvspl WHERE year = 2014", progbar= False).n[0] == 0
+
+def test_cachedQueryMatchesParsed(tmpdir):
+    ds = makeArchive(tmpdir.join("archive"))
+    cache = str(tmpdir.join("cache"))
+    query = "SELECT site, avg(dbA) AS dbA FROM nvspl GROUP BY site ORDER BY site"
+    parsed = soundDB.sql(ds, query, progbar= False)
+    for i in range(2):
+        # the first run fills the cache, the second reads from it
+        assert soundDB.sql(ds, query, cache= cache, progbar= False).equals(parsed)
+    assert not [ name for name in tmpdir.join("cache").visit() if str(name).endswith(".tmp") ]
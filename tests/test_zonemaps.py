@@ -0,0 +1,86 @@
+# Python 2 and 3 cross-compatibility:
+from __future__ import print_function, division, unicode_literals, absolute_import
+from builtins import (bytes, str, int, dict, object, range, map, filter, zip, round, pow, open)
+
+import os
+
+import pytest
+
+import soundDB
+from soundDB import zonemaps
+
+from archive import Archive, writeNVSPL
+
+@pytest.mark.parametrize("text", [
+    "__import__('os').system('true')",
+    "dbA.values > 60",
+    "dbA + 1 > 60",
+    "dbA in (60, 70)",
+    "max(dbA) > 60",
+    "(lambda: dbA)() > 60",
+    "dbA",
+])
+def test_predicateRejectsOtherExpressions(text):
+    with pytest.raises(ValueError):
+        zonemaps.Predicate(text)
+
+def test_predicateRejectsNonStrings():
+    with pytest.raises(TypeError):
+        zonemaps.Predicate(lambda df: df.dbA > 60)
+
+def test_predicateAcceptsComparisons():
+    predicate = zonemaps.Predicate("40 < dbA <= 60 and not ((`12.5` > 50) | (dbC != -1))")
+    assert predicate.columns == ["12.5", "dbA", "dbC"]
+
+def makeArchive(root):
+    # one quiet hour and one loud one
+    writeNVSPL(root, "DENABELA", "2015-05-15 00:00", seconds= 60, dbA= 30.0)
+    writeNVSPL(root, "DENABELA", "2015-05-15 01:00", seconds= 60, dbA= 70.0)
+    return Archive(root)
+
+def recordedIndex(accessor, store):
+    index = zonemaps.Index(accessor, store= store)
+    for entry, data in accessor:
+        index.record(entry, data)
+    index.save()
+    return zonemaps.Index(accessor, store= store)
+
+def test_pruneSkipsFilesRuledOut(tmpdir):
+    accessor = soundDB.nvspl(makeArchive(tmpdir.join("archive")), progbar= False)
+    index = recordedIndex(accessor, str(tmpdir.join("zonemaps")))
+    entries = accessor._locate()
+
+    skipped = []
+    kept = list(zonemaps.prune(entries, zonemaps.Predicate("dbA > 60"), index, skipped))
+    assert [ entry.hour for entry in kept ] == ["01"]
+    assert [ entry.hour for entry in skipped ] == ["00"]
+    # a comparison the statistics can't decide keeps every file
+    assert len(list(zonemaps.prune(entries, zonemaps.Predicate("not dbA > 60"), index))) == 2
+    assert len(list(zonemaps.prune(entries, zonemaps.Predicate("dbA > 100 or dbC > dbA"), index))) == 2
+
+def test_indexInvalidatedWhenFileChanges(tmpdir):
+    ds = makeArchive(tmpdir.join("archive"))
+    accessor = soundDB.nvspl(ds, progbar= False)
+    index = recordedIndex(accessor, str(tmpdir.join("zonemaps")))
+    quiet = accessor._locate()[0]
+    assert index.lookup(quiet)["columns"]["dbA"]["max"] == 30.0
+
+    # now loud, and a different size
+    path = writeNVSPL(tmpdir.join("archive"), "DENABELA", "2015-05-15 00:00", seconds= 120, dbA= 80.0)
+    assert path == quiet.path
+    assert index.lookup(quiet) is None
+    assert list(zonemaps.prune([quiet], zonemaps.Predicate("dbA > 60"), index)) == [quiet]
+
+def test_whereSkipsFilesOnLaterQueries(tmpdir, monkeypatch):
+    monkeypatch.setattr(zonemaps, "DEFAULT_STORE", str(tmpdir.join("zonemaps")))
+    ds = makeArchive(tmpdir.join("archive"))
+    parsed = []
+    parse = soundDB.nvspl.parse
+    monkeypatch.setattr(soundDB.nvspl, "parse", lambda self, entry, state= None: parsed.append(os.path.basename(str(entry))) or parse(self, entry, state= state))
+
+    for i in range(2):
+        del parsed[:]
+        results = list(soundDB.nvspl(ds, progbar= False, where= "dbA > 60"))
+        assert [ len(data) for entry, data in results ] == [60]
+    # the quiet file was parsed to record its zone map the first time, but not the second
+    assert parsed == ["NVSPL_DENABELA_2015_05_15_01.txt"]